@@ -0,0 +1,244 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 07:52:40 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: bench_products.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 07:52:40 pm
+#####################################################
+
+"""
+Throughput, peak memory and stage timings of the product generators.
+
+Synthetic Level 1 data and a dummy CALDB are written with synthetic_l1.py
+(or an existing directory made by it is reused with --data), and every case
+runs in a fresh interpreter so that imports, caches and peak memory are
+measured per case. Stage timings are the inclusive wall times of the stages
+marked in solexs_tools (see solexs_tools.profiling), summed over all calls. Peak
+memory is the peak resident set size of the case process, which includes
+the pages of memory-mapped L1 files that were touched.
+
+Usage:
+    python benchmarks/bench_products.py [--duration 86400] [--repeat 3]
+        [--cases genspec_cold genlc ...] [--data DIR] [--json]
+"""
+
+import argparse
+import contextlib
+import glob
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+def _data_files(data_dir):
+    pi_file = sorted(glob.glob(os.path.join(data_dir, '*_L1.pi')))[0]
+    return pi_file, pi_file[:-3] + '.gti'
+
+
+def _remove_time_index(pi_file):
+    for f in glob.glob(os.path.join(os.path.dirname(pi_file), '.' + os.path.basename(pi_file) + '.*.tidx.*')):
+        os.remove(f)
+
+
+# Each case takes the data files and a scratch output directory, does any
+# untimed preparation and returns (timed function, number of L1 rows it reads).
+
+def case_genspec_cold(pi_file, gti_file, out_dir, t0, n_rows):
+    from solexs_tools.solexs_genspec import solexs_genspec
+    _remove_time_index(pi_file)
+    return (lambda: solexs_genspec(pi_file, t0 + n_rows/4, t0 + 3*n_rows/4, gti_file, outfile=os.path.join(out_dir, 'spec'))), n_rows
+
+
+def case_genspec_warm(pi_file, gti_file, out_dir, t0, n_rows):
+    from solexs_tools.solexs_genspec import solexs_genspec
+    run = lambda: solexs_genspec(pi_file, t0 + n_rows/4, t0 + 3*n_rows/4, gti_file, outfile=os.path.join(out_dir, 'spec'))
+    run()
+    return run, n_rows//2
+
+
+def case_genspec_noindex(pi_file, gti_file, out_dir, t0, n_rows):
+    from solexs_tools.solexs_genspec import solexs_genspec
+    return (lambda: solexs_genspec(pi_file, t0 + n_rows/4, t0 + 3*n_rows/4, gti_file, outfile=os.path.join(out_dir, 'spec'),
+                                   use_index=False)), n_rows
+
+
+def case_sliding_windows(pi_file, gti_file, out_dir, t0, n_rows):
+    import numpy as np
+    from solexs_tools.time_index import load_time_index, window_spectra
+    load_time_index(pi_file, gti_file)
+    starts = t0 + np.arange(0, n_rows - 60, 1.)
+    return (lambda: window_spectra(load_time_index(pi_file, gti_file), starts, starts + 60)), n_rows
+
+
+def case_genmultispec(pi_file, gti_file, out_dir, t0, n_rows):
+    from solexs_tools.solexs_genspec import solexs_genmultispec
+    return (lambda: solexs_genmultispec(pi_file, t0, t0 + n_rows, 60, gti_file, output_dir=out_dir)), n_rows
+
+
+def case_genmultispec_typeII(pi_file, gti_file, out_dir, t0, n_rows):
+    from solexs_tools.solexs_genspec import solexs_genmultispec
+    return (lambda: solexs_genmultispec(pi_file, t0, t0 + n_rows, 60, gti_file, output_dir=out_dir, output_format='typeII')), n_rows
+
+
+def case_genmultispec_grouped(pi_file, gti_file, out_dir, t0, n_rows):
+    from solexs_tools.solexs_genspec import solexs_genmultispec
+    return (lambda: solexs_genmultispec(pi_file, t0, t0 + n_rows, 60, gti_file, output_dir=out_dir, output_format='typeII',
+                                        group='optimal', group_min_counts=20)), n_rows
+
+
+def case_genlc(pi_file, gti_file, out_dir, t0, n_rows):
+    from solexs_tools.solexs_genlc import solexs_genlc_bands
+    return (lambda: solexs_genlc_bands(pi_file, [(2, 4), (4, 10)], outfile=os.path.join(out_dir, 'lc'), gti_file=gti_file)), n_rows
+
+
+def case_genlc_binned(pi_file, gti_file, out_dir, t0, n_rows):
+    from solexs_tools.solexs_genlc import solexs_genlc_bands
+    return (lambda: solexs_genlc_bands(pi_file, [(2, 4), (4, 10)], time_bin=10, outfile=os.path.join(out_dir, 'lc10'), gti_file=gti_file)), n_rows
+
+
+def case_genlc_l1cache(pi_file, gti_file, out_dir, t0, n_rows):
+    from solexs_tools.l1_cache import build_l1_cache
+    from solexs_tools.solexs_genlc import solexs_genlc_bands
+    build_l1_cache(pi_file)
+    return (lambda: solexs_genlc_bands(pi_file, [(2, 4), (4, 10)], outfile=os.path.join(out_dir, 'lc'), gti_file=gti_file)), n_rows
+
+
+def case_genspec_noindex_l1cache(pi_file, gti_file, out_dir, t0, n_rows):
+    from solexs_tools.l1_cache import build_l1_cache
+    from solexs_tools.solexs_genspec import solexs_genspec
+    build_l1_cache(pi_file)
+    return (lambda: solexs_genspec(pi_file, t0 + n_rows/4, t0 + 3*n_rows/4, gti_file, outfile=os.path.join(out_dir, 'spec'),
+                                   use_index=False)), n_rows
+
+
+def case_rebin_lc(pi_file, gti_file, out_dir, t0, n_rows):
+    import numpy as np
+    from solexs_tools.solexs_genlc import rebin_lc
+    rng = np.random.default_rng(0)
+    time_arr = t0 + np.arange(n_rows, dtype=np.float64)
+    lc_data = rng.poisson(50., n_rows).astype(np.float64)
+    return (lambda: rebin_lc(lc_data, time_arr, 10, return_errors=True)), n_rows
+
+
+CASES = {name[5:]: func for name, func in globals().items() if name.startswith('case_')}
+
+
+def run_case(case, data_dir):
+    """
+    Run one case in this interpreter and return its measurements.
+    """
+    import warnings
+    warnings.simplefilter('ignore')
+
+    pi_file, gti_file = _data_files(data_dir)
+
+    t_import = time.perf_counter()
+    importlib.import_module('solexs_tools.solexs_genspec')
+    importlib.import_module('solexs_tools.solexs_genlc')
+    importlib.import_module('solexs_tools.time_index')
+    from solexs_tools.io_utils import read_l1_spectrogram
+    from solexs_tools.profiling import Profile
+    from solexs_tools.l1_cache import remove_l1_cache
+    import_s = time.perf_counter() - t_import
+
+    time_solexs = read_l1_spectrogram(pi_file, columns=('TSTART',)).time
+    t0, n_rows = float(time_solexs[0]), len(time_solexs)
+
+    # Only the *_l1cache cases read the columnar cache
+    remove_l1_cache(pi_file)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            func, rows_read = CASES[case](pi_file, gti_file, out_dir, t0, n_rows)
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+            with Profile() as prof:
+                func()
+            wall_s = prof.wall_s
+
+        rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        n_outputs = len(os.listdir(out_dir))
+
+    return {
+        'wall_s': wall_s,
+        'import_s': import_s,
+        'rows_per_s': rows_read/wall_s,
+        'outputs': n_outputs,
+        'peak_rss_mb': rss_peak/1024,
+        'peak_increase_mb': (rss_peak - rss_before)/1024,
+        'stages_s': {name: st['wall_s'] for name, st in prof.summary()['stages'].items()},
+    }
+
+
+def _run_subprocess(case, data_dir, env):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--run_case', case, '--data', data_dir],
+                            env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'Case {case} failed:\n{result.stderr}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench_products(data_dir, cases, repeat=3):
+    env = dict(os.environ)
+    env['SOLEXS_CALDB'] = os.path.join(data_dir, 'caldb')
+    env['SOLEXS_CACHE'] = os.path.join(data_dir, 'cache')
+    env['PYTHONPATH'] = REPO_DIR + os.pathsep + env.get('PYTHONPATH', '')
+
+    results = {}
+    for case in cases:
+        runs = [_run_subprocess(case, data_dir, env) for _ in range(repeat)]
+        median_run = sorted(runs, key=lambda r: r['wall_s'])[len(runs)//2]
+        results[case] = dict(median_run)
+        results[case]['wall_s_all'] = [r['wall_s'] for r in runs]
+        results[case]['peak_rss_mb'] = max(r['peak_rss_mb'] for r in runs)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the solexs_tools product generators on synthetic Level 1 data.')
+    parser.add_argument('--duration', type=float, default=86400, help='Duration of the synthetic data in seconds (default 86400)')
+    parser.add_argument('--gaps', type=int, default=20, help='Number of GTI gaps in the synthetic data (default 20)')
+    parser.add_argument('--data', type=str, default=None, help='Directory with data written by synthetic_l1.py (with --caldb DIR/caldb) to reuse')
+    parser.add_argument('--cases', type=str, nargs='+', choices=sorted(CASES), default=list(CASES), help='Cases to run (default all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case, the median is reported (default 3)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--run_case', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case is not None:
+        print(json.dumps(run_case(args.run_case, args.data)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data
+        if data_dir is None:
+            sys.path.insert(0, BENCH_DIR)
+            from synthetic_l1 import make_l1, make_caldb
+            data_dir = tmp_dir
+            make_l1(data_dir, args.duration, n_gaps=args.gaps, flares=[(args.duration/2, 50., 120., 900.)])
+            make_caldb(os.path.join(data_dir, 'caldb'), filters=('SDD2',))
+
+        results = bench_products(data_dir, args.cases, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'case':24s} {'wall s':>8s} {'Mrows/s':>8s} {'outputs':>8s} {'peak MB':>8s} {'+MB':>7s}  stages (s)")
+    for case, r in results.items():
+        stages = ', '.join(f'{name} {t:.3f}' for name, t in sorted(r['stages_s'].items(), key=lambda x: -x[1]))
+        print(f"{case:24s} {r['wall_s']:8.3f} {r['rows_per_s']/1e6:8.3f} {r['outputs']:8d} {r['peak_rss_mb']:8.0f} "
+              f"{r['peak_increase_mb']:7.0f}  {stages}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 02:41:09 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: bench_startup.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 02:41:09 pm
+#####################################################
+
+"""
+Start-up time of the solexs_tools command line entry points.
+
+Every entry point module is imported in a fresh interpreter (as the console
+scripts do) without SOLEXS_CALDB set, and the median wall time above a bare
+interpreter start is reported. The script exits with status 1 if a module
+exceeds its time budget or if a module that must stay light imports astropy.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat N] [--scale S]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# module: (time budget in ms above a bare interpreter, modules it must not import)
+ENTRY_POINTS = {
+    'solexs_tools.time_utils': (50, ('astropy', 'numpy')),
+    'solexs_tools.caldb_utils': (400, ('astropy',)),
+    'solexs_tools.solexs_genspec': (500, ('astropy',)),
+    'solexs_tools.solexs_genlc': (500, ('astropy',)),
+    'solexs_tools.l1_cache': (400, ('astropy',)),
+    'solexs_tools.spectral_fit': (500, ('astropy',)),
+    'solexs_tools.solexs_genratecube': (500, ('astropy',)),
+    'solexs_tools.solexs_genspectrogram': (500, ('astropy',)),
+    'solexs_tools.background': (500, ('astropy',)),
+}
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(code):
+    env = dict(os.environ)
+    env.pop('SOLEXS_CALDB', None)
+    env['PYTHONPATH'] = REPO_DIR + os.pathsep + env.get('PYTHONPATH', '')
+
+    t0 = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+
+    if result.returncode != 0:
+        raise RuntimeError(f'{code!r} failed:\n{result.stderr}')
+    return elapsed, result.stdout
+
+
+def bench_startup(repeat=10, scale=1.0):
+    baseline = statistics.median(_run('pass')[0] for _ in range(repeat))
+
+    results = {}
+    for module, (budget_ms, forbidden) in ENTRY_POINTS.items():
+        code = f'import sys, json, {module}; print(json.dumps(sorted(m.split(".")[0] for m in sys.modules)))'
+        timings = []
+        for _ in range(repeat):
+            elapsed, stdout = _run(code)
+            timings.append(elapsed)
+        loaded = set(json.loads(stdout))
+
+        startup_ms = (statistics.median(timings) - baseline)*1e3
+        heavy = sorted(m for m in forbidden if m in loaded)
+        results[module] = {
+            'startup_ms': round(startup_ms, 1),
+            'budget_ms': budget_ms*scale,
+            'forbidden_imports': heavy,
+            'ok': startup_ms <= budget_ms*scale and not heavy,
+        }
+
+    return baseline*1e3, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark start-up time of the solexs_tools entry points.')
+    parser.add_argument('--repeat', type=int, default=10, help='Interpreter starts per module (default 10)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Scale factor for the time budgets (e.g. 2 on slow machines)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    baseline_ms, results = bench_startup(args.repeat, args.scale)
+
+    if args.json:
+        print(json.dumps({'interpreter_ms': round(baseline_ms, 1), 'modules': results}, indent=2))
+    else:
+        print(f'Bare interpreter start: {baseline_ms:.1f} ms')
+        for module, r in results.items():
+            status = 'ok' if r['ok'] else 'FAIL'
+            heavy = f"  imports {', '.join(r['forbidden_imports'])}" if r['forbidden_imports'] else ''
+            print(f"{module:32s} {r['startup_ms']:8.1f} ms  (budget {r['budget_ms']:.0f} ms)  {status}{heavy}")
+
+    if not all(r['ok'] for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 07:20:14 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: synthetic_l1.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 07:20:14 pm
+#####################################################
+
+"""
+Synthetic SoLEXS Level 1 data and a dummy CALDB for benchmarks.
+
+Writes a Level 1 PI spectrogram (Type II PHA) with one row per second, a
+matching Level 1 GTI file and, optionally, a CALDB directory with energy
+bounds, ARF and a Gaussian RMF, so the tools can run without real data.
+
+Count spectra follow a thermal-like exp(-E/kT) shape. Flares are
+fast-rise exponential-decay (FRED) profiles that scale the count rate and
+raise kT. The GTI is the observation interval with randomly placed gaps.
+
+Usage:
+    python benchmarks/synthetic_l1.py <outdir> [--duration 86400] [--gaps 20]
+        [--flare 43200,50,120,900 ...] [--caldb <caldb_dir>] [--gzip]
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+T0 = 1707696000. # 2024-02-12T00:00:00 UTC
+N_CH = 340
+
+QUIET_RATE = 200. # counts/s above 1 keV
+QUIET_KT = 0.6 # keV
+FLARE_KT = 1.5 # keV at the flare peak, for amplitude 100
+
+
+def synthetic_ebounds(n_ch=N_CH):
+    """
+    (n_ch, 2) energy bounds in keV resembling the SoLEXS ones: narrower
+    channels at low energies, twice as wide above channel n_ch//2.
+    """
+    n_fine = n_ch//2
+    widths = np.where(np.arange(n_ch) < n_fine, 0.047645, 0.09529)
+    e_min = 0.074341 + np.concatenate([[0.], np.cumsum(widths[:-1])])
+    return np.column_stack([e_min, e_min + widths])
+
+
+def flare_profile(time_rel, peak, amplitude, rise, decay):
+    """
+    Fast-rise exponential-decay flare profile, 0 far from the flare and
+    amplitude at its peak.
+    """
+    profile = np.where(time_rel < peak, np.exp(-((time_rel - peak)/rise)**2), np.exp(-(time_rel - peak)/decay))
+    return amplitude*profile
+
+
+def parse_flare(flare_str):
+    """
+    Parse a flare given as 'peak,amplitude,rise,decay' (seconds from start,
+    peak rate relative to the quiet Sun, rise and decay times in seconds).
+    """
+    try:
+        peak, amplitude, rise, decay = (float(x) for x in flare_str.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid flare '{flare_str}', expected peak,amplitude,rise,decay.")
+    return peak, amplitude, rise, decay
+
+
+def make_gti(tstart, tstop, n_gaps, seed=0, max_gap=600.):
+    """
+    (N, 2) GTI covering [tstart, tstop] with n_gaps random gaps.
+    """
+    rng = np.random.default_rng(seed)
+    gap_starts = np.sort(rng.uniform(tstart, tstop, n_gaps))
+    gap_stops = gap_starts + rng.uniform(1., max_gap, n_gaps)
+
+    starts = np.concatenate([[tstart], gap_stops])
+    stops = np.concatenate([gap_starts, [tstop]])
+    keep = stops > starts
+    return np.column_stack([starts[keep], stops[keep]])
+
+
+def make_l1(outdir, duration=86400, n_ch=N_CH, n_gaps=20, flares=((43200., 50., 120., 900.),), filter_sdd='SDD2',
+            t0=T0, seed=0, gzip=False, chunk_rows=8192):
+    """
+    Write a synthetic Level 1 PI spectrogram file and GTI file.
+
+    Returns:
+        tuple: Paths of the PI file and the GTI file.
+    """
+    from astropy.io import fits
+
+    os.makedirs(outdir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    day = (np.datetime64(int(t0), 's').astype(str)[:10]).replace('-', '')
+    basename = os.path.join(outdir, f'AL1_SOLEXS_{day}_{filter_sdd}_L1')
+
+    n_rows = int(duration)
+    time_rel = np.arange(n_rows, dtype=np.float64)
+    e_mid = synthetic_ebounds(n_ch).mean(axis=1)
+
+    # Flare amplitude relative to the quiet rate and its temperature
+    amplitude = np.zeros(n_rows)
+    for peak, flare_amplitude, rise, decay in flares:
+        amplitude += flare_profile(time_rel, peak, flare_amplitude, rise, decay)
+    kt = QUIET_KT + (FLARE_KT - QUIET_KT)*np.clip(amplitude/100., 0, 1)
+
+    counts = np.empty((n_rows, n_ch), dtype=np.int32)
+    above_1kev = e_mid > 1.
+    for row_start in range(0, n_rows, chunk_rows):
+        rows = slice(row_start, min(row_start + chunk_rows, n_rows))
+        shape = np.exp(-np.maximum(e_mid[None,:] - 1., 0)/kt[rows,None])*(e_mid[None,:] > 0.5)
+        shape /= shape[:,above_1kev].sum(axis=1)[:,None]
+        counts[rows] = rng.poisson(QUIET_RATE*(1 + amplitude[rows,None])*shape)
+
+    channel = np.arange(n_ch, dtype=np.int32)
+    columns = [
+        fits.Column(name='SPEC_NUM', format='1J', array=np.arange(n_rows)),
+        fits.Column(name='TSTART', format='1D', array=t0 + time_rel),
+        fits.Column(name='TSTOP', format='1D', array=t0 + time_rel + 1),
+        fits.Column(name='CHANNEL', format=f'{n_ch}J', array=np.broadcast_to(channel, (n_rows, n_ch))),
+        fits.Column(name='COUNTS', format=f'{n_ch}J', array=counts),
+        fits.Column(name='EXPOSURE', format='1E', array=np.ones(n_rows)),
+    ]
+    hdu_spec = fits.BinTableHDU.from_columns(columns)
+    hdu_spec.name = 'SPECTRUM'
+    hdu_spec.header['FILTER'] = filter_sdd
+    primary_hdu = fits.PrimaryHDU()
+    primary_hdu.header['CONTENT'] = 'Type II PHA file'
+
+    pi_file = basename + '.pi' + ('.gz' if gzip else '')
+    fits.HDUList([primary_hdu, hdu_spec]).writeto(pi_file, overwrite=True)
+
+    gti = make_gti(t0, t0 + n_rows, n_gaps, seed=seed)
+    hdu_gti = fits.BinTableHDU.from_columns([fits.Column(name='START', format='1D', array=gti[:,0]),
+                                             fits.Column(name='STOP', format='1D', array=gti[:,1])])
+    hdu_gti.name = 'GTI'
+    gti_file = basename + '.gti'
+    fits.HDUList([fits.PrimaryHDU(), hdu_gti]).writeto(gti_file, overwrite=True)
+
+    return pi_file, gti_file
+
+
+def make_caldb(caldb_dir, filters=('SDD1', 'SDD2'), n_ch=N_CH, caldb_version=1, rmf=True):
+    """
+    Write a dummy CALDB (energy bounds, ARF and optionally a Gaussian RMF)
+    laid out like the real one, for use as SOLEXS_CALDB.
+    """
+    from astropy.io import fits
+
+    ebounds = synthetic_ebounds(n_ch)
+    energ_lo = 0.5 + 0.01*np.arange(2250)
+    energ_hi = energ_lo + 0.01
+    energ_mid = (energ_lo + energ_hi)/2
+    # Rough shape of a Be-window SDD effective area in cm^2
+    specresp = 1e-3*(1 - np.exp(-(energ_mid/1.5)**3))*np.exp(-energ_mid/20.)
+
+    for filter_sdd in filters:
+        os.makedirs(os.path.join(caldb_dir, 'ebounds'), exist_ok=True)
+        np.savetxt(os.path.join(caldb_dir, 'ebounds', f'energy_bins_out_{filter_sdd}_v{caldb_version}.dat'), ebounds, fmt='%.6f', delimiter='\t')
+
+        os.makedirs(os.path.join(caldb_dir, 'arf'), exist_ok=True)
+        hdu_arf = fits.BinTableHDU.from_columns([fits.Column(name='ENERG_LO', format='E', array=energ_lo),
+                                                 fits.Column(name='ENERG_HI', format='E', array=energ_hi),
+                                                 fits.Column(name='SPECRESP', format='E', array=specresp)])
+        hdu_arf.name = 'SPECRESP'
+        fits.HDUList([fits.PrimaryHDU(), hdu_arf]).writeto(
+            os.path.join(caldb_dir, 'arf', f'solexs_arf_{filter_sdd}_v{caldb_version}.arf'), overwrite=True)
+
+        if not rmf:
+            continue
+
+        # Gaussian redistribution with FWHM 170 eV at 5.9 keV scaling as sqrt(E)
+        e_ch = ebounds.mean(axis=1)
+        sigma = 0.17/2.355*np.sqrt(energ_mid/5.9)
+        f_chan, n_chan, matrix = [], [], []
+        for e, s in zip(energ_mid, sigma):
+            row = np.exp(-0.5*((e_ch - e)/s)**2)
+            row /= max(row.sum(), 1e-30)
+            nonzero = np.flatnonzero(row > 1e-6)
+            f_chan.append(np.array(nonzero[:1], dtype=np.int32))
+            n_chan.append(np.array([nonzero[-1] - nonzero[0] + 1] if len(nonzero) else [], dtype=np.int32))
+            matrix.append(row[nonzero[0]:nonzero[-1] + 1].astype(np.float32) if len(nonzero) else np.array([], dtype=np.float32))
+
+        hdu_matrix = fits.BinTableHDU.from_columns([
+            fits.Column(name='ENERG_LO', format='E', array=energ_lo),
+            fits.Column(name='ENERG_HI', format='E', array=energ_hi),
+            fits.Column(name='N_GRP', format='J', array=[len(f) for f in f_chan]),
+            fits.Column(name='F_CHAN', format='PJ()', array=f_chan),
+            fits.Column(name='N_CHAN', format='PJ()', array=n_chan),
+            fits.Column(name='MATRIX', format='PE()', array=matrix)])
+        hdu_matrix.name = 'MATRIX'
+        hdu_matrix.header['TLMIN4'] = 0
+        hdu_matrix.header['DETCHANS'] = n_ch
+        hdu_ebounds = fits.BinTableHDU.from_columns([fits.Column(name='CHANNEL', format='J', array=np.arange(n_ch)),
+                                                     fits.Column(name='E_MIN', format='E', array=ebounds[:,0]),
+                                                     fits.Column(name='E_MAX', format='E', array=ebounds[:,1])])
+        hdu_ebounds.name = 'EBOUNDS'
+
+        os.makedirs(os.path.join(caldb_dir, 'response', 'rmf'), exist_ok=True)
+        fits.HDUList([fits.PrimaryHDU(), hdu_matrix, hdu_ebounds]).writeto(
+            os.path.join(caldb_dir, 'response', 'rmf', f'solexs_gaussian_{filter_sdd}_v{caldb_version}.rmf'), overwrite=True)
+
+    return caldb_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic SoLEXS Level 1 PI and GTI files and a dummy CALDB.')
+    parser.add_argument('outdir', type=str, help='Output directory')
+    parser.add_argument('--duration', type=float, default=86400, help='Duration in seconds, one row per second (default 86400)')
+    parser.add_argument('--n_ch', type=int, default=N_CH, help=f'Number of channels (default {N_CH})')
+    parser.add_argument('--gaps', type=int, default=20, help='Number of gaps in the GTI (default 20)')
+    parser.add_argument('--flare', type=parse_flare, action='append', default=None,
+                        help='Flare as peak,amplitude,rise,decay in seconds and relative rate (may be repeated, default one flare at mid-duration)')
+    parser.add_argument('--filter', type=str, default='SDD2', help='Filter keyword (default SDD2)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default 0)')
+    parser.add_argument('--gzip', action='store_true', help='Write a gzipped PI file')
+    parser.add_argument('--caldb', type=str, default=None, help='Also write a dummy CALDB to this directory')
+    args = parser.parse_args()
+
+    flares = args.flare if args.flare is not None else [(args.duration/2, 50., 120., 900.)]
+    pi_file, gti_file = make_l1(args.outdir, args.duration, args.n_ch, args.gaps, flares, args.filter, seed=args.seed, gzip=args.gzip)
+    print(f'Level 1 PI file: {pi_file}')
+    print(f'Level 1 GTI file: {gti_file}')
+
+    if args.caldb is not None:
+        make_caldb(args.caldb, filters=(args.filter,), n_ch=args.n_ch)
+        print(f'Dummy CALDB: {args.caldb} (export SOLEXS_CALDB={os.path.abspath(args.caldb)})')
+
+
+if __name__ == '__main__':
+    main()
@@ -37,6 +37,12 @@ setup(
             "solexs-time2utc=solexs_tools.time_utils:solexs_time2utc_cli",
             "solexs-utc2time=solexs_tools.time_utils:solexs_utc2time_cli",
             "solexs-caldb-extract=solexs_tools.caldb_utils:solexs_caldb_extract_cli",
+            "solexs-server=solexs_tools.solexs_server:solexs_server_cli",
+            "solexs-l1cache=solexs_tools.l1_cache:solexs_l1cache_cli",
+            "solexs-fitspec=solexs_tools.spectral_fit:solexs_fitspec_cli",
+            "solexs-genratecube=solexs_tools.solexs_genratecube:solexs_genratecube_cli",
+            "solexs-genspectrogram=solexs_tools.solexs_genspectrogram:solexs_genspectrogram_cli",
+            "solexs-genbkg=solexs_tools.background:solexs_genbkg_cli",
         ]
     },
     classifiers=[
@@ -0,0 +1,423 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-19 02:04:37 am
+# @email: sarwade@ursc.gov.in
+# @File Name: background.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-19 02:04:37 am
+#####################################################
+
+"""
+Background spectrum of a day from its quiet intervals.
+
+The background is the summed spectrum of the good rows in a set of quiet
+time intervals divided by their exposure, i.e. a constant count rate per
+channel for the day. The intervals are given by the user, or found by
+find_quiet_intervals: the light curve of a band is binned in time_bin
+bins within the GTI, and runs of full bins whose rate is within
+QUIET_SIGMA Poisson sigma of the quantile level of all bins, lasting at
+least min_duration seconds, are taken as quiet.
+
+Spectra of the intervals are taken from the time index of the day (see
+time_index). The background is cached next to the L1 file (see
+io_utils.cache_path) as {name}.{key}.bkg.npz, where key identifies the GTI
+files and the intervals or detection parameters, and it is rebuilt when the
+L1 file or a GTI file changes. So it is computed once per day and reused
+for any number of spectra and light curves.
+
+solexs_genspec, solexs_genmultispec and solexs_genlc_bands take it with
+their background argument: spectra are written with a background PHA file
+in BACKFILE, light curves get background-subtracted RATE columns.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import warnings
+
+import numpy as np
+
+from .gti_utils import read_gti, gti_mask
+from .io_utils import cache_path, expand_file_list, read_l1_spectrogram, sort_l1_files, source_stats, l1_files_basename
+from .products import Background
+from .profiling import Profile, stage
+from .solexs_genlc import band_counts, energy_bands_to_channels, parse_ene_band
+from .time_index import load_time_index, window_spectra
+from .time_utils import unix_to_utc_array
+
+BACKGROUND_VERSION = 1
+QUIET_SIGMA = 2.
+DEFAULT_QUIET_BIN = 60. # s
+DEFAULT_QUANTILE = 0.1
+DEFAULT_MIN_DURATION = 300. # s
+
+
+class NoQuietInterval(ValueError):
+    """
+    Raised by find_quiet_intervals when an L1 file has no quiet interval.
+    """
+
+
+def find_quiet_intervals(spec_file, gti_file, ene_band=None, time_bin=DEFAULT_QUIET_BIN, quantile=DEFAULT_QUANTILE,
+                         min_duration=DEFAULT_MIN_DURATION):
+    """
+    Quiet intervals of one L1 file (see the module docstring).
+
+    Args:
+        spec_file (str): Path to the Level 1 PI spectrogram file.
+        gti_file (str or list): Level 1 GTI file(s).
+        ene_band (tuple, optional): (ene_low, ene_high) in keV of the light
+            curve (default all channels).
+        time_bin (float): Bin size of the light curve in seconds.
+        quantile (float): Quantile of the bin rates taken as the quiet level.
+        min_duration (float): Shortest quiet interval in seconds.
+
+    Returns:
+        np.ndarray: (n_intervals, 2) start and stop times in Unix seconds.
+    """
+    with stage('find_quiet') as st:
+        l1_data = read_l1_spectrogram(spec_file)
+        time_solexs = np.asarray(l1_data.time, dtype=np.float64)
+        st.rows = len(time_solexs)
+
+        if ene_band is None:
+            channel_ranges = [(0, l1_data.counts.shape[1])]
+        else:
+            channel_ranges = [b[:2] for b in energy_bands_to_channels(l1_data.filter_sdd, [ene_band])]
+        lc_data = band_counts(l1_data.counts, channel_ranges)[:,0]
+
+        mask = gti_mask(time_solexs, read_gti(gti_file))
+        bin_edges = np.arange(np.nanmin(time_solexs), np.nanmax(time_solexs) + time_bin, time_bin)
+        n_bins = len(bin_edges) - 1
+        bin_idx = np.clip(np.searchsorted(bin_edges, time_solexs[mask], side='right') - 1, 0, n_bins - 1)
+        bin_counts = np.bincount(bin_idx, weights=lc_data[mask], minlength=n_bins)
+        bin_exposure = np.bincount(bin_idx, weights=np.asarray(l1_data.exposure, dtype=np.float64)[mask], minlength=n_bins)
+
+    full = bin_exposure >= 0.9*time_bin
+    if not np.any(full):
+        raise NoQuietInterval(f'No {time_bin:g} s bin of {spec_file} is fully in the GTI.')
+
+    rate = np.zeros(n_bins)
+    rate[full] = bin_counts[full]/bin_exposure[full]
+    quiet_level = np.quantile(rate[full], quantile)
+    quiet = full & (rate <= quiet_level + QUIET_SIGMA*np.sqrt(quiet_level/time_bin))
+
+    # Runs of consecutive quiet bins
+    steps = np.diff(np.concatenate([[0], quiet.astype(np.int8), [0]]))
+    run_starts = np.flatnonzero(steps == 1)
+    run_stops = np.flatnonzero(steps == -1)
+    long_runs = (run_stops - run_starts)*time_bin >= min_duration
+
+    if not np.any(long_runs):
+        raise NoQuietInterval(f'No quiet interval of at least {min_duration:g} s found in {spec_file}.')
+
+    return np.column_stack([bin_edges[run_starts[long_runs]], bin_edges[run_stops[long_runs]]])
+
+
+def estimate_background(spec_file, gti_file, intervals):
+    """
+    Background of one L1 file from the good rows in intervals, which may have
+    no overlap with the file (the background then has no exposure).
+
+    Returns:
+        products.Background
+    """
+    intervals = np.asarray(intervals, dtype=np.float64).reshape(-1, 2)
+    l1_data = read_l1_spectrogram(spec_file)
+
+    time_index = load_time_index(spec_file, gti_file)
+    if time_index is not None:
+        spectra, exposure, _ = window_spectra(time_index, intervals[:,0], intervals[:,1])
+        counts = np.sum(spectra, axis=0)
+        exposure = float(np.sum(exposure))
+    else:
+        from .solexs_genspec import bin_spectra
+
+        mask = gti_mask(l1_data.time, read_gti(gti_file))
+        counts = np.zeros(l1_data.counts.shape[1], dtype=np.int64)
+        exposure = 0.
+        for tstart, tstop in intervals:
+            spec_cube, bin_exposure, _ = bin_spectra(l1_data.time, l1_data.counts, l1_data.exposure, [tstart, tstop], mask=mask)
+            counts = counts + spec_cube[0]
+            exposure += float(bin_exposure[0])
+
+    return Background(l1_data.channel, counts, exposure, intervals, l1_data.filter_sdd, basename=l1_files_basename(spec_file),
+                      meta={'l1_files': [spec_file]})
+
+
+def background_file(spec_file, gti_file, key):
+    """
+    Path of the cached background of spec_file for the given GTI file(s)
+    and key (intervals or detection parameters).
+    """
+    gti_files = [os.path.abspath(f) for f in expand_file_list(gti_file)]
+    key_hash = hashlib.sha1(json.dumps([BACKGROUND_VERSION, gti_files, key]).encode()).hexdigest()[:12]
+
+    name = os.path.basename(spec_file)
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return cache_path(spec_file, f'{name}.{key_hash}.bkg.npz')
+
+
+def _save_background(npz_file, background, stats):
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(npz_file), suffix='.tmp')
+    try:
+        # Saved through a file object as np.savez appends .npz to other names
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, channel=background.channel, counts=background.counts, exposure=background.exposure,
+                     intervals=background.intervals, filter_sdd=background.filter_sdd, source_stats=stats)
+        os.replace(tmp_file, npz_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+def load_background(spec_file, gti_file, intervals=None, ene_band=None, time_bin=DEFAULT_QUIET_BIN, quantile=DEFAULT_QUANTILE,
+                    min_duration=DEFAULT_MIN_DURATION, build=True):
+    """
+    Background of one L1 file (one day) from the given intervals, or from
+    the quiet intervals found with the other arguments if intervals is None
+    (see find_quiet_intervals). It is computed on first use and cached.
+
+    Returns:
+        products.Background: The background, or None if it is not cached and
+        build is False.
+    """
+    if intervals is None:
+        key = ['auto', None if ene_band is None else list(map(float, ene_band)), float(time_bin), float(quantile), float(min_duration)]
+    else:
+        intervals = np.asarray(intervals, dtype=np.float64).reshape(-1, 2)
+        key = ['intervals', intervals.tolist()]
+
+    npz_file = background_file(spec_file, gti_file, key)
+    # Sizes and mtimes of the L1 and GTI files, stored with the background
+    stats = source_stats(spec_file, *expand_file_list(gti_file))
+    try:
+        with np.load(npz_file) as bkg_data:
+            if np.array_equal(bkg_data['source_stats'], stats):
+                return Background(bkg_data['channel'], bkg_data['counts'], float(bkg_data['exposure']), bkg_data['intervals'],
+                                  str(bkg_data['filter_sdd']), basename=l1_files_basename(spec_file), meta={'l1_files': [spec_file]})
+    except (OSError, ValueError, KeyError):
+        pass # no cache or an unreadable one, (re)build it
+
+    if not build:
+        return None
+
+    with stage('build_background') as st:
+        if intervals is None:
+            intervals = find_quiet_intervals(spec_file, gti_file, ene_band=ene_band, time_bin=time_bin, quantile=quantile,
+                                             min_duration=min_duration)
+        background = estimate_background(spec_file, gti_file, intervals)
+        _save_background(npz_file, background, stats)
+        st.bytes_written = os.path.getsize(npz_file)
+
+    return background
+
+
+def combine_backgrounds(backgrounds):
+    """
+    Background of several days, from the summed counts and exposure.
+    """
+    first = backgrounds[0]
+    for background in backgrounds[1:]:
+        if background.filter_sdd != first.filter_sdd:
+            raise ValueError(f'Filter {background.filter_sdd} of a background does not match filter {first.filter_sdd}.')
+
+    l1_files = [f for background in backgrounds for f in background.meta.get('l1_files', [])]
+    return Background(first.channel, np.sum([b.counts for b in backgrounds], axis=0), float(sum(b.exposure for b in backgrounds)),
+                      np.concatenate([b.intervals for b in backgrounds]), first.filter_sdd,
+                      basename=l1_files_basename(l1_files) if l1_files else first.basename, meta={'l1_files': l1_files})
+
+
+def resolve_background(spec_file, gti_file, background):
+    """
+    Background for the background argument of the product generators.
+
+    Args:
+        spec_file (str or list): Level 1 file(s) of the product.
+        gti_file (str or list): Level 1 GTI file(s).
+        background: None, a products.Background (used as is), 'auto' for the
+            quiet intervals of every day, or (n_intervals, 2) start and stop
+            times in Unix seconds.
+
+    Returns:
+        products.Background or None
+
+    With 'auto', days without a quiet interval are left out of the
+    background, which fails only if no day has one.
+    """
+    if background is None or isinstance(background, Background):
+        return background
+
+    if isinstance(background, str):
+        if background != 'auto':
+            raise ValueError(f"Unknown background '{background}', expected 'auto' or a list of (tstart, tstop) intervals.")
+        intervals = None
+    else:
+        intervals = background
+    if gti_file is None:
+        raise ValueError('A background needs the GTI file(s).')
+
+    backgrounds = []
+    for f in sort_l1_files(spec_file):
+        try:
+            backgrounds.append(load_background(f, gti_file, intervals))
+        except NoQuietInterval as e:
+            warnings.warn(f'{e} The day is left out of the background.', UserWarning)
+    if not backgrounds:
+        raise ValueError('No quiet interval found in any of the Level 1 files for the background.')
+
+    background = combine_backgrounds(backgrounds)
+    if background.exposure <= 0:
+        raise ValueError('No good data in the background intervals.')
+    return background
+
+
+def parse_background(values):
+    """
+    Parse the --bkg option of the commands: 'auto' or intervals given as
+    tstart-tstop in Unix seconds.
+    """
+    if values is None:
+        return None
+    if list(values) == ['auto']:
+        return 'auto'
+    try:
+        return [tuple(float(t) for t in value.split('-')) for value in values]
+    except ValueError:
+        raise ValueError(f"Invalid background {' '.join(values)}, expected auto or intervals tstart-tstop in Unix seconds.")
+
+
+def subtract_lc_background(counts, error, fracexp, band_rate, band_rate_err, binned=True):
+    """
+    Background-subtracted count rate of band light curves.
+
+    Args:
+        counts, error (np.ndarray): (n_bins, n_bands) light curves, rates if
+            binned else counts per row.
+        fracexp (np.ndarray): Fractional exposure of each bin, or the
+            exposure of each row if not binned.
+        band_rate, band_rate_err (np.ndarray): Background rate of each band
+            and its error.
+
+    Returns:
+        tuple: rate, rate_err, backv and backe as (n_bins, n_bands) arrays.
+    """
+    counts = np.asarray(counts, dtype=np.float64).reshape(len(counts), -1)
+    error = np.asarray(error, dtype=np.float64).reshape(counts.shape)
+    if not binned:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            counts = counts/np.asarray(fracexp)[:,None]
+            error = error/np.asarray(fracexp)[:,None]
+
+    backv = np.broadcast_to(np.asarray(band_rate, dtype=np.float64), counts.shape).copy()
+    backe = np.broadcast_to(np.asarray(band_rate_err, dtype=np.float64), counts.shape).copy()
+    return counts - backv, np.hypot(error, backe), backv, backe
+
+
+def write_background(background, outfile, clobber=True):
+    """
+    Write a background as a Type I PI file (HDUCLAS2 = BKG) with its
+    intervals in a BKG_INTERVALS extension, and return its name.
+    """
+    with stage('write', rows=len(background.channel)) as st:
+        outfile = _write_background(background, outfile, clobber)
+        st.bytes_written = os.path.getsize(outfile)
+    return outfile
+
+
+def _write_background(background, outfile, clobber=True):
+    from astropy.io import fits
+    from .solexs_genspec import caldb_response_files, spec_hdu_list
+
+    arf_file, rmf_file = caldb_response_files(background.filter_sdd)
+
+    outfile = outfile[:-3] if outfile.endswith('.pi') else outfile
+    outfile = f'{outfile}.pi'
+
+    counts = np.asarray(background.counts, dtype=np.float64)
+    hdu_list = spec_hdu_list(background.channel, counts, np.sqrt(counts), np.zeros(len(counts)), np.min(background.intervals[:,0]),
+                             np.max(background.intervals[:,1]), background.exposure, background.filter_sdd, outfile, arf_file, rmf_file)
+    hdu_list[0].header['CONTENT'] = 'Background PI file'
+    hdu_list[1].header['HDUCLAS2'] = 'BKG'
+    hdu_list[1].header['EXPOSURE'] = background.exposure
+
+    interval_columns = [fits.Column(name='START', format='1D', array=background.intervals[:,0], unit='s'),
+                        fits.Column(name='STOP', format='1D', array=background.intervals[:,1], unit='s')]
+    hdu_intervals = fits.BinTableHDU.from_columns(fits.ColDefs(interval_columns))
+    hdu_intervals.name = 'BKG_INTERVALS'
+    hdu_intervals.header.set('TIMESYS', 'UTC')
+    hdu_list.append(hdu_intervals)
+
+    hdu_list.writeto(outfile, overwrite=clobber)
+    return outfile
+
+
+def solexs_genbkg(spec_file, gti_file, intervals=None, ene_band=None, time_bin=DEFAULT_QUIET_BIN, quantile=DEFAULT_QUANTILE,
+                  min_duration=DEFAULT_MIN_DURATION, outfile=None, clobber=True, write=True):
+    """
+    Background of one or more L1 files (days) from the given intervals or
+    their quiet intervals (see load_background).
+
+    Returns:
+        str: Output file name, or a products.Background with write=False.
+    """
+    if isinstance(intervals, str) and intervals == 'auto':
+        intervals = None
+
+    backgrounds = [load_background(f, gti_file, intervals, ene_band=ene_band, time_bin=time_bin, quantile=quantile,
+                                   min_duration=min_duration)
+                   for f in sort_l1_files(spec_file)]
+    if len(backgrounds) == 0:
+        raise ValueError(f'No data found in {spec_file}.')
+
+    background = combine_backgrounds(backgrounds)
+    if background.exposure <= 0:
+        raise ValueError('No good data in the background intervals.')
+
+    if not write:
+        return background
+    return background.to_fits(outfile, clobber)
+
+
+def solexs_genbkg_cli():
+    # Create the parser
+    parser = argparse.ArgumentParser(description='Generate a background PI file from the quiet intervals of Level 1 PI spectrogram file(s) (Type II).')
+
+    # Add arguments
+    parser.add_argument('-i','--infile', type=str, nargs='+', help='Path to the Level 1 PI spectrogram file (Type II), or several files/globs (e.g. one per day)')
+    parser.add_argument('-gti', '--gti_file', type=str, nargs='+', help='Path to the Level 1 Good Time Interval File, or several files/globs')
+    parser.add_argument('--intervals', type=str, nargs='+', default=None, help='Background intervals as tstart-tstop in Unix seconds (default: quiet intervals found in the data)')
+    parser.add_argument('--band', type=parse_ene_band, default=None, help='Energy band ene_low-ene_high in keV (e.g. 3-10) of the light curve used to find quiet intervals (default all channels)')
+    parser.add_argument('-tbin', '--time_bin', type=float, default=DEFAULT_QUIET_BIN, help=f'Time bin size in seconds of the light curve used to find quiet intervals (default {DEFAULT_QUIET_BIN:g})')
+    parser.add_argument('--quantile', type=float, default=DEFAULT_QUANTILE, help=f'Quantile of the binned rates taken as the quiet level (default {DEFAULT_QUANTILE:g})')
+    parser.add_argument('--min_duration', type=float, default=DEFAULT_MIN_DURATION, help=f'Shortest quiet interval in seconds (default {DEFAULT_MIN_DURATION:g})')
+    parser.add_argument('-o','--outfile', type=str, help='Output file name (optional)', default=None)
+    parser.add_argument('-c','--clobber', type=bool, default= False, help='Overwrite existing file if it exists')
+    parser.add_argument('--profile', type=str, nargs='?', const='-', default=None, help='Write a JSON summary of the time, rows, bytes and peak memory of each stage to this file (stdout if no file is given)')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    with Profile() if args.profile is not None else contextlib.nullcontext() as prof:
+        try:
+            intervals = parse_background(args.intervals)
+            background = solexs_genbkg(args.infile, args.gti_file, intervals=intervals, ene_band=args.band, time_bin=args.time_bin,
+                                       quantile=args.quantile, min_duration=args.min_duration, write=False)
+            edges_utc = unix_to_utc_array(background.intervals.ravel())
+            for i_interval in range(len(background.intervals)):
+                print(f'Background interval: {edges_utc[2*i_interval]} to {edges_utc[2*i_interval + 1]}')
+            print(f'Background exposure: {background.exposure:.0f} s')
+            outfile_name = background.to_fits(args.outfile, args.clobber)
+            print(f"Output written to {outfile_name}.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    if args.profile is not None:
+        prof.write_json(args.profile, command='solexs-genbkg', argv=sys.argv[1:])
@@ -9,10 +9,25 @@
 #####################################################
 
 import argparse
+import functools
+import hashlib
 import importlib.resources
 import shutil, os
+from collections import namedtuple
 from pathlib import Path
 
+import numpy as np
+
+from . import __caldb_version__
+
+Ebounds = namedtuple('Ebounds', ['channel', 'e_min', 'e_max'])
+Arf = namedtuple('Arf', ['energ_lo', 'energ_hi', 'specresp'])
+Rmf = namedtuple('Rmf', ['energ_lo', 'energ_hi', 'matrix', 'channel', 'e_min', 'e_max'])
+Rmf.__doc__ = """
+Redistribution matrix with matrix a dense (n_energy, n_channel) array and
+channel, e_min, e_max the EBOUNDS of the channels.
+"""
+
 def get_caldb_base_dir():
     CALDB_BASE_DIR = os.environ.get('SOLEXS_CALDB')
     
@@ -27,6 +42,200 @@ def get_caldb_base_dir():
     return CALDB_BASE_DIR
 
 
+def caldb_file(kind, filter_sdd, caldb_version=__caldb_version__):
+    """
+    Path of a calibration file in the CALDB.
+
+    Args:
+        kind (str): 'ebounds', 'arf' or 'rmf'.
+        filter_sdd (str): Filter/detector (FILTER keyword of the L1 file).
+        caldb_version (int): CALDB version.
+
+    Returns:
+        str: Path of the calibration file.
+    """
+    caldb_base_dir = get_caldb_base_dir()
+
+    if kind == 'ebounds':
+        return os.path.join(caldb_base_dir,'ebounds',f'energy_bins_out_{filter_sdd}_v{caldb_version}.dat')
+    elif kind == 'arf':
+        return os.path.join(caldb_base_dir,'arf',f'solexs_arf_{filter_sdd}_v{caldb_version}.arf')
+    elif kind == 'rmf':
+        return os.path.join(caldb_base_dir,'response','rmf',f'solexs_gaussian_{filter_sdd}_v{caldb_version}.rmf')
+    else:
+        raise ValueError(f"Unknown CALDB file kind '{kind}', expected 'ebounds', 'arf' or 'rmf'.")
+
+
+def _parse_ebounds(ebounds_file):
+    ene_bins = np.loadtxt(ebounds_file, ndmin=2)
+    if ene_bins.shape[1] != 2:
+        raise ValueError(f'{ebounds_file}: expected two columns (E_MIN, E_MAX), got {ene_bins.shape[1]}.')
+    return {'channel': np.arange(len(ene_bins)), 'e_min': ene_bins[:,0], 'e_max': ene_bins[:,1]}
+
+
+def _parse_arf(arf_file):
+    from astropy.io import fits
+
+    with fits.open(arf_file) as hdul:
+        data = hdul['SPECRESP'].data
+        return {'energ_lo': np.array(data['ENERG_LO'], dtype=np.float64),
+                'energ_hi': np.array(data['ENERG_HI'], dtype=np.float64),
+                'specresp': np.array(data['SPECRESP'], dtype=np.float64)}
+
+
+def _parse_rmf(rmf_file):
+    from astropy.io import fits
+
+    with fits.open(rmf_file) as hdul:
+        matrix_hdu = hdul['MATRIX'] if 'MATRIX' in hdul else hdul['SPECRESP MATRIX']
+        ebounds = hdul['EBOUNDS'].data
+        data = matrix_hdu.data
+
+        channel = np.array(ebounds['CHANNEL'], dtype=np.int64)
+        n_ch = len(channel)
+        f_chan_col = data.columns.names.index('F_CHAN') + 1
+        first_channel = int(matrix_hdu.header.get(f'TLMIN{f_chan_col}', channel[0]))
+
+        matrix = np.zeros((len(data), n_ch), dtype=np.float32)
+        for i_row, row in enumerate(data):
+            n_grp = int(row['N_GRP'])
+            f_chans = np.atleast_1d(row['F_CHAN'])[:n_grp] - first_channel
+            n_chans = np.atleast_1d(row['N_CHAN'])[:n_grp]
+            row_matrix = np.atleast_1d(row['MATRIX'])
+            i_elem = 0
+            for f_chan, n_chan in zip(f_chans, n_chans):
+                matrix[i_row, f_chan:f_chan+n_chan] = row_matrix[i_elem:i_elem+n_chan]
+                i_elem += n_chan
+
+        return {'energ_lo': np.array(data['ENERG_LO'], dtype=np.float64),
+                'energ_hi': np.array(data['ENERG_HI'], dtype=np.float64),
+                'matrix': matrix,
+                'channel': channel,
+                'e_min': np.array(ebounds['E_MIN'], dtype=np.float64),
+                'e_max': np.array(ebounds['E_MAX'], dtype=np.float64)}
+
+
+def _validate_caldb_content(kind, caldb_path, content):
+    if kind == 'ebounds':
+        lo, hi = content['e_min'], content['e_max']
+    else:
+        lo, hi = content['energ_lo'], content['energ_hi']
+
+    if np.any(hi <= lo) or np.any(np.diff(lo) <= 0):
+        raise ValueError(f'{caldb_path}: energy bins are not increasing.')
+
+    if kind == 'arf' and (len(content['specresp']) != len(lo) or np.any(content['specresp'] < 0)):
+        raise ValueError(f'{caldb_path}: SPECRESP does not match the energy grid or is negative.')
+
+    if kind == 'rmf' and content['matrix'].shape != (len(lo), len(content['channel'])):
+        raise ValueError(f'{caldb_path}: MATRIX does not match the energy and channel grids.')
+
+
+_CALDB_PARSERS = {'ebounds': _parse_ebounds, 'arf': _parse_arf, 'rmf': _parse_rmf}
+
+
+@functools.lru_cache(maxsize=32)
+def _load_caldb_content(kind, caldb_path, mtime_ns, size):
+    """
+    Parsed content of a calibration file, cached in memory per (path, mtime,
+    size) and on disk as an .npz file so that cold starts skip text and FITS
+    parsing.
+
+    The arrays are shared by all callers, so they are read-only.
+    """
+    from .io_utils import get_cache_dir
+
+    key = hashlib.sha1(f'{os.path.abspath(caldb_path)}:{mtime_ns}:{size}'.encode()).hexdigest()[:20]
+    npz_file = os.path.join(get_cache_dir(), f'caldb_{kind}_{key}.npz')
+
+    content = None
+    if os.path.exists(npz_file):
+        try:
+            with np.load(npz_file) as npz:
+                content = {k: npz[k] for k in npz.files}
+        except Exception:
+            pass
+
+    if content is None:
+        content = _CALDB_PARSERS[kind](caldb_path)
+        _validate_caldb_content(kind, caldb_path, content)
+
+        tmp_file = f'{npz_file}.{os.getpid()}.tmp.npz'
+        try:
+            np.savez(tmp_file, **content)
+            os.replace(tmp_file, npz_file)
+        except OSError:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    for arr in content.values():
+        arr.flags.writeable = False
+    return content
+
+
+def load_caldb_content(kind, filter_sdd, caldb_version=__caldb_version__):
+    caldb_path = caldb_file(kind, filter_sdd, caldb_version)
+    try:
+        stat = os.stat(caldb_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'CALDB {kind} file not found: {caldb_path}')
+    # A copy of the cached dict, whose arrays are read-only
+    return dict(_load_caldb_content(kind, caldb_path, stat.st_mtime_ns, stat.st_size))
+
+
+def load_ebounds(filter_sdd, caldb_version=__caldb_version__):
+    """
+    Channel energy bounds from the CALDB (cached).
+
+    Returns:
+        Ebounds: channel, e_min and e_max arrays (keV).
+    """
+    return Ebounds(**load_caldb_content('ebounds', filter_sdd, caldb_version))
+
+
+def load_arf(filter_sdd, caldb_version=__caldb_version__):
+    """
+    Effective area from the CALDB ARF (cached).
+
+    Returns:
+        Arf: energ_lo, energ_hi (keV) and specresp (cm2) arrays.
+    """
+    return Arf(**load_caldb_content('arf', filter_sdd, caldb_version))
+
+
+def load_rmf(filter_sdd, caldb_version=__caldb_version__):
+    """
+    Redistribution matrix from the CALDB RMF as a dense matrix (cached).
+
+    Returns:
+        Rmf: energy grid, (n_energy, n_channel) matrix and channel bounds.
+    """
+    return Rmf(**load_caldb_content('rmf', filter_sdd, caldb_version))
+
+
+def channel_to_energy(channel, filter_sdd, caldb_version=__caldb_version__):
+    """
+    Energy bounds (keV) of channels.
+
+    Returns:
+        tuple: e_min and e_max of each channel.
+    """
+    ebounds = load_ebounds(filter_sdd, caldb_version)
+    channel = np.asarray(channel)
+    return ebounds.e_min[channel], ebounds.e_max[channel]
+
+
+def energy_to_channel(energy, filter_sdd, caldb_version=__caldb_version__):
+    """
+    Channel containing each energy (keV), -1 outside the channel range.
+    """
+    ebounds = load_ebounds(filter_sdd, caldb_version)
+    energy = np.asarray(energy, dtype=np.float64)
+    channel = np.searchsorted(ebounds.e_min, energy, side='right') - 1
+    outside = (channel < 0) | (energy >= ebounds.e_max[np.clip(channel, 0, None)])
+    return np.where(outside, -1, channel)
+
+
 def walk_and_copy_resources(source_path, target_path: Path):
     for resource in source_path.iterdir():
         resource_name = resource.name
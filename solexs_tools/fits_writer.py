@@ -0,0 +1,260 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 06:31:52 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: fits_writer.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 06:31:52 pm
+#####################################################
+
+"""
+Template based writer for files with a primary HDU and one binary table.
+
+A TableTemplate is made once from an astropy HDUList built the usual way. It
+keeps the serialized headers and the on-disk (big-endian) row layout of the
+table, and writes further files by patching a few header cards (e.g.
+TSTART, TSTOP, EXPOSURE, FILENAME) and the table rows as raw bytes, without
+building astropy HDU objects for every file.
+
+append_table_rows updates an existing file of this kind, replacing the rows
+after the first n_keep with new rows, so that growing light curves are
+updated without building their tables again. The kept bytes are copied
+as they are to a new file, which then replaces the old one.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .profiling import stage
+
+FITS_BLOCK = 2880
+
+
+class TemplateMismatch(Exception):
+    """
+    Raised when a file cannot be written from the template, e.g. if a patched
+    value needs more than one header card. Callers fall back to astropy.
+    """
+
+
+def _padding(n_bytes):
+    return b'\0'*(-n_bytes % FITS_BLOCK)
+
+
+class TableTemplate:
+    """
+    Args:
+        hdu_list (HDUList): Primary HDU and binary table HDU to copy.
+        patch_keys (list): (hdu index, keyword) of the header cards that
+            change from file to file. NAXIS2 of the table is always patched.
+    """
+
+    def __init__(self, hdu_list, patch_keys):
+        from astropy.io import fits
+
+        # Writing lets astropy complete the headers before they are copied
+        hdu_list.writeto(io.BytesIO())
+
+        self._card = fits.Card
+        self.headers = []
+        self.cards = {}
+
+        patch_keys = list(patch_keys) + [(1, 'NAXIS2')]
+        for i_hdu, hdu in enumerate(hdu_list[:2]):
+            header = hdu.header
+            offsets = np.cumsum([0] + [len(card.image) for card in header.cards])
+            for j_hdu, key in patch_keys:
+                if j_hdu == i_hdu:
+                    i_card = header.index(key)
+                    if offsets[i_card + 1] - offsets[i_card] != 80:
+                        raise TemplateMismatch(f'{key} spans more than one card.')
+                    self.cards[(i_hdu, key)] = (offsets[i_card], header.comments[i_card])
+            self.headers.append(bytes(header.tostring(), 'ascii'))
+
+        table = hdu_list[1].data
+        self.dtype = table.dtype.newbyteorder('>')
+        self.rows = np.array(table, dtype=self.dtype).view(np.ndarray)
+
+    def card_image(self, i_hdu, key, value):
+        offset, comment = self.cards[(i_hdu, key)]
+        image = self._card(key, value, comment).image
+        if len(image) != 80:
+            raise TemplateMismatch(f'{key} = {value!r} needs more than one card.')
+        return offset, image.encode('ascii')
+
+    def write(self, outfile, columns, header_values, n_rows=None, clobber=True):
+        """
+        Write a file from the template.
+
+        Args:
+            outfile (str): Output file name.
+            columns (dict): Column name to values of the columns that change.
+                Other columns keep the template values, which needs n_rows to
+                be the template row count.
+            header_values (dict): (hdu index, keyword) to new value.
+            n_rows (int, optional): Number of table rows (default: template).
+            clobber (bool): Overwrite an existing file.
+        """
+        if n_rows is None or n_rows == len(self.rows):
+            rows = self.rows.copy()
+        else:
+            rows = np.zeros(n_rows, dtype=self.dtype)
+            missing = set(self.dtype.names) - set(columns)
+            if missing:
+                raise TemplateMismatch(f'Columns {sorted(missing)} are needed for {n_rows} rows.')
+
+        for name, values in columns.items():
+            rows[name] = values
+
+        header_values = dict(header_values)
+        header_values[(1, 'NAXIS2')] = len(rows)
+
+        headers = [bytearray(h) for h in self.headers]
+        for (i_hdu, key), value in header_values.items():
+            offset, image = self.card_image(i_hdu, key, value)
+            headers[i_hdu][offset:offset + 80] = image
+
+        if not clobber and os.path.exists(outfile):
+            raise OSError(f'File {outfile!r} already exists.')
+
+        data = rows.tobytes()
+        with open(outfile, 'wb') as f:
+            f.write(headers[0])
+            f.write(headers[1])
+            f.write(data)
+            f.write(_padding(len(data)))
+
+        return outfile
+
+
+# TFORM type codes of the scalar and vector columns written by solexs_tools
+_TFORM_DTYPES = {'B': 'u1', 'I': '>i2', 'J': '>i4', 'K': '>i8', 'E': '>f4', 'D': '>f8'}
+
+
+def _read_header(f):
+    """
+    Raw header at the current position of f, up to and including the block
+    with the END card.
+    """
+    blocks = []
+    while True:
+        block = f.read(FITS_BLOCK)
+        if len(block) < FITS_BLOCK:
+            raise TemplateMismatch('Truncated FITS header.')
+        blocks.append(block)
+        if any(block[i:i+8] == b'END     ' for i in range(0, FITS_BLOCK, 80)):
+            return b''.join(blocks)
+
+
+def _card_offset(raw_header, key):
+    name = key.ljust(8).encode('ascii')
+    for offset in range(0, len(raw_header), 80):
+        if raw_header[offset:offset+8] == name:
+            return offset
+    raise KeyError(key)
+
+
+def table_dtype(header):
+    """
+    On-disk (big-endian) row dtype of a binary table from its header.
+    """
+    fields = []
+    for i_col in range(1, header['TFIELDS'] + 1):
+        tform = header[f'TFORM{i_col}'].strip()
+        repeat, code = int(tform[:-1] or 1), tform[-1]
+        if code not in _TFORM_DTYPES:
+            raise TemplateMismatch(f'Column format {tform} is not supported.')
+        fields.append((header[f'TTYPE{i_col}'], _TFORM_DTYPES[code], (repeat,)) if repeat > 1
+                      else (header[f'TTYPE{i_col}'], _TFORM_DTYPES[code]))
+
+    dtype = np.dtype(fields)
+    if dtype.itemsize != header['NAXIS1']:
+        raise TemplateMismatch('Row size does not match NAXIS1.')
+    return dtype
+
+
+def append_table_rows(outfile, columns, n_keep, header_values=None):
+    """
+    Keep the first n_keep rows of the binary table of outfile (primary HDU
+    without data and one table), write the given rows after them and patch
+    NAXIS2 and header_values. The new file replaces outfile only when it is
+    complete, so an interrupted update leaves outfile as it was.
+
+    Args:
+        outfile (str): Existing file.
+        columns (dict): Column name to values of all columns of the new rows.
+        n_keep (int): Number of existing rows to keep.
+        header_values (dict, optional): (hdu index, keyword) to new value.
+
+    Returns:
+        int: Number of table rows after the update.
+    """
+    from astropy.io import fits
+
+    with open(outfile, 'rb') as f:
+        raw_headers = [_read_header(f)]
+        headers = [fits.Header.fromstring(raw_headers[0].decode('ascii'))]
+        if headers[0]['NAXIS'] != 0:
+            raise TemplateMismatch('Primary HDU has data.')
+        raw_headers.append(_read_header(f))
+        headers.append(fits.Header.fromstring(raw_headers[1].decode('ascii')))
+        data_start = f.tell()
+
+        n_rows = headers[1]['NAXIS2']
+        if not 0 <= n_keep <= n_rows:
+            raise ValueError(f'Cannot keep {n_keep} of {n_rows} rows.')
+
+        dtype = table_dtype(headers[1])
+        n_new = len(next(iter(columns.values()))) if columns else 0
+        rows = np.zeros(n_new, dtype=dtype)
+        missing = set(dtype.names) - set(columns)
+        if missing:
+            raise TemplateMismatch(f'Columns {sorted(missing)} are needed.')
+        for name, values in columns.items():
+            rows[name] = values
+
+        header_values = dict(header_values or {})
+        header_values[(1, 'NAXIS2')] = n_keep + n_new
+        cards = []
+        for (i_hdu, key), value in header_values.items():
+            image = fits.Card(key, value, headers[i_hdu].comments[key]).image
+            if len(image) != 80:
+                raise TemplateMismatch(f'{key} = {value!r} needs more than one card.')
+            offset = _card_offset(raw_headers[i_hdu], key) + (len(raw_headers[0]) if i_hdu == 1 else 0)
+            cards.append((offset, image.encode('ascii')))
+
+        keep_size = data_start + n_keep*dtype.itemsize
+        data_size = (n_keep + n_new)*dtype.itemsize
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(outfile)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp, stage('write', rows=n_new, bytes_written=keep_size + rows.nbytes):
+                f.seek(0)
+                _copy_bytes(f, tmp, keep_size)
+                tmp.write(rows.tobytes())
+                tmp.write(_padding(data_size))
+
+                for offset, image in cards:
+                    tmp.seek(offset)
+                    tmp.write(image)
+            shutil.copymode(outfile, tmp_file)
+            os.replace(tmp_file, outfile)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    return n_keep + n_new
+
+
+def _copy_bytes(src, dst, n_bytes, chunk_size=1 << 20):
+    while n_bytes > 0:
+        chunk = src.read(min(chunk_size, n_bytes))
+        if not chunk:
+            raise ValueError('File is shorter than its header says.')
+        dst.write(chunk)
+        n_bytes -= len(chunk)
@@ -0,0 +1,236 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-19 01:12:44 am
+# @email: sarwade@ursc.gov.in
+# @File Name: grouping.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-19 01:12:44 am
+#####################################################
+
+"""
+Channel grouping of many spectra at once, written as the OGIP GROUPING
+and QUALITY columns of the generated PI files.
+
+Grouping runs once over the channels, with the state of the group being
+built (counts and number of channels) kept as arrays over all spectra, so
+a batch of thousands of spectra costs a few hundred vector operations.
+A group starts at the first good channel and is closed once it has
+min_counts counts and is as wide as the width allowed at its channels, so
+groups are wider than the width only to reach min_counts:
+
+- 'mincounts': at least min_counts counts per group, one channel wide.
+- 'snr': a signal to noise ratio of at least snr per group, which for a
+  spectrum without background is snr**2 counts.
+- 'optimal': the optimal bin size of Kaastra & Bleeker (2016, A&A 587,
+  A151), a fraction of the FWHM of the resolution that depends on the
+  counts per resolution element, optionally with min_counts counts.
+
+The FWHM of each channel is measured from the CALDB RMF. Without an RMF
+a nominal Si detector resolution (Fano and electronic noise) is used.
+
+Channels with bad quality (non-zero) are never grouped. A group still
+short of min_counts at the end of the spectrum or at a bad channel gets
+quality 2, as grppha does.
+"""
+
+import functools
+import warnings
+
+import numpy as np
+
+from . import __caldb_version__
+from .caldb_utils import load_ebounds, load_rmf
+
+GROUPING_METHODS = ('mincounts', 'snr', 'optimal')
+
+# Nominal resolution used without an RMF: FWHM**2 = FWHM_NOISE**2 + 2.355**2 * F * w * E
+# with about 170 eV FWHM at 5.9 keV
+FANO_FACTOR = 0.115
+SI_PAIR_ENERGY = 3.66e-3 # keV
+FWHM_NOISE = 0.123 # keV
+
+QUALITY_GOOD = 0
+QUALITY_SHORT_GROUP = 2
+
+
+def nominal_fwhm(energy):
+    """
+    Nominal FWHM in keV of the SDD at energy (keV).
+    """
+    return np.sqrt(FWHM_NOISE**2 + 2.355**2*FANO_FACTOR*SI_PAIR_ENERGY*np.asarray(energy))
+
+
+@functools.lru_cache(maxsize=8)
+def channel_fwhm(filter_sdd, caldb_version=__caldb_version__):
+    """
+    FWHM of the resolution at every channel of a filter, in channels (cached).
+
+    The FWHM of every photon energy of the RMF is the number of channels
+    above half the peak of its row, interpolated to the channel energies.
+    Without an RMF the nominal resolution (nominal_fwhm) is used, with a
+    warning.
+
+    Returns:
+        np.ndarray: FWHM in channels of each channel of the CALDB EBOUNDS.
+    """
+    ebounds = load_ebounds(filter_sdd, caldb_version)
+    ch_energy = (ebounds.e_min + ebounds.e_max)/2
+
+    try:
+        rmf = load_rmf(filter_sdd, caldb_version)
+    except FileNotFoundError:
+        rmf = None
+
+    if rmf is None:
+        warnings.warn(f'No RMF found in the CALDB for {filter_sdd}, using the nominal resolution for grouping.', UserWarning)
+        return nominal_fwhm(ch_energy)/(ebounds.e_max - ebounds.e_min)
+
+    matrix = np.asarray(rmf.matrix)
+    peak = matrix.max(axis=1)
+    has_response = peak > 0
+    row_fwhm = np.sum(matrix[has_response] >= peak[has_response,None]/2, axis=1)
+    row_energy = ((rmf.energ_lo + rmf.energ_hi)/2)[has_response]
+
+    return np.interp(ch_energy, row_energy, row_fwhm).astype(np.float64)
+
+
+def optimal_bin_width(counts, fwhm, quality):
+    """
+    Optimal bin width in channels (Kaastra & Bleeker 2016) at every channel.
+
+    Args:
+        counts (np.ndarray): (n_spec, n_ch) counts.
+        fwhm (np.ndarray): FWHM in channels of each channel.
+        quality (np.ndarray): (n_spec, n_ch) quality, only good channels
+            count as resolution elements.
+
+    Returns:
+        np.ndarray: (n_spec, n_ch) width in channels, at least 1.
+    """
+    n_ch = counts.shape[1]
+    ch = np.arange(n_ch)
+
+    # Counts per resolution element, in a window of one FWHM around each channel
+    half = np.maximum(fwhm/2, 0.5)
+    lo = np.clip(np.round(ch - half).astype(int), 0, n_ch)
+    hi = np.clip(np.round(ch + half).astype(int) + 1, 0, n_ch)
+    cumsum = np.zeros((counts.shape[0], n_ch + 1))
+    np.cumsum(counts, axis=1, out=cumsum[:,1:])
+    counts_res = cumsum[:,hi] - cumsum[:,lo]
+
+    # Number of resolution elements of each spectrum
+    n_res = np.sum((quality == QUALITY_GOOD)/fwhm, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.log(counts_res*(1 + 0.2*n_res[:,None]))
+        ratio = np.where(x > 2.119, (0.08 + 7.0/x + 1.8/x**2)/(1 + 5.9/x), 1.)
+
+    return np.maximum(np.floor(ratio*fwhm), 1.)
+
+
+def group_channels(counts, quality, min_counts=0., max_width=None):
+    """
+    Group the channels of every spectrum.
+
+    Args:
+        counts (np.ndarray): (n_spec, n_ch) counts.
+        quality (np.ndarray): (n_spec, n_ch) or (n_ch,) quality of the channels.
+        min_counts (float): Minimum counts per group.
+        max_width (np.ndarray, optional): (n_spec, n_ch) largest width in
+            channels of a group containing each channel (default 1). Groups
+            are only wider to reach min_counts.
+
+    Returns:
+        tuple: (grouping, quality) as (n_spec, n_ch) arrays, grouping 1 at the
+            first channel of a group and -1 at the others.
+    """
+    counts = np.atleast_2d(counts)
+    n_spec, n_ch = counts.shape
+    quality = np.broadcast_to(quality, counts.shape)
+
+    # One channel at a time for all spectra, so that the channel columns are contiguous
+    counts_t = np.ascontiguousarray(counts.T, dtype=np.float64)
+    good_t = np.ascontiguousarray(quality.T == QUALITY_GOOD)
+    width_t = None if max_width is None else np.ascontiguousarray(np.broadcast_to(max_width, counts.shape).T)
+
+    grouping_t = np.empty((n_ch, n_spec), dtype=np.int16)
+    group_counts = np.zeros(n_spec)
+    group_length = np.zeros(n_spec)
+    group_width = np.ones(n_spec)
+    is_open = np.zeros(n_spec, dtype=bool)
+
+    for i_ch in range(n_ch):
+        start = ~is_open | ~good_t[i_ch]
+        if width_t is not None:
+            # A channel that allows only a narrower group starts a new one,
+            # unless the open group is still short of min_counts
+            start |= (group_length + 1 > width_t[i_ch]) & (group_counts >= min_counts)
+        grouping_t[i_ch] = np.where(start, 1, -1)
+
+        group_counts[start] = 0.
+        group_counts += counts_t[i_ch]
+        group_length[start] = 0.
+        group_length += 1.
+        if width_t is not None:
+            group_width[start] = np.inf
+            np.minimum(group_width, width_t[i_ch], out=group_width)
+
+        is_open = good_t[i_ch] & ((group_counts < min_counts) | (group_length < group_width))
+
+    grouping = grouping_t.T
+
+    # Counts of the group of every channel, to flag groups short of min_counts
+    group_id = np.cumsum(grouping == 1, axis=1) - 1
+    group_offset = np.concatenate([[0], np.cumsum(group_id[:,-1] + 1)[:-1]])
+    group_id = group_id + group_offset[:,None]
+    counts_in_group = np.bincount(group_id.ravel(), weights=counts.ravel())[group_id]
+
+    out_quality = np.array(quality, dtype=np.int16)
+    out_quality[(out_quality == QUALITY_GOOD) & (counts_in_group < min_counts)] = QUALITY_SHORT_GROUP
+
+    return np.ascontiguousarray(grouping), out_quality
+
+
+def group_spectra(counts, quality, filter_sdd, method, min_counts=None, snr=None, caldb_version=__caldb_version__):
+    """
+    Group the channels of a batch of spectra (see the module docstring).
+
+    Args:
+        counts (np.ndarray): (n_spec, n_ch) or (n_ch,) counts.
+        quality (np.ndarray): Quality of the channels before grouping.
+        filter_sdd (str): Filter keyword, for the resolution of 'optimal'.
+        method (str): 'mincounts', 'snr' or 'optimal'.
+        min_counts (float): Minimum counts per group ('mincounts', optional
+            for 'optimal').
+        snr (float): Minimum signal to noise ratio per group ('snr').
+
+    Returns:
+        tuple: (grouping, quality) arrays of the shape of counts.
+    """
+    if method not in GROUPING_METHODS:
+        raise ValueError(f"Unknown grouping '{method}', expected one of {', '.join(GROUPING_METHODS)}.")
+
+    counts = np.asarray(counts)
+    counts_2d = np.atleast_2d(counts)
+    quality = np.broadcast_to(quality, counts_2d.shape)
+
+    max_width = None
+    if method == 'mincounts':
+        if not min_counts:
+            raise ValueError("Grouping 'mincounts' needs a minimum number of counts.")
+    elif method == 'snr':
+        if not snr:
+            raise ValueError("Grouping 'snr' needs a signal to noise ratio.")
+        min_counts = snr**2
+    else:
+        fwhm = channel_fwhm(filter_sdd, caldb_version)
+        if len(fwhm) != counts_2d.shape[1]:
+            raise ValueError(f'The CALDB of {filter_sdd} has {len(fwhm)} channels, the spectra have {counts_2d.shape[1]}.')
+        max_width = optimal_bin_width(counts_2d, fwhm, quality)
+
+    grouping, quality = group_channels(counts_2d, quality, min_counts or 0., max_width)
+
+    if counts.ndim == 1:
+        return grouping[0], quality[0]
+    return grouping, quality
@@ -0,0 +1,185 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 10:12:41 am
+# @email: sarwade@ursc.gov.in
+# @File Name: gti_utils.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 10:12:41 am
+#####################################################
+
+import os
+
+import numpy as np
+
+from .io_utils import expand_file_list
+from .profiling import stage
+
+# GTIs are handled as (N, 2) float arrays of closed [START, STOP] intervals.
+# All functions below return merged GTIs: sorted, non-overlapping intervals,
+# which is what lets membership be tested with a single np.searchsorted.
+
+
+def _as_gti(gti):
+    gti = np.asarray(gti, dtype=np.float64)
+    if gti.size == 0:
+        return np.empty((0, 2))
+    if gti.ndim != 2 or gti.shape[1] != 2:
+        raise ValueError(f'GTI must be an (N, 2) array of START, STOP pairs, got shape {gti.shape}.')
+    return gti
+
+
+def _sweep_gti(gtis, min_depth):
+    """
+    Sweep over the START/STOP boundaries of all intervals in gtis and return
+    the merged intervals covered by at least min_depth of them.
+    """
+    gtis = [_as_gti(g) for g in gtis]
+    starts = np.concatenate([g[:, 0] for g in gtis])
+    stops = np.concatenate([g[:, 1] for g in gtis])
+
+    if np.any(stops < starts):
+        raise ValueError('GTI contains intervals with STOP earlier than START.')
+
+    bounds = np.concatenate([starts, stops])
+    delta = np.concatenate([np.ones(len(starts), dtype=np.int64), -np.ones(len(stops), dtype=np.int64)])
+
+    # Intervals are closed, so at equal times a START is processed before a STOP.
+    order = np.lexsort((-delta, bounds))
+    bounds = bounds[order]
+    delta = delta[order]
+    depth = np.cumsum(delta)
+
+    enter = (delta == 1) & (depth == min_depth)
+    leave = (delta == -1) & (depth == min_depth - 1)
+
+    return np.column_stack([bounds[enter], bounds[leave]])
+
+
+def merge_gti(gti):
+    """
+    Sort a GTI and merge overlapping or touching intervals.
+
+    Args:
+        gti (array_like): (N, 2) array of START, STOP pairs.
+
+    Returns:
+        np.ndarray: Merged (M, 2) GTI array.
+    """
+    return _sweep_gti([gti], 1)
+
+
+def union_gti(*gtis):
+    """
+    Union of any number of GTIs.
+
+    Returns:
+        np.ndarray: Merged (M, 2) GTI array.
+    """
+    if len(gtis) == 0:
+        return np.empty((0, 2))
+    return _sweep_gti(gtis, 1)
+
+
+def intersect_gti(*gtis):
+    """
+    Intersection of any number of GTIs.
+
+    Returns:
+        np.ndarray: Merged (M, 2) GTI array.
+    """
+    if len(gtis) == 0:
+        return np.empty((0, 2))
+    return _sweep_gti([merge_gti(g) for g in gtis], len(gtis))
+
+
+def read_gti(gti_file):
+    """
+    Read the START/STOP columns of a Level 1 GTI file.
+
+    Args:
+        gti_file (str or list): Path to the Level 1 Good Time Interval file,
+            or a list/glob of them (e.g. one per day) to be combined.
+
+    Returns:
+        np.ndarray: Merged (N, 2) GTI array.
+    """
+    from astropy.io import fits
+
+    with stage('read_gti') as st:
+        gtis = []
+        for f in expand_file_list(gti_file):
+            with fits.open(f) as hdu_gti:
+                gti_data = hdu_gti[1].data
+                gtis.append(np.column_stack([gti_data['START'], gti_data['STOP']]))
+            st.rows += len(gtis[-1])
+            st.bytes_read += os.path.getsize(f)
+        return union_gti(*gtis)
+
+
+def gti_index(times, gti):
+    """
+    Index of the (merged) GTI interval containing each time, -1 if outside.
+
+    Args:
+        times (array_like): Times in Unix seconds.
+        gti (array_like): (N, 2) array of START, STOP pairs.
+
+    Returns:
+        np.ndarray: Interval index for every time.
+    """
+    gti = merge_gti(gti)
+    times = np.asarray(times, dtype=np.float64)
+
+    idx = np.searchsorted(gti[:, 0], times, side='right') - 1
+    inside = idx >= 0
+    inside[inside] = times[inside] <= gti[idx[inside], 1]
+    idx[~inside] = -1
+
+    return idx
+
+
+def gti_mask(times, gti):
+    """
+    Boolean mask of times falling inside any GTI interval (edges inclusive).
+    """
+    with stage('gti_mask', rows=np.size(times)):
+        return gti_index(times, gti) >= 0
+
+
+def gti_exposure(times, exposure, gti):
+    """
+    Good exposure accumulated in each (merged) GTI interval.
+
+    Args:
+        times (array_like): Times in Unix seconds.
+        exposure (array_like): Exposure of each time row in seconds.
+        gti (array_like): (N, 2) array of START, STOP pairs.
+
+    Returns:
+        tuple: Merged (N, 2) GTI array and exposure in each interval.
+    """
+    gti = merge_gti(gti)
+    idx = gti_index(times, gti)
+    inside = idx >= 0
+    exposure = np.broadcast_to(np.asarray(exposure, dtype=np.float64), idx.shape)
+    gti_exp = np.bincount(idx[inside], weights=exposure[inside], minlength=len(gti))
+
+    return gti, gti_exp
+
+
+def time_bin_edges(tstart, tstop, time_bin):
+    """
+    Edges of contiguous time bins of width time_bin covering [tstart, tstop).
+    The last bin is truncated at tstop.
+    """
+    if time_bin <= 0:
+        raise ValueError(f'Time bin must be positive, got {time_bin}.')
+
+    if tstart >= tstop:
+        return np.array([tstart], dtype=np.float64)
+
+    n_bins = int(np.ceil((tstop - tstart) / time_bin))
+    bin_edges = tstart + np.arange(n_bins + 1, dtype=np.float64) * time_bin
+    bin_edges = bin_edges[bin_edges < tstop]
+    return np.append(bin_edges, tstop)
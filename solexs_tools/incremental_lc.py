@@ -0,0 +1,230 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 09:14:36 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: incremental_lc.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 09:14:36 pm
+#####################################################
+
+"""
+Incremental light curves of a growing Level 1 file.
+
+During flares the Level 1 PI file of the day is delivered several times an
+hour with new rows appended. With incremental=True, solexs_genlc_bands keeps
+a small JSON state file next to the light curve (.{outfile}.state.json, see
+io_utils.cache_path) holding the number of L1 rows processed, the last
+processed TSTART and the time bin that was still open (the bin of the last
+row). The next run reads only the rows from the open bin on, bins them on
+the same grid, and replaces the open bin and appends the new bins to the
+light curve (see fits_writer.append_table_rows), updating TSTOP and
+DATE-END. The result is the same
+as generating the light curve from scratch.
+
+The light curve is generated from scratch (overwriting it) when there is no
+usable state: on the first run, when the bands, time bin, GTI files or
+output names change, when the L1 file no longer starts with the processed
+rows (e.g. it was reprocessed) or when the light curve was changed by
+something else. Bins that were already closed are not revisited, so a GTI
+file that changes for earlier times needs a run without incremental mode.
+Gzipped L1 files are still decompressed in full whenever they change.
+"""
+
+import datetime
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from .fits_writer import append_table_rows
+from .gti_utils import read_gti
+from .io_utils import cache_path, expand_file_list, read_l1_spectrogram, l1_files_basename
+from .solexs_genlc import (band_counts, bin_lc, bin_lc_bands, energy_bands_to_channels, lc_columns, lc_outfile_names,
+                           solexs_genlc_bands)
+
+STATE_VERSION = 1
+ROW_WIDTH = 1.0 # duration of one L1 row in seconds, as in lc_bin_edges
+
+
+def lc_state_file(outfile):
+    """
+    Path of the incremental state file of a light curve.
+    """
+    return cache_path(outfile, os.path.basename(outfile) + '.state.json')
+
+
+def _load_state(state_file):
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_state(state_file, state):
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(state_file), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_file, state_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+def _table_rows(lc_file):
+    from astropy.io import fits
+    return fits.getval(lc_file, 'NAXIS2', ext=1)
+
+
+def _grid_edges(t0, tstop, time_bin, first_bin):
+    """
+    Edges from bin first_bin on of the grid time_bin_edges(t0, tstop, time_bin)
+    used by lc_bin_edges, computed the same way so that the edges are equal.
+    """
+    n_bins = int(np.ceil((tstop - t0) / time_bin))
+    bin_edges = t0 + np.arange(first_bin, n_bins + 1, dtype=np.float64) * time_bin
+    bin_edges = bin_edges[bin_edges < tstop]
+    return np.append(bin_edges, tstop)
+
+
+def _open_bin(time_solexs, lc_time, bin_edges, first_bin, next_row, n_closed):
+    """
+    Where the next update starts after binning the rows time_solexs (from L1
+    row next_row on) into the bins lc_time (from light curve row n_closed on).
+
+    Returns:
+        tuple: First L1 row to read, number of light curve rows that are
+        final and grid index of the open bin (None without binning, where
+        every row is final).
+    """
+    if bin_edges is None:
+        return next_row + len(time_solexs), n_closed + len(lc_time), None
+
+    i_open = np.searchsorted(bin_edges, time_solexs[-1], side='right') - 1
+    open_start = bin_edges[i_open]
+    return (next_row + int(np.searchsorted(time_solexs, open_start, side='left')),
+            n_closed + int(np.searchsorted(lc_time, open_start, side='left')),
+            first_bin + int(i_open))
+
+
+def _usable_state(state, params, l1_time, outfiles):
+    if state is None or state.get('params') != params:
+        return False
+    n_l1_rows = state['n_l1_rows']
+    if n_l1_rows > len(l1_time) or float(l1_time[n_l1_rows - 1]) != state['last_tstart']:
+        return False
+    return all(os.path.exists(f) and _table_rows(f) == state['n_lc_rows'] for f in outfiles)
+
+
+def genlc_incremental(spec_file, ene_bands, time_bin=None, outfile=None, split_bands=False, gti_file=None):
+    """
+    Create or update the light curves of solexs_genlc_bands (linear binning)
+    from the rows added to spec_file since the last call.
+
+    Returns:
+        str or list: Output file name, or list of file names if split_bands.
+    """
+    spec_files = expand_file_list(spec_file)
+    if len(spec_files) != 1:
+        raise ValueError('Incremental light curves need a single Level 1 file.')
+    l1_file = spec_files[0]
+
+    l1_data = read_l1_spectrogram(l1_file)
+    n_rows = len(l1_data.time)
+    if n_rows == 0:
+        raise ValueError(f'No data found in {l1_file}.')
+
+    band_channels = energy_bands_to_channels(l1_data.filter_sdd, ene_bands)
+    time_bin_str = f'{time_bin:g}sec' if time_bin else '1sec'
+    outfiles = lc_outfile_names(band_channels, l1_files_basename([l1_file]), time_bin_str, outfile, split_bands)
+    outfiles = [f if f.endswith('.lc') else f'{f}.lc' for f in outfiles]
+
+    params = {
+        'version': STATE_VERSION,
+        'l1_file': os.path.abspath(l1_file),
+        'bands': [[int(b[0]), int(b[1])] for b in band_channels],
+        'time_bin': time_bin,
+        'gti_files': None if gti_file is None else [os.path.abspath(f) for f in expand_file_list(gti_file)],
+        'outfiles': [os.path.abspath(f) for f in outfiles],
+    }
+
+    state_file = lc_state_file(outfiles[0])
+    state = _load_state(state_file)
+
+    if not _usable_state(state, params, l1_data.time, outfiles):
+        state = _genlc_full(l1_file, ene_bands, time_bin, outfile, split_bands, gti_file, l1_data.time)
+    elif state['n_l1_rows'] == n_rows:
+        print(f'No new rows in {l1_file}.')
+        return outfiles if split_bands else outfiles[0]
+    else:
+        state = _genlc_update(state, l1_data, band_channels, time_bin, outfiles, split_bands, gti_file)
+
+    state['params'] = params
+    _save_state(state_file, state)
+
+    return outfiles if split_bands else outfiles[0]
+
+
+def _genlc_full(l1_file, ene_bands, time_bin, outfile, split_bands, gti_file, l1_time):
+    time_solexs = np.asarray(l1_time, dtype=np.float64)
+    if np.any(np.diff(time_solexs) < 0):
+        raise ValueError(f'Rows of {l1_file} are not in time order, which incremental light curves need.')
+
+    lc = solexs_genlc_bands(l1_file, ene_bands, time_bin=time_bin, gti_file=gti_file, write=False)
+    lc.to_fits(outfile=outfile, clobber=True, split_bands=split_bands)
+
+    t0 = None
+    bin_edges = None
+    if time_bin:
+        t0 = float(np.nanmin(time_solexs))
+        bin_edges = _grid_edges(t0, np.nanmax(time_solexs) + ROW_WIDTH, time_bin, 0)
+
+    next_row, n_closed, open_bin = _open_bin(time_solexs, lc.time, bin_edges, 0, 0, 0)
+
+    return {'n_l1_rows': len(time_solexs), 'last_tstart': float(time_solexs[-1]), 'next_row': next_row,
+            'n_closed': n_closed, 'n_lc_rows': len(lc.time), 't0': t0, 'open_bin': open_bin}
+
+
+def _genlc_update(state, l1_data, band_channels, time_bin, outfiles, split_bands, gti_file):
+    next_row = state['next_row']
+    n_closed = state['n_closed']
+    n_rows = len(l1_data.time)
+
+    time_solexs = np.asarray(l1_data.time[next_row:], dtype=np.float64)
+    if np.any(np.diff(time_solexs) < 0):
+        raise ValueError('New rows of the Level 1 file are not in time order, which incremental light curves need.')
+
+    lc_data = band_counts(l1_data.counts[next_row:], [(b[0], b[1]) for b in band_channels])
+    exposure = np.asarray(l1_data.exposure[next_row:], dtype=np.float64)
+    gti = read_gti(gti_file) if gti_file is not None else None
+
+    if time_bin:
+        bin_edges = _grid_edges(state['t0'], time_solexs[-1] + ROW_WIDTH, time_bin, state['open_bin'])
+        lc_rate, lc_err, lc_time, fracexp, _ = bin_lc(lc_data, time_solexs, bin_edges, exposure=exposure, gti=gti)
+    else:
+        bin_edges = None
+        binned_lc = bin_lc_bands(time_solexs, lc_data, exposure, gti=gti)
+        lc_rate, lc_err, lc_time, fracexp = binned_lc['counts'], binned_lc['error'], binned_lc['time'], binned_lc['fracexp']
+
+    if len(lc_time) > 0:
+        header_values = {(0, 'DATE'): datetime.datetime.now().strftime("%Y-%m-%d"),
+                         (1, 'TSTOP'): lc_time[-1],
+                         (1, 'DATE-END'): datetime.datetime.fromtimestamp(lc_time[-1]).strftime('%Y-%m-%d %H:%M:%S')}
+
+        for i_band, lc_file in enumerate(outfiles):
+            if split_bands:
+                columns, _ = lc_columns(lc_time, lc_rate[:,i_band], lc_err[:,i_band], fracexp)
+            else:
+                columns, _ = lc_columns(lc_time, lc_rate, lc_err, fracexp)
+            append_table_rows(lc_file, {name: array for name, (_, array) in columns.items()}, n_closed, header_values)
+
+        print(f'Updated {", ".join(outfiles)} with {n_rows - state["n_l1_rows"]} new rows.')
+
+    next_row, n_closed_new, open_bin = _open_bin(time_solexs, lc_time, bin_edges, state['open_bin'], next_row, n_closed)
+
+    return {'n_l1_rows': n_rows, 'last_tstart': float(time_solexs[-1]), 'next_row': next_row,
+            'n_closed': n_closed_new, 'n_lc_rows': n_closed + len(lc_time), 't0': state['t0'], 'open_bin': open_bin}
@@ -0,0 +1,296 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 11:02:17 am
+# @email: sarwade@ursc.gov.in
+# @File Name: io_utils.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 11:02:17 am
+#####################################################
+
+import glob
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+
+from .profiling import stage
+
+L1_COLUMNS = ('TSTART', 'COUNTS', 'EXPOSURE')
+
+class L1Spectrogram(namedtuple('L1Spectrogram', ['time', 'counts', 'exposure', 'channel', 'filter_sdd', 'header', 'columns'])):
+    """
+    Columns of a Level 1 PI spectrogram file (Type II).
+
+    time, counts and exposure are views into the memory-mapped file (None if
+    the column was not requested), channel is the CHANNEL array of the first
+    row, header is the spectrogram extension header and columns holds any
+    other requested columns by name.
+
+    The spectrogram owns the open file, which close() (or leaving a with
+    block) closes. Arrays that are still referenced stay readable, as the
+    memory map is released only with the last of them.
+    """
+
+    _hdul = None
+
+    def close(self):
+        """
+        Close the Level 1 file.
+        """
+        if self._hdul is not None:
+            self._hdul.close()
+            self._hdul = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_cache_dir():
+    """
+    Directory for cached intermediate files, from the SOLEXS_CACHE environment
+    variable or ~/.cache/solexs_tools.
+    """
+    cache_dir = os.environ.get('SOLEXS_CACHE')
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'solexs_tools')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def cache_path(src_file, name):
+    """
+    Path of a cache file named name that belongs to src_file.
+
+    The cache file is a hidden sibling of src_file when its directory is
+    writable, otherwise it goes to get_cache_dir() under a name derived from
+    the absolute path of src_file.
+    """
+    src_file = os.path.abspath(src_file)
+    src_dir = os.path.dirname(src_file)
+
+    if os.access(src_dir, os.W_OK):
+        return os.path.join(src_dir, '.' + name)
+
+    path_hash = hashlib.sha1(src_file.encode()).hexdigest()[:16]
+    return os.path.join(get_cache_dir(), f'{path_hash}_{name}')
+
+
+def source_stat(src_file):
+    """
+    Size and modification time in ns of src_file, stored with data cached
+    from it and compared exactly to tell whether the file changed since.
+    """
+    stat = os.stat(src_file)
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+
+def source_stats(*src_files):
+    """
+    (n_files, 2) array of the source_stat size and mtime of src_files, for
+    caches saved as .npz files.
+    """
+    stats = [source_stat(f) for f in src_files]
+    return np.array([[s['source_size'], s['source_mtime_ns']] for s in stats], dtype=np.int64).reshape(-1, 2)
+
+
+def is_fresh(cached_file, *src_files):
+    """
+    True if cached_file exists and is not older than any of src_files.
+    """
+    if not os.path.exists(cached_file):
+        return False
+    cached_mtime = os.path.getmtime(cached_file)
+    return all(os.path.getmtime(f) <= cached_mtime for f in src_files)
+
+
+def uncompressed_l1_file(spec_file):
+    """
+    Path of an uncompressed copy of spec_file that can be memory-mapped.
+
+    Gzipped files are decompressed once into a cached sibling which is reused
+    until the original file changes. Other files are returned as they are.
+    """
+    if not spec_file.endswith('.gz'):
+        return spec_file
+
+    cached_file = cache_path(spec_file, os.path.basename(spec_file)[:-3])
+    if is_fresh(cached_file, spec_file):
+        return cached_file
+
+    # Decompress to a temporary file first so that concurrent readers never
+    # see a partially written cache.
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(cached_file), suffix='.tmp')
+    try:
+        with stage('decompress', bytes_read=os.path.getsize(spec_file)) as st, \
+                os.fdopen(fd, 'wb') as f_out, gzip.open(spec_file, 'rb') as f_in:
+            shutil.copyfileobj(f_in, f_out, length=16*1024*1024)
+            st.bytes_written = f_out.tell()
+        os.chmod(tmp_file, os.stat(spec_file).st_mode & 0o777)
+        os.replace(tmp_file, cached_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+    return cached_file
+
+
+def read_l1_spectrogram(spec_file, columns=L1_COLUMNS, use_cache=True):
+    """
+    Open a Level 1 PI spectrogram file (Type II) with memmap and read only
+    the requested columns.
+
+    Args:
+        spec_file (str): Path to the Level 1 PI spectrogram file (Type II).
+        columns (tuple): Columns to read.
+        use_cache (bool): Read from the columnar cache of the file (see
+            l1_cache) when there is one, in which case counts is an
+            l1_cache.ChunkedCounts.
+
+    Returns:
+        L1Spectrogram: Spectrogram columns and header.
+    """
+    from astropy.io import fits
+
+    if use_cache and all(name in L1_COLUMNS for name in columns):
+        from .l1_cache import open_l1_cache
+        l1_data = open_l1_cache(spec_file, columns)
+        if l1_data is not None:
+            return l1_data
+
+    l1_file = uncompressed_l1_file(spec_file)
+
+    with stage('open_l1') as st:
+        hdu1 = fits.open(l1_file, memmap=True)
+
+        try:
+            if hdu1[0].header['CONTENT'] != 'Type II PHA file':
+                raise TypeError('Input File is not Type II PHA file.')
+
+            data = hdu1[1].data
+            header = hdu1[1].header
+            st.rows = len(data)
+
+            extra_columns = {name: data[name] for name in columns if name not in L1_COLUMNS}
+
+            l1_data = L1Spectrogram(
+                time=data['TSTART'] if 'TSTART' in columns else None,
+                counts=data['COUNTS'] if 'COUNTS' in columns else None,
+                exposure=data['EXPOSURE'] if 'EXPOSURE' in columns else None,
+                channel=np.array(data['CHANNEL'][0]),
+                filter_sdd=header['FILTER'],
+                header=header,
+                columns=extra_columns,
+            )
+        except BaseException:
+            hdu1.close()
+            raise
+
+    # The memory-mapped file stays open until the spectrogram is closed
+    l1_data._hdul = hdu1
+    return l1_data
+
+
+def expand_file_list(files):
+    """
+    Expand a file name, glob pattern or list of them into a list of files.
+    """
+    if isinstance(files, (str, os.PathLike)):
+        files = [files]
+
+    file_list = []
+    for f in files:
+        matches = sorted(glob.glob(os.fspath(f)))
+        file_list.extend(matches if matches else [os.fspath(f)])
+    return file_list
+
+
+def l1_files_basename(spec_files):
+    """
+    Base name for products of one or more Level 1 files, e.g.
+    AL1_SOLEXS_20240212_SDD2_L1 or AL1_SOLEXS_20240212_SDD2_L1_to_AL1_SOLEXS_20240214_SDD2_L1.
+    """
+    basenames = [os.path.basename(f).split('.')[0] for f in expand_file_list(spec_files)]
+    if len(basenames) == 1:
+        return basenames[0]
+    return f'{basenames[0]}_to_{basenames[-1]}'
+
+
+def open_l1_spectrograms(spec_files, columns=L1_COLUMNS):
+    """
+    Open several Level 1 PI spectrogram files (e.g. one per day) with
+    read_l1_spectrogram, each once, in the time order of their first rows.
+    Files without rows are closed and left out.
+
+    Args:
+        spec_files (str or list): File names or glob patterns.
+        columns (tuple): Columns to read (TSTART is always read).
+
+    Returns:
+        list: (file name, L1Spectrogram) tuples, which the caller closes.
+    """
+    if 'TSTART' not in columns:
+        columns = ('TSTART',) + tuple(columns)
+
+    l1_list = []
+    try:
+        for spec_file in expand_file_list(spec_files):
+            l1_data = read_l1_spectrogram(spec_file, columns=columns)
+            if len(l1_data.time) > 0:
+                l1_list.append((spec_file, l1_data))
+            else:
+                l1_data.close()
+    except BaseException:
+        close_l1_spectrograms(l1_list)
+        raise
+
+    l1_list.sort(key=lambda x: x[1].time[0])
+    return l1_list
+
+
+def close_l1_spectrograms(l1_list):
+    """
+    Close the spectrograms of an open_l1_spectrograms list.
+    """
+    for _, l1_data in l1_list:
+        l1_data.close()
+
+
+def sort_l1_files(spec_files):
+    """
+    Sort Level 1 PI spectrogram files by the time of their first row.
+    Files without rows are left out.
+    """
+    l1_list = open_l1_spectrograms(spec_files, columns=('TSTART',))
+    close_l1_spectrograms(l1_list)
+    return [f for f, _ in l1_list]
+
+
+def iter_l1_spectrograms(spec_files, columns=L1_COLUMNS):
+    """
+    Iterate over several Level 1 PI spectrogram files (e.g. one per day) in
+    time order. Each file is opened once (see open_l1_spectrograms) and
+    closed when the next one is yielded.
+
+    Args:
+        spec_files (str or list): File names or glob patterns.
+        columns (tuple): Columns to read.
+
+    Yields:
+        tuple: File name and its L1Spectrogram.
+    """
+    l1_list = open_l1_spectrograms(spec_files, columns=columns)
+    try:
+        for spec_file, l1_data in l1_list:
+            yield spec_file, l1_data
+            l1_data.close()
+    finally:
+        close_l1_spectrograms(l1_list)
@@ -0,0 +1,417 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 10:02:51 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: l1_cache.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 10:02:51 pm
+#####################################################
+
+"""
+Columnar cache of Level 1 PI spectrograms.
+
+The FITS rows of a Level 1 file hold all 340 channels of one second, so any
+read of a few channels touches the whole file, and gzipped files have to be
+decompressed first. build_l1_cache converts a Level 1 file once into a
+directory next to it (.{name}.l1c, see io_utils.cache_path):
+
+    meta.json           shape, chunking, dtype, CHANNEL, FILTER and the
+                        header of the spectrogram extension
+    time.npy            TSTART
+    exposure.npy        EXPOSURE
+    counts/{c}.{t}.npy  COUNTS of channel chunk c and time chunk t, stored
+                        channel-major as (channels, rows)
+
+COUNTS are stored in the smallest unsigned integer type that holds them.
+Chunks are plain .npy files that are memory-mapped, or compressed with zlib,
+lz4 or blosc (counts/{c}.{t}.{compression}) when those packages are
+installed.
+
+read_l1_spectrogram uses the cache when it is present and matches the size
+and modification time of the Level 1 file. COUNTS are then a ChunkedCounts
+that reads chunks on first access, and band light curves (band_counts) sum
+only the channel chunks of their bands.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import zlib
+
+import numpy as np
+
+from .io_utils import L1Spectrogram, L1_COLUMNS, cache_path, expand_file_list, source_stat
+from .profiling import stage
+
+L1_CACHE_VERSION = 1
+COMPRESSIONS = ('none', 'zlib', 'lz4', 'blosc')
+
+
+def l1_cache_dir(spec_file):
+    """
+    Path of the columnar cache directory of spec_file.
+    """
+    name = os.path.basename(spec_file)
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return cache_path(spec_file, name + '.l1c')
+
+
+def _codec(compression, itemsize=1):
+    """
+    (compress, decompress) functions of a chunk compression.
+    """
+    if compression == 'zlib':
+        return (lambda data: zlib.compress(data, 1)), zlib.decompress
+    if compression == 'lz4':
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ValueError("Compression 'lz4' needs the lz4 package.")
+        return lz4.frame.compress, lz4.frame.decompress
+    if compression == 'blosc':
+        try:
+            import blosc
+        except ImportError:
+            raise ValueError("Compression 'blosc' needs the blosc package.")
+        return (lambda data: blosc.compress(data, typesize=itemsize, cname='lz4', shuffle=blosc.SHUFFLE)), blosc.decompress
+    raise ValueError(f"Unknown compression '{compression}', expected one of {', '.join(COMPRESSIONS)}.")
+
+
+def build_l1_cache(spec_file, chunk_rows=8192, chunk_channels=32, compression='none'):
+    """
+    Convert a Level 1 PI spectrogram file into the columnar cache.
+
+    Args:
+        spec_file (str): Path to the Level 1 PI spectrogram file (Type II).
+        chunk_rows (int): Rows per time chunk.
+        chunk_channels (int): Channels per channel chunk.
+        compression (str): 'none' (memory-mapped .npy chunks), 'zlib',
+            'lz4' or 'blosc'.
+
+    Returns:
+        str: Path of the cache directory.
+    """
+    from .io_utils import read_l1_spectrogram
+
+    if compression != 'none':
+        _codec(compression) # fail before reading if the package is missing
+
+    # Taken before reading, so that a change during the build is noticed
+    stat = source_stat(spec_file)
+    l1_data = read_l1_spectrogram(spec_file, use_cache=False)
+    counts = l1_data.counts
+    n_rows, n_ch = counts.shape
+
+    max_counts = 0
+    for row_start in range(0, n_rows, chunk_rows):
+        chunk = np.asarray(counts[row_start:row_start + chunk_rows])
+        if chunk.size and chunk.min() < 0:
+            raise ValueError(f'Negative COUNTS in {spec_file}.')
+        max_counts = max(max_counts, int(chunk.max()) if chunk.size else 0)
+    counts_dtype = np.min_scalar_type(max_counts).newbyteorder('<')
+    if compression != 'none':
+        compress, _ = _codec(compression, counts_dtype.itemsize)
+
+    cache_dir = l1_cache_dir(spec_file)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(cache_dir), suffix='.tmp')
+    try:
+        with stage('build_l1_cache', rows=n_rows, bytes_read=counts.nbytes) as st:
+            os.makedirs(os.path.join(tmp_dir, 'counts'))
+            np.save(os.path.join(tmp_dir, 'time.npy'), np.asarray(l1_data.time, dtype=np.float64))
+            np.save(os.path.join(tmp_dir, 'exposure.npy'), np.asarray(l1_data.exposure, dtype=np.float64))
+
+            for t_chunk, row_start in enumerate(range(0, n_rows, chunk_rows)):
+                chunk = np.asarray(counts[row_start:row_start + chunk_rows]).astype(counts_dtype)
+                for c_chunk, ch_start in enumerate(range(0, n_ch, chunk_channels)):
+                    block = np.ascontiguousarray(chunk[:, ch_start:ch_start + chunk_channels].T)
+                    if compression == 'none':
+                        np.save(os.path.join(tmp_dir, 'counts', f'{c_chunk}.{t_chunk}.npy'), block)
+                    else:
+                        with open(os.path.join(tmp_dir, 'counts', f'{c_chunk}.{t_chunk}.{compression}'), 'wb') as f:
+                            f.write(compress(block.tobytes()))
+
+            meta = {
+                'version': L1_CACHE_VERSION,
+                'source': os.path.abspath(spec_file),
+                'n_rows': n_rows,
+                'n_ch': n_ch,
+                'chunk_rows': chunk_rows,
+                'chunk_channels': chunk_channels,
+                'counts_dtype': counts_dtype.str,
+                'compression': compression,
+                'channel': [int(c) for c in l1_data.channel],
+                'filter': l1_data.filter_sdd,
+                'header': l1_data.header.tostring(),
+            }
+            meta.update(stat)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+
+            for root, _, files in os.walk(tmp_dir):
+                st.bytes_written += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+
+        # Writable by the owner (so that it can be replaced when the Level 1
+        # file changes), readable and searchable by the same users as the
+        # Level 1 file
+        read_mode = os.stat(spec_file).st_mode & 0o044
+        os.chmod(tmp_dir, 0o700 | read_mode | read_mode >> 2)
+        remove_l1_cache(spec_file)
+        os.replace(tmp_dir, cache_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return cache_dir
+
+
+def remove_l1_cache(spec_file):
+    """
+    Remove the columnar cache of spec_file if there is one.
+    """
+    cache_dir = l1_cache_dir(spec_file)
+    try:
+        # Caches of earlier versions copied a read-only mode of the L1 file
+        os.chmod(cache_dir, os.stat(cache_dir).st_mode | 0o700)
+    except OSError:
+        return
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _load_meta(spec_file):
+    """
+    meta.json of the cache of spec_file, or None if there is no cache or it
+    does not match the current file.
+    """
+    try:
+        with open(os.path.join(l1_cache_dir(spec_file), 'meta.json')) as f:
+            meta = json.load(f)
+        stat = source_stat(spec_file)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('version') != L1_CACHE_VERSION or any(meta.get(k) != v for k, v in stat.items()):
+        return None
+    return meta
+
+
+def has_l1_cache(spec_file):
+    """
+    True if spec_file has a columnar cache that matches the file.
+    """
+    return _load_meta(spec_file) is not None
+
+
+def open_l1_cache(spec_file, columns=L1_COLUMNS):
+    """
+    L1Spectrogram read from the columnar cache of spec_file, or None if
+    there is no cache that matches the file.
+    """
+    meta = _load_meta(spec_file)
+    if meta is None:
+        return None
+
+    from astropy.io import fits
+
+    cache_dir = l1_cache_dir(spec_file)
+    with stage('open_l1', rows=meta['n_rows']):
+        return L1Spectrogram(
+            time=np.load(os.path.join(cache_dir, 'time.npy'), mmap_mode='r') if 'TSTART' in columns else None,
+            counts=ChunkedCounts(_ChunkStore(cache_dir, meta)) if 'COUNTS' in columns else None,
+            exposure=np.load(os.path.join(cache_dir, 'exposure.npy'), mmap_mode='r') if 'EXPOSURE' in columns else None,
+            channel=np.array(meta['channel']),
+            filter_sdd=meta['filter'],
+            header=fits.Header.fromstring(meta['header']),
+            columns={},
+        )
+
+
+class _ChunkStore:
+    """
+    Chunk files of one cache directory. Chunks are loaded (memory-mapped or
+    decompressed) on first use and kept.
+    """
+
+    def __init__(self, cache_dir, meta):
+        self.cache_dir = cache_dir
+        self.n_rows = meta['n_rows']
+        self.n_ch = meta['n_ch']
+        self.chunk_rows = meta['chunk_rows']
+        self.chunk_channels = meta['chunk_channels']
+        self.dtype = np.dtype(meta['counts_dtype'])
+        self.compression = meta['compression']
+        self._chunks = {}
+
+    def chunk(self, c_chunk, t_chunk):
+        """
+        (channels, rows) COUNTS of channel chunk c_chunk and time chunk t_chunk.
+        """
+        key = (c_chunk, t_chunk)
+        if key not in self._chunks:
+            if self.compression == 'none':
+                block = np.load(os.path.join(self.cache_dir, 'counts', f'{c_chunk}.{t_chunk}.npy'), mmap_mode='r')
+            else:
+                _, decompress = _codec(self.compression, self.dtype.itemsize)
+                with open(os.path.join(self.cache_dir, 'counts', f'{c_chunk}.{t_chunk}.{self.compression}'), 'rb') as f:
+                    data = decompress(f.read())
+                shape = (min(self.chunk_channels, self.n_ch - c_chunk*self.chunk_channels),
+                         min(self.chunk_rows, self.n_rows - t_chunk*self.chunk_rows))
+                block = np.frombuffer(data, dtype=self.dtype).reshape(shape)
+            self._chunks[key] = block
+        return self._chunks[key]
+
+
+def _as_slice(idx):
+    """
+    idx as a slice if it is a contiguous increasing range, else idx.
+    """
+    if len(idx) > 0 and idx[-1] - idx[0] == len(idx) - 1 and np.all(np.diff(idx) == 1):
+        return slice(int(idx[0]), int(idx[-1]) + 1)
+    return idx
+
+
+class ChunkedCounts:
+    """
+    (n_rows, n_ch) COUNTS of a columnar cache, read chunk by chunk.
+
+    Slicing rows (counts[a:b]) gives another ChunkedCounts without reading
+    anything. Any other indexing, np.asarray() or astype() read the chunks
+    needed and return an np.ndarray. channel_sums gives band light curves
+    from the needed channel chunks only.
+    """
+
+    ndim = 2
+
+    def __init__(self, store, row_start=0, row_stop=None):
+        self._store = store
+        self._row_start = row_start
+        self._row_stop = store.n_rows if row_stop is None else row_stop
+
+    @property
+    def shape(self):
+        return (self._row_stop - self._row_start, self._store.n_ch)
+
+    @property
+    def dtype(self):
+        return self._store.dtype
+
+    @property
+    def nbytes(self):
+        return self.shape[0]*self.shape[1]*self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 2:
+            raise IndexError('Too many indices for COUNTS.')
+        rows, chans = key + (slice(None),)*(2 - len(key))
+        if isinstance(rows, slice) and rows.step in (None, 1) and isinstance(chans, slice) and chans == slice(None):
+            start, stop, _ = rows.indices(self.shape[0])
+            return ChunkedCounts(self._store, self._row_start + start, self._row_start + max(start, stop))
+        return self._read(rows, chans)
+
+    def __array__(self, dtype=None, copy=None):
+        counts = self._read(slice(None), slice(None))
+        return counts if dtype is None else counts.astype(dtype)
+
+    def astype(self, dtype):
+        return self._read(slice(None), slice(None)).astype(dtype)
+
+    def _read(self, rows, chans):
+        store = self._store
+        row_idx = np.arange(self._row_start, self._row_stop)[rows]
+        ch_idx = np.arange(store.n_ch)[chans]
+        scalar_row, scalar_ch = row_idx.ndim == 0, ch_idx.ndim == 0
+        row_idx, ch_idx = np.atleast_1d(row_idx), np.atleast_1d(ch_idx)
+
+        counts = np.empty((len(row_idx), len(ch_idx)), dtype=store.dtype)
+        t_chunks = row_idx // store.chunk_rows
+        c_chunks = ch_idx // store.chunk_channels
+
+        for t_chunk in np.unique(t_chunks):
+            out_rows = _as_slice(np.flatnonzero(t_chunks == t_chunk))
+            chunk_rows = _as_slice(row_idx[out_rows] - t_chunk*store.chunk_rows)
+            for c_chunk in np.unique(c_chunks):
+                out_chans = _as_slice(np.flatnonzero(c_chunks == c_chunk))
+                chunk_chans = _as_slice(ch_idx[out_chans] - c_chunk*store.chunk_channels)
+                block = store.chunk(c_chunk, t_chunk)
+                if isinstance(chunk_chans, slice) or isinstance(chunk_rows, slice):
+                    block = block[chunk_chans][:, chunk_rows]
+                else:
+                    block = block[np.ix_(chunk_chans, chunk_rows)]
+                if isinstance(out_rows, slice) or isinstance(out_chans, slice):
+                    counts[out_rows, out_chans] = block.T
+                else:
+                    counts[np.ix_(out_rows, out_chans)] = block.T
+
+        if scalar_row and scalar_ch:
+            return counts[0, 0]
+        if scalar_row:
+            return counts[0]
+        if scalar_ch:
+            return counts[:, 0]
+        return counts
+
+    def channel_sums(self, channel_ranges):
+        """
+        Counts summed over channel ranges [ch_low, ch_high), as band_counts,
+        reading only the channel chunks of the ranges.
+
+        Returns:
+            tuple: (n_rows, n_bands) band counts and the number of bytes of
+            COUNTS read.
+        """
+        store = self._store
+        cr, cc = store.chunk_rows, store.chunk_channels
+        lc_data = np.zeros((self.shape[0], len(channel_ranges)), dtype=np.int64)
+        n_bytes = 0
+
+        for t_chunk in range(self._row_start // cr, (self._row_stop - 1) // cr + 1 if self._row_stop > self._row_start else 0):
+            row_start = max(self._row_start, t_chunk*cr)
+            row_stop = min(self._row_stop, (t_chunk + 1)*cr)
+            out_rows = slice(row_start - self._row_start, row_stop - self._row_start)
+            chunk_rows = slice(row_start - t_chunk*cr, row_stop - t_chunk*cr)
+
+            for i_band, (ch_low, ch_high) in enumerate(channel_ranges):
+                for c_chunk in range(ch_low // cc, (ch_high - 1) // cc + 1 if ch_high > ch_low else 0):
+                    chunk_chans = slice(max(ch_low, c_chunk*cc) - c_chunk*cc, min(ch_high, (c_chunk + 1)*cc) - c_chunk*cc)
+                    block = store.chunk(c_chunk, t_chunk)[chunk_chans, chunk_rows]
+                    lc_data[out_rows, i_band] += block.sum(axis=0, dtype=np.int64)
+                    n_bytes += block.nbytes
+
+        return lc_data, n_bytes
+
+    def __repr__(self):
+        return f'ChunkedCounts(shape={self.shape}, dtype={self.dtype})'
+
+
+def solexs_l1cache_cli():
+    # Create the parser
+    parser = argparse.ArgumentParser(description='Convert Level 1 PI spectrogram files (Type II) into the columnar cache read by solexs-genspec and solexs-genlc.')
+
+    # Add arguments
+    parser.add_argument('-i','--infile', type=str, nargs='+', help='Level 1 PI spectrogram files (Type II) or globs')
+    parser.add_argument('--chunk_rows', type=int, default=8192, help='Rows per time chunk (default 8192)')
+    parser.add_argument('--chunk_channels', type=int, default=32, help='Channels per channel chunk (default 32)')
+    parser.add_argument('--compression', type=str, choices=COMPRESSIONS, default='none', help='Chunk compression (default none, memory-mapped); lz4 and blosc need the lz4 or blosc packages')
+    parser.add_argument('--remove', action='store_true', help='Remove the cache of the files instead')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    for spec_file in expand_file_list(args.infile):
+        try:
+            if args.remove:
+                remove_l1_cache(spec_file)
+                print(f'Removed cache of {spec_file}.')
+            else:
+                cache_dir = build_l1_cache(spec_file, args.chunk_rows, args.chunk_channels, args.compression)
+                print(f'Cache of {spec_file} written to {cache_dir}.')
+        except Exception as e:
+            print(f"Error: {e}")
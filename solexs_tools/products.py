@@ -0,0 +1,486 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 05:48:30 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: products.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 05:48:30 pm
+#####################################################
+
+"""
+In-memory spectra and light curves.
+
+solexs_genspec, solexs_genmultispec, solexs_genlc_bands, solexs_genratecube,
+solexs_genspectrogram and solexs_genbkg return these objects when called with write=False. Their arrays can be used directly (e.g.
+in NumPy or Sherpa) and .to_fits() writes the same files the functions write
+with write=True.
+"""
+
+import os
+
+import numpy as np
+
+
+class Spectrum:
+    """
+    Type I spectrum accumulated over [tstart, tstop).
+
+    Attributes:
+        channel (np.ndarray): Channel numbers.
+        counts (np.ndarray): Counts in each channel.
+        stat_err (np.ndarray): Statistical (Poisson) error on the counts.
+        sys_err (np.ndarray): Systematic error on the counts.
+        tstart, tstop (float): Time range in Unix seconds.
+        exposure (float): Good exposure in seconds.
+        filter_sdd (str): Filter keyword of the L1 file (e.g. SDD2).
+        basename (str): Base name of the L1 file(s), used for file names.
+        meta (dict): Other metadata, e.g. the L1 files used.
+        grouping, quality (np.ndarray): GROUPING and QUALITY of grouped
+            channels (see grouping), else None.
+        background (Background): Background written with the spectrum and
+            named in its BACKFILE, else None.
+    """
+
+    def __init__(self, channel, counts, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, basename=None, meta=None,
+                 grouping=None, quality=None, background=None):
+        self.channel = channel
+        self.counts = counts
+        self.stat_err = stat_err
+        self.sys_err = sys_err
+        self.tstart = tstart
+        self.tstop = tstop
+        self.exposure = exposure
+        self.filter_sdd = filter_sdd
+        self.basename = basename
+        self.meta = {} if meta is None else meta
+        self.grouping = grouping
+        self.quality = quality
+        self.background = background
+
+    @property
+    def rate(self):
+        return self.counts/self.exposure
+
+    def default_outfile(self):
+        """
+        Output name used by solexs_genspec, {basename}_{HHMMSS}_{HHMMSS} (UTC).
+        """
+        from .time_utils import unix_to_hhmmss
+
+        edges_hhmmss = unix_to_hhmmss([self.tstart, self.tstop])
+        return f'{self.basename}_{edges_hhmmss[0]}_{edges_hhmmss[1]}'
+
+    def to_fits(self, outfile=None, clobber=True):
+        """
+        Write a Type I PI file ({outfile}.pi), and its background in the same
+        directory, and return its name.
+        """
+        from .solexs_genspec import write_spec
+
+        if outfile is None:
+            outfile = self.default_outfile()
+
+        backfile = None
+        if self.background is not None:
+            backfile = self.background.to_fits_beside(outfile, clobber)
+
+        return write_spec(self.channel, self.counts, self.stat_err, self.sys_err, self.tstart, self.tstop, self.exposure,
+                          self.filter_sdd, outfile, clobber, self.grouping, self.quality, backfile)
+
+    def __repr__(self):
+        return (f'Spectrum({self.filter_sdd}, {self.tstart} - {self.tstop}, exposure={self.exposure:g} s, '
+                f'counts={np.sum(self.counts):g})')
+
+
+class SpectrumSet:
+    """
+    Spectra in consecutive time bins, as written by solexs_genmultispec.
+
+    Only bins with data are kept. Indexing or iterating gives Spectrum
+    objects, slicing gives a SpectrumSet of the selected spectra.
+
+    Attributes:
+        channel (np.ndarray): Channel numbers.
+        counts (np.ndarray): (n_spectra, n_ch) counts.
+        tstart, tstop, exposure (np.ndarray): Time range and good exposure of
+            every spectrum.
+        time_bin (float): Time bin size in seconds (the shortest bin for adaptive
+            binning).
+        filter_sdd (str): Filter keyword of the L1 file.
+        basename (str): Base name of the L1 file, used for file names.
+        bin_edges (np.ndarray): Edges of all time bins including empty ones,
+            which set the file name of Type II output. Defaults to the
+            edges of the spectra.
+        time_bin_str (str): Time binning part of Type II file names for
+            adaptive binning (e.g. min1000cts), else None.
+        meta (dict): Other metadata.
+        grouping, quality (np.ndarray): (n_spectra, n_ch) GROUPING and QUALITY
+            of grouped channels (see grouping), else None.
+        background (Background): Background written with the spectra and
+            named in their BACKFILE, else None.
+    """
+
+    def __init__(self, channel, counts, tstart, tstop, exposure, time_bin, filter_sdd, basename=None, bin_edges=None,
+                 time_bin_str=None, meta=None, grouping=None, quality=None, background=None):
+        self.channel = channel
+        self.counts = counts
+        self.tstart = tstart
+        self.tstop = tstop
+        self.exposure = exposure
+        self.time_bin = time_bin
+        self.filter_sdd = filter_sdd
+        self.basename = basename
+        self.bin_edges = bin_edges
+        self.time_bin_str = time_bin_str
+        self.meta = {} if meta is None else meta
+        self.grouping = grouping
+        self.quality = quality
+        self.background = background
+
+    @property
+    def stat_err(self):
+        return np.sqrt(self.counts)
+
+    @property
+    def rate(self):
+        return self.counts/self.exposure[:,None]
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return SpectrumSet(self.channel, self.counts[i], self.tstart[i], self.tstop[i], self.exposure[i], self.time_bin,
+                               self.filter_sdd, self.basename, None, self.time_bin_str, self.meta,
+                               None if self.grouping is None else self.grouping[i], None if self.quality is None else self.quality[i],
+                               self.background)
+        if not isinstance(i, (int, np.integer)):
+            raise TypeError(f'SpectrumSet indices must be integers or slices, not {type(i).__name__}.')
+        return Spectrum(self.channel, self.counts[i], np.sqrt(self.counts[i]), np.zeros(len(self.channel)),
+                        self.tstart[i], self.tstop[i], self.exposure[i], self.filter_sdd, self.basename, self.meta,
+                        None if self.grouping is None else self.grouping[i], None if self.quality is None else self.quality[i],
+                        self.background)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_fits(self, output_dir='.', output_format='typeI', clobber=True):
+        """
+        Write one Type I PI file per spectrum ('typeI') or all spectra in one
+        Type II PHA file ('typeII') in output_dir, with the background.
+
+        Returns:
+            list: Output file names.
+        """
+        from .solexs_genspec import write_multispec_typeI, write_multispec_typeII
+
+        if output_format not in ('typeI', 'typeII'):
+            raise ValueError(f"Unknown output format '{output_format}', expected 'typeI' or 'typeII'.")
+
+        # The writers take bin edges and skip empty bins, so give them every
+        # spectrum as its own bin, with empty bins for any gaps in between.
+        bin_edges = self.bin_edges
+        if bin_edges is None:
+            gaps = self.tstart[1:] != self.tstop[:-1]
+            bin_edges = np.insert(self.tstop, 0, self.tstart[0])
+            bin_edges = np.insert(bin_edges, np.flatnonzero(gaps) + 2, self.tstart[1:][gaps])
+        filled = np.isin(bin_edges[:-1], self.tstart)
+
+        n_bins = len(bin_edges) - 1
+        spec_cube = np.zeros((n_bins,) + self.counts.shape[1:], dtype=self.counts.dtype)
+        spec_cube[filled] = self.counts
+        bin_exposure = np.zeros(n_bins)
+        bin_exposure[filled] = self.exposure
+        bin_rows = filled.astype(np.int64)
+
+        grouping = quality = None
+        if self.grouping is not None:
+            grouping = np.ones((n_bins,) + self.grouping.shape[1:], dtype=self.grouping.dtype)
+            grouping[filled] = self.grouping
+            quality = np.zeros((n_bins,) + self.quality.shape[1:], dtype=self.quality.dtype)
+            quality[filled] = self.quality
+
+        backfile = None
+        if self.background is not None:
+            backfile = self.background.to_fits_beside(os.path.join(output_dir, self.basename), clobber)
+
+        if output_format == 'typeII':
+            return [write_multispec_typeII(self.channel, spec_cube, bin_exposure, bin_rows, bin_edges, self.filter_sdd,
+                                           self.basename, self.time_bin, output_dir, clobber, self.time_bin_str, grouping, quality,
+                                           backfile)]
+        return write_multispec_typeI(self.channel, spec_cube, bin_exposure, bin_rows, bin_edges, self.filter_sdd,
+                                     self.basename, output_dir, clobber, grouping, quality, backfile)
+
+    def __repr__(self):
+        return f'SpectrumSet({self.filter_sdd}, {len(self)} spectra, time_bin={self.time_bin:g} s)'
+
+
+class Background:
+    """
+    Background spectrum of one or more days from the good rows in a set of
+    time intervals, as made by solexs_genbkg (see background).
+
+    Attributes:
+        channel (np.ndarray): Channel numbers.
+        counts (np.ndarray): Counts in each channel in the intervals.
+        exposure (float): Good exposure of the intervals in seconds.
+        intervals (np.ndarray): (n_intervals, 2) start and stop times in Unix
+            seconds.
+        filter_sdd (str): Filter keyword of the L1 file(s).
+        basename (str): Base name of the L1 file(s), used for file names.
+        meta (dict): Other metadata, e.g. the L1 files used.
+    """
+
+    def __init__(self, channel, counts, exposure, intervals, filter_sdd, basename=None, meta=None):
+        self.channel = channel
+        self.counts = counts
+        self.exposure = exposure
+        self.intervals = intervals
+        self.filter_sdd = filter_sdd
+        self.basename = basename
+        self.meta = {} if meta is None else meta
+
+    @property
+    def rate(self):
+        return self.counts/self.exposure
+
+    @property
+    def rate_err(self):
+        return np.sqrt(self.counts)/self.exposure
+
+    def band_rate(self, channel_ranges):
+        """
+        Background rate and its error in each (ch_low, ch_high) channel range.
+        """
+        band_counts = np.array([np.sum(self.counts[ch_low:ch_high]) for ch_low, ch_high in channel_ranges], dtype=np.float64)
+        return band_counts/self.exposure, np.sqrt(band_counts)/self.exposure
+
+    def default_outfile(self):
+        """
+        Output name used by solexs_genbkg, {basename}_bkg.
+        """
+        return f'{self.basename}_bkg'
+
+    def to_fits(self, outfile=None, clobber=True):
+        """
+        Write a background PI file ({outfile}.pi) and return its name.
+        """
+        from .background import write_background
+
+        if outfile is None:
+            outfile = self.default_outfile()
+        return write_background(self, outfile, clobber)
+
+    def to_fits_beside(self, outfile, clobber=True):
+        """
+        Write the background in the directory of the product outfile, named
+        as by default_outfile, and return the name for its BACKFILE keyword.
+        """
+        bkg_file = self.to_fits(os.path.join(os.path.dirname(outfile), self.default_outfile()), clobber=clobber)
+        return os.path.basename(bkg_file)
+
+    def __repr__(self):
+        return (f'Background({self.filter_sdd}, {len(self.intervals)} intervals, exposure={self.exposure:g} s, '
+                f'rate={np.sum(self.counts)/self.exposure:g} counts/s)')
+
+
+class LightCurve:
+    """
+    Light curves of one or more energy bands, as written by solexs_genlc_bands.
+
+    Attributes:
+        time (np.ndarray): Bin centre (or row) times in Unix seconds.
+        counts (np.ndarray): (n_bins, n_bands) count rate for binned light
+            curves, counts per row otherwise.
+        error (np.ndarray): (n_bins, n_bands) error on counts.
+        fracexp (np.ndarray): Fractional exposure of each bin.
+        time_bin (float): Time bin size in seconds.
+        timedel (np.ndarray): Width of each bin for non-uniform binning,
+            else None.
+        band_channels (list): (ch_low, ch_high, ene_low_str, ene_high_str)
+            of each band.
+        filter_sdd (str): Filter keyword of the L1 file(s).
+        basename (str): Base name of the L1 file(s), used for file names.
+        time_bin_str (str): Time binning part of the file names.
+        meta (dict): Other metadata.
+        rate, rate_err (np.ndarray): (n_bins, n_bands) background-subtracted
+            count rate and its error, else None.
+        backv, backe (np.ndarray): (n_bins, n_bands) background rate that was
+            subtracted and its error, else None.
+    """
+
+    def __init__(self, time, counts, error, fracexp, time_bin, timedel, band_channels, filter_sdd, basename=None,
+                 time_bin_str=None, meta=None, rate=None, rate_err=None, backv=None, backe=None):
+        self.time = time
+        self.counts = counts
+        self.error = error
+        self.fracexp = fracexp
+        self.time_bin = time_bin
+        self.timedel = timedel
+        self.band_channels = band_channels
+        self.filter_sdd = filter_sdd
+        self.basename = basename
+        self.time_bin_str = time_bin_str
+        self.meta = {} if meta is None else meta
+        self.rate = rate
+        self.rate_err = rate_err
+        self.backv = backv
+        self.backe = backe
+
+    @property
+    def ene_bands(self):
+        return [(float(b[2]), float(b[3])) for b in self.band_channels]
+
+    def band(self, i_band):
+        """
+        Time, counts and error of band i_band.
+        """
+        return self.time, self.counts[:,i_band], self.error[:,i_band]
+
+    def to_fits(self, outfile=None, clobber=True, split_bands=False):
+        """
+        Write the light curve file(s) and return the file name (or the list of
+        names if split_bands).
+        """
+        from .solexs_genlc import write_lc_bands
+
+        binned_lc = {'time': self.time, 'counts': self.counts, 'error': self.error, 'fracexp': self.fracexp,
+                     'time_bin': self.time_bin, 'time_bin_str': self.time_bin_str, 'timedel': self.timedel,
+                     'rate': self.rate, 'rate_err': self.rate_err, 'backv': self.backv, 'backe': self.backe}
+        return write_lc_bands(binned_lc, self.band_channels, self.filter_sdd, self.basename,
+                              outfile=outfile, clobber=clobber, split_bands=split_bands)
+
+    def __repr__(self):
+        bands = ', '.join(f'{b[2]}-{b[3]} keV' for b in self.band_channels)
+        return f'LightCurve({self.filter_sdd}, {len(self.time)} bins, time_bin={self.time_bin:g} s, bands: {bands})'
+
+
+class RateCube:
+    """
+    Count rates of several energy bands in common time bins with hardness
+    ratios, as written by solexs_genratecube.
+
+    Attributes:
+        time (np.ndarray): Bin centre times in Unix seconds.
+        timedel (np.ndarray): Width of each bin.
+        rate (np.ndarray): (n_bins, n_bands) count rate in the GTI.
+        error (np.ndarray): (n_bins, n_bands) Poisson error on rate.
+        exposure (np.ndarray): Exposure in the GTI of each bin.
+        fracexp (np.ndarray): Fractional exposure of each bin.
+        gti_flag (np.ndarray): 1 for bins with all rows in the GTI, 0 for
+            bins with some rows outside it (rate NaN if all are).
+        hardness (np.ndarray): (n_bins, n_pairs) rate ratios of the band
+            pairs in hardness_pairs.
+        hardness_err (np.ndarray): (n_bins, n_pairs) errors on hardness.
+        hardness_pairs (list): (soft, hard) band indices of each ratio,
+            which is rate[:,hard]/rate[:,soft].
+        time_bin (float): Time bin size in seconds.
+        band_channels (list): (ch_low, ch_high, ene_low_str, ene_high_str)
+            of each band.
+        filter_sdd (str): Filter keyword of the L1 file(s).
+        basename (str): Base name of the L1 file(s), used for file names.
+        meta (dict): Other metadata.
+    """
+
+    def __init__(self, time, timedel, rate, error, exposure, fracexp, gti_flag, hardness, hardness_err, hardness_pairs,
+                 time_bin, band_channels, filter_sdd, basename=None, meta=None):
+        self.time = time
+        self.timedel = timedel
+        self.rate = rate
+        self.error = error
+        self.exposure = exposure
+        self.fracexp = fracexp
+        self.gti_flag = gti_flag
+        self.hardness = hardness
+        self.hardness_err = hardness_err
+        self.hardness_pairs = hardness_pairs
+        self.time_bin = time_bin
+        self.band_channels = band_channels
+        self.filter_sdd = filter_sdd
+        self.basename = basename
+        self.meta = {} if meta is None else meta
+
+    @property
+    def ene_bands(self):
+        return [(float(b[2]), float(b[3])) for b in self.band_channels]
+
+    def default_outfile(self):
+        """
+        Output name used by solexs_genratecube,
+        {basename}_{n_bands}bands_{time_bin}sec_ratecube.fits.
+        """
+        return f'{self.basename}_{len(self.band_channels)}bands_{self.time_bin:g}sec_ratecube.fits'
+
+    def to_fits(self, outfile=None, clobber=True):
+        """
+        Write the rate cube file and return its name.
+        """
+        from .solexs_genratecube import write_ratecube
+
+        return write_ratecube(self, self.default_outfile() if outfile is None else outfile, clobber)
+
+    def __repr__(self):
+        bands = ', '.join(f'{b[2]}-{b[3]} keV' for b in self.band_channels)
+        return f'RateCube({self.filter_sdd}, {len(self.time)} bins, time_bin={self.time_bin:g} s, bands: {bands})'
+
+
+class SpectrogramPyramid:
+    """
+    Dynamic spectrum (time x energy count rate image) at several time
+    resolutions, as written by solexs_genspectrogram.
+
+    Attributes:
+        levels (list): Time bin sizes in seconds, from fine to coarse.
+        time (dict): Bin centre times of each level (keyed by bin size).
+        exposure (dict): Exposure in the GTI of every bin of each level.
+        rate (dict): (n_bins, n_ebins) count rate of each level.
+        ch_low, ch_high (np.ndarray): Channel range [ch_low, ch_high) of
+            every energy bin.
+        e_min, e_max (np.ndarray): Energy bounds (keV) of every energy bin.
+        filter_sdd (str): Filter keyword of the L1 file(s).
+        basename (str): Base name of the L1 file(s), used for file names.
+        meta (dict): Other metadata.
+    """
+
+    def __init__(self, levels, time, exposure, rate, ch_low, ch_high, e_min, e_max, filter_sdd, basename=None, meta=None):
+        self.levels = levels
+        self.time = time
+        self.exposure = exposure
+        self.rate = rate
+        self.ch_low = ch_low
+        self.ch_high = ch_high
+        self.e_min = e_min
+        self.e_max = e_max
+        self.filter_sdd = filter_sdd
+        self.basename = basename
+        self.meta = {} if meta is None else meta
+
+    def level(self, time_bin):
+        """
+        Time, exposure and rate of the level with bins of time_bin seconds.
+        """
+        return self.time[time_bin], self.exposure[time_bin], self.rate[time_bin]
+
+    def default_outfile(self, output_format='fits'):
+        """
+        Output name used by solexs_genspectrogram, {basename}_spectrogram.fits
+        (or the directory {basename}_spectrogram for the npy format).
+        """
+        return f'{self.basename}_spectrogram.fits' if output_format == 'fits' else f'{self.basename}_spectrogram'
+
+    def to_fits(self, outfile=None, clobber=True, output_format='fits'):
+        """
+        Write the pyramid as a FITS file ('fits') or as a directory of .npy
+        arrays ('npy') and return its name.
+        """
+        from .solexs_genspectrogram import write_spectrogram
+
+        if outfile is None:
+            outfile = self.default_outfile(output_format)
+        return write_spectrogram(self, outfile, clobber=clobber, output_format=output_format)
+
+    def __repr__(self):
+        levels = ', '.join(f'{w:g} s' for w in self.levels)
+        return f'SpectrogramPyramid({self.filter_sdd}, {len(self.e_min)} energy bins, levels: {levels})'
@@ -0,0 +1,205 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 08:30:14 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: profiling.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 08:30:14 pm
+#####################################################
+
+"""
+Opt-in per-stage instrumentation of the product generators.
+
+solexs_genspec, solexs_genmultispec and solexs_genlc_bands mark their main
+steps (decompression, reading, GTI masking, row summation, writing) as
+stages. Nothing is recorded unless a Profile is active in the calling thread
+or a hook is registered:
+
+    from solexs_tools.profiling import Profile
+
+    with Profile() as prof:
+        solexs_genmultispec(...)
+    prof.write_json('profile.json')
+
+Every stage records its wall time, the rows and bytes it read or wrote, and
+the peak resident set size of the process when it ended. Stage times are
+inclusive, so nested stages (e.g. gti_mask within build_time_index) are
+also counted in the enclosing stage. Stages run in worker processes of
+solexs_genmultispec are merged into the profile of the caller, with their
+wall times summed over workers.
+"""
+
+import contextlib
+import json
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+_hooks = []
+_local = threading.local()
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB (None if unknown).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak/1024**2 if sys.platform == 'darwin' else peak/1024
+
+
+class StageRecord:
+    """
+    Measurements of one run of a stage. Code inside a stage may add to
+    rows, bytes_read and bytes_written.
+    """
+
+    __slots__ = ('name', 'wall_s', 'rows', 'bytes_read', 'bytes_written', 'peak_rss_mb')
+
+    def __init__(self, name, rows=0, bytes_read=0, bytes_written=0):
+        self.name = name
+        self.wall_s = 0.
+        self.rows = rows
+        self.bytes_read = bytes_read
+        self.bytes_written = bytes_written
+        self.peak_rss_mb = None
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+
+    def __repr__(self):
+        return (f'StageRecord({self.name}, {self.wall_s:.4f} s, rows={self.rows}, '
+                f'read={self.bytes_read} B, written={self.bytes_written} B)')
+
+
+def _active_profiles():
+    return getattr(_local, 'profiles', None)
+
+
+def profiling_active():
+    """
+    True if stages are being recorded in this thread.
+    """
+    return bool(_hooks) or bool(_active_profiles())
+
+
+def _emit(record):
+    for prof in _active_profiles() or ():
+        prof.add(record)
+    for hook in list(_hooks):
+        hook(record)
+
+
+@contextlib.contextmanager
+def stage(name, rows=0, bytes_read=0, bytes_written=0):
+    """
+    Mark a block of code as a stage. Yields the StageRecord, whose counters
+    may be updated inside the block.
+    """
+    record = StageRecord(name, rows, bytes_read, bytes_written)
+    if not profiling_active():
+        yield record
+        return
+
+    t_start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.wall_s = time.perf_counter() - t_start
+        record.peak_rss_mb = peak_rss_mb()
+        _emit(record)
+
+
+def add_hook(func):
+    """
+    Call func(record) with the StageRecord of every stage that ends, in any
+    thread. Hooks stay registered until remove_hook.
+    """
+    _hooks.append(func)
+
+
+def remove_hook(func):
+    _hooks.remove(func)
+
+
+def merge_records(records):
+    """
+    Emit StageRecords measured elsewhere (e.g. in a worker process).
+    """
+    for record in records:
+        _emit(record)
+
+
+class Profile:
+    """
+    Collects the stages run in the current thread while active (used as a
+    context manager) and summarises them per stage name.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.wall_s = None
+        self._t_start = None
+
+    def add(self, record):
+        self.records.append(record)
+
+    def __enter__(self):
+        if _active_profiles() is None:
+            _local.profiles = []
+        _local.profiles.append(self)
+        self._t_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall_s = time.perf_counter() - self._t_start
+        _local.profiles.remove(self)
+        return False
+
+    def summary(self):
+        """
+        Totals per stage (in order of first use): calls, wall_s, rows,
+        bytes_read, bytes_written and peak_rss_mb, with the total wall time
+        and peak RSS of the profiled block.
+        """
+        stages = {}
+        for record in self.records:
+            s = stages.setdefault(record.name, {'calls': 0, 'wall_s': 0., 'rows': 0, 'bytes_read': 0,
+                                                'bytes_written': 0, 'peak_rss_mb': None})
+            s['calls'] += 1
+            s['wall_s'] += float(record.wall_s)
+            s['rows'] += int(record.rows)
+            s['bytes_read'] += int(record.bytes_read)
+            s['bytes_written'] += int(record.bytes_written)
+            if record.peak_rss_mb is not None:
+                s['peak_rss_mb'] = max(s['peak_rss_mb'] or 0., record.peak_rss_mb)
+
+        wall_s = self.wall_s if self.wall_s is not None else time.perf_counter() - self._t_start
+        return {'wall_s': wall_s, 'peak_rss_mb': peak_rss_mb(), 'stages': stages}
+
+    def write_json(self, outfile=None, **extra):
+        """
+        Write the summary (with any extra items, e.g. the command) as JSON to
+        outfile, or to stdout if outfile is None or '-'.
+        """
+        summary = dict(extra)
+        summary.update(self.summary())
+        text = json.dumps(summary, indent=2)
+        if outfile is None or outfile == '-':
+            print(text)
+        else:
+            with open(outfile, 'w') as f:
+                f.write(text + '\n')
+        return summary
@@ -9,30 +9,149 @@
 #####################################################
 
 import numpy as np
-from astropy.io import fits
-import datetime, os, argparse
+import contextlib, datetime, os, sys, argparse
 from . import __version__, __caldb_version__
-from .caldb_utils import get_caldb_base_dir
+from .caldb_utils import load_ebounds
+from .io_utils import iter_l1_spectrograms, l1_files_basename
+from .gti_utils import read_gti, gti_mask, time_bin_edges
+from .products import LightCurve
+from .fits_writer import TableTemplate, TemplateMismatch
+from .l1_cache import ChunkedCounts
+from .profiling import Profile, stage
+
+# Header cards that differ between light curves of the same layout
+LC_TEMPLATE_KEYS = ((0, 'FILENAME'), (0, 'DATE'), (1, 'TSTART'), (1, 'TSTOP'), (1, 'DATE-OBS'), (1, 'DATE-END'))
+_lc_templates = {}
+
+
+def write_lc(time_data, lc_data, time_bin, filter_sdd, outfile, clobber=True, ene_bands=None, error=None, fracexp=None, timedel=None,
+             background=None):
+    """
+    lc_data: (n_time,) array, or (n_time, n_bands) array written as columns
+    COUNTS1..COUNTSn with the band limits in E_MINn/E_MAXn keywords.
+    ene_bands: list of (ene_low_str, ene_high_str) for each band of lc_data.
+    error: errors on lc_data, written as ERROR (ERROR1..ERRORn) columns.
+    fracexp: fractional exposure of each time bin, written as FRACEXP column.
+    timedel: width of each time bin, written as TIMEDEL column for variable
+    width bins.
+    background: (rate, rate_err, backv, backe) arrays shaped like lc_data,
+    the background-subtracted rate and the background rate, written as
+    RATE, RATE_ERR, BACKV and BACKE (RATE1..RATEn, ...) columns.
+    """
+    with stage('write', rows=len(time_data)) as st:
+        outfile = _write_lc(time_data, lc_data, time_bin, filter_sdd, outfile, clobber, ene_bands, error, fracexp, timedel, background)
+        st.bytes_written = os.path.getsize(outfile)
+    return outfile
+
+
+def lc_columns(time_data, lc_data, error=None, fracexp=None, timedel=None, background=None):
+    """
+    Columns of a light curve file as written by write_lc.
+
+    Returns:
+        tuple: Dict of column name: (format, array) and whether lc_data has
+        several bands.
+    """
+    lc_data = np.asarray(lc_data)
+    multi_band = lc_data.ndim == 2 and lc_data.shape[1] > 1
+    if lc_data.ndim == 2 and not multi_band:
+        lc_data = lc_data[:,0]
+    if error is not None:
+        error = np.asarray(error).reshape(lc_data.shape)
+
+    # name: (format, array) of every column
+    columns = {'TIME': ('1D', time_data)}
+
+    if timedel is not None:
+        columns['TIMEDEL'] = ('1D', timedel)
+
+    if multi_band:
+        for i_band in range(lc_data.shape[1]):
+            columns[f'COUNTS{i_band+1}'] = ('1E', lc_data[:,i_band])
+            if error is not None:
+                columns[f'ERROR{i_band+1}'] = ('1E', error[:,i_band])
+    else:
+        columns['COUNTS'] = ('1E', lc_data)
+        if error is not None:
+            columns['ERROR'] = ('1E', error)
+
+    if fracexp is not None:
+        columns['FRACEXP'] = ('1E', fracexp)
+
+    if background is not None:
+        names = ('RATE', 'RATE_ERR', 'BACKV', 'BACKE')
+        background = [np.asarray(array).reshape(lc_data.shape) for array in background]
+        if multi_band:
+            for i_band in range(lc_data.shape[1]):
+                for name, array in zip(names, background):
+                    columns[f'{name}{i_band+1}'] = ('1E', array[:,i_band])
+        else:
+            for name, array in zip(names, background):
+                columns[name] = ('1E', array)
+
+    return columns, multi_band
+
+
+def _write_lc(time_data, lc_data, time_bin, filter_sdd, outfile, clobber=True, ene_bands=None, error=None, fracexp=None, timedel=None,
+              background=None):
+    columns, multi_band = lc_columns(time_data, lc_data, error, fracexp, timedel, background)
 
-CALDB_BASE_DIR = get_caldb_base_dir()
+    outfile = outfile[:-3] if outfile.endswith('.lc') else outfile
+    outfile = f'{outfile}.lc'
+
+    # Only the rows and a few header cards change between light curves of the
+    # same layout, so these are written from a template of the first one.
+    template_key = (filter_sdd, str(time_bin), multi_band, None if ene_bands is None else tuple(map(tuple, ene_bands)),
+                    tuple((name, fmt) for name, (fmt, _) in columns.items()))
+    try:
+        if template_key not in _lc_templates:
+            template_columns = {name: (fmt, np.zeros(1)) for name, (fmt, _) in columns.items()}
+            _lc_templates[template_key] = TableTemplate(
+                lc_hdu_list(template_columns, time_bin, filter_sdd, 'template.lc', ene_bands, multi_band), LC_TEMPLATE_KEYS)
+
+        date_obs, date_end = [datetime.datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S') for t in (time_data[0], time_data[-1])]
+        _lc_templates[template_key].write(outfile, {name: array for name, (_, array) in columns.items()},
+                                          {(0, 'FILENAME'): os.path.basename(outfile),
+                                           (0, 'DATE'): datetime.datetime.now().strftime("%Y-%m-%d"),
+                                           (1, 'TSTART'): time_data[0], (1, 'TSTOP'): time_data[-1],
+                                           (1, 'DATE-OBS'): date_obs, (1, 'DATE-END'): date_end},
+                                          n_rows=len(time_data), clobber=clobber)
+        return outfile
+    except TemplateMismatch:
+        pass
+
+    _hdu_list = lc_hdu_list(columns, time_bin, filter_sdd, outfile, ene_bands, multi_band)
+    _hdu_list.writeto(outfile,overwrite=clobber)
+
+    return outfile
 
 
-def write_lc(time_data, lc_data, time_bin, filter_sdd, outfile, clobber=True):
+def lc_hdu_list(columns, time_bin, filter_sdd, outfile, ene_bands=None, multi_band=False):
+    """
+    HDUList of a light curve from a dict of column name: (format, array).
+    """
+    from astropy.io import fits
+
     hdu_list = []
     primary_hdu = fits.PrimaryHDU()
                                     
     hdu_list.append(primary_hdu)
 
-    fits_columns = []
-    col1 = fits.Column(name='TIME',format='1J',array=time_data)
-    col2 = fits.Column(name='COUNTS',format='1E',array=lc_data)
-
-    fits_columns.append(col1)
-    fits_columns.append(col2)
+    time_data = columns['TIME'][1]
+    fits_columns = [fits.Column(name=name, format=fmt, array=array) for name, (fmt, array) in columns.items()]
 
     hdu_lc = fits.BinTableHDU.from_columns(fits.ColDefs(fits_columns))
     hdu_lc.name = 'RATE'
 
+    if ene_bands is not None:
+        if multi_band:
+            for i_band, (ene_low_str, ene_high_str) in enumerate(ene_bands):
+                hdu_lc.header[f'E_MIN{i_band+1}'] = (float(ene_low_str), 'Lower energy limit of band (keV)')
+                hdu_lc.header[f'E_MAX{i_band+1}'] = (float(ene_high_str), 'Upper energy limit of band (keV)')
+        else:
+            hdu_lc.header['E_MIN'] = (float(ene_bands[0][0]), 'Lower energy limit (keV)')
+            hdu_lc.header['E_MAX'] = (float(ene_bands[0][1]), 'Upper energy limit (keV)')
+
     hdu_list.append(hdu_lc)
                                                                        
     _hdu_list = fits.HDUList(hdus=hdu_list)
@@ -97,56 +216,248 @@ def write_lc(time_data, lc_data, time_bin, filter_sdd, outfile, clobber=True):
         primary_header.append(k)
 
     _hdu_list[0].header = primary_header
-        
-    outfile = outfile[:-3] if outfile.endswith('.lc') else outfile
-    _hdu_list.writeto(f'{outfile}.lc',overwrite=clobber)
 
-    return f'{outfile}.lc'
+    return _hdu_list
+
+def log_bin_edges(tstart, tstop, first_bin, bins_per_decade=10):
+    """
+    Time bin edges with widths growing geometrically from first_bin, by a
+    factor of ten every bins_per_decade bins. The last bin is truncated at
+    tstop.
+    """
+    duration = tstop - tstart
+    if duration <= first_bin:
+        return np.array([tstart, tstop], dtype=np.float64)
+
+    growth = 10**(1/bins_per_decade)
+    n_bins = int(np.ceil(np.log(1 + duration*(growth - 1)/first_bin)/np.log(growth)))
+    bin_edges = tstart + first_bin*(growth**np.arange(n_bins + 1) - 1)/(growth - 1)
+    bin_edges = bin_edges[bin_edges < tstop]
+    return np.append(bin_edges, tstop)
+
+
+def min_counts_bin_edges(lc_data, time_arr, min_counts, row_width=1.0):
+    """
+    Time bin edges such that every bin holds at least min_counts counts.
+
+    Rows are grouped greedily in time order: a bin starting at row e ends at
+    the first row where the counts since e reach min_counts. Left over rows
+    at the end that do not reach min_counts are merged into the last bin.
+
+    The next bin start is found for every row at once with one
+    np.searchsorted on the cumulative counts, and the chain of bin starts
+    from row 0 is followed by pointer doubling, so the cost is a few array
+    operations per power of two of the number of bins and there is no
+    Python iteration per bin.
+
+    Args:
+        lc_data (np.ndarray): Counts in each row.
+        time_arr (np.ndarray): TSTART of each row.
+        min_counts (float): Minimum counts per bin.
+        row_width (float): Duration of one row in seconds.
+
+    Returns:
+        np.ndarray: Bin edges.
+    """
+    if min_counts <= 0:
+        raise ValueError(f'Minimum counts per bin must be positive, got {min_counts}.')
+
+    time_arr = np.asarray(time_arr, dtype=np.float64)
+    n_rows = len(time_arr)
+    counts_before = np.concatenate([[0.], np.cumsum(np.asarray(lc_data, dtype=np.float64))])
+
+    # Start of the bin after a bin starting at each row, n_rows if it would
+    # end at or after the last row
+    next_start = np.searchsorted(counts_before[1:], counts_before + min_counts, side='left') + 1
+    next_start[next_start >= n_rows] = n_rows
+
+    # jumps[j] is the start 2**j bins later
+    jumps = [next_start]
+    while jumps[-1][0] < n_rows:
+        jumps.append(jumps[-1][jumps[-1]])
+
+    # Number of bin starts after row 0
+    n_starts, row = 0, 0
+    for j in range(len(jumps) - 1, -1, -1):
+        if jumps[j][row] < n_rows:
+            row = jumps[j][row]
+            n_starts += 2**j
+
+    k = np.arange(n_starts + 1)
+    edge_rows = np.zeros(n_starts + 1, dtype=np.int64)
+    for j in range(len(jumps)):
+        bit = (k >> j) & 1 == 1
+        edge_rows[bit] = jumps[j][edge_rows[bit]]
+
+    if counts_before[-1] - counts_before[edge_rows[-1]] < min_counts and len(edge_rows) > 1:
+        edge_rows = edge_rows[:-1]
+
+    return np.append(time_arr[edge_rows], time_arr[-1] + row_width)
+
+
+def bayesian_blocks_bin_edges(lc_data, time_arr, p0=0.05, cell_width=None, row_width=1.0):
+    """
+    Time bin edges of the Bayesian blocks (Scargle et al. 2013) of a light
+    curve, from astropy.stats.bayesian_blocks with the 'events' fitness.
+
+    Rows are first summed into cells of cell_width seconds (one row per cell
+    by default). The blocks are found on the good time axis, i.e. with the
+    time between rows (e.g. GTI gaps) removed, and every block edge falls on
+    the start of a cell. The cost grows with the square of the number of
+    cells, so a cell_width of a few seconds is advisable for a full day.
+
+    Args:
+        lc_data (np.ndarray): Counts in each row.
+        time_arr (np.ndarray): TSTART of each row, in time order.
+        p0 (float): False alarm probability of a block edge.
+        cell_width (float, optional): Width of the cells in seconds.
+        row_width (float): Duration of one row in seconds.
+
+    Returns:
+        np.ndarray: Bin edges.
+    """
+    from astropy.stats import bayesian_blocks
+
+    time_arr = np.asarray(time_arr, dtype=np.float64)
+    lc_data = np.asarray(lc_data, dtype=np.float64)
+
+    if cell_width:
+        cell_idx = np.floor((time_arr - time_arr[0]) / cell_width).astype(np.int64)
+        cell_starts = np.flatnonzero(np.diff(cell_idx, prepend=-1))
+    else:
+        cell_starts = np.arange(len(time_arr))
+
+    cell_counts = np.rint(np.add.reduceat(lc_data, cell_starts))
+    cell_time = np.diff(np.append(cell_starts, len(time_arr))) * row_width
+    good_time = np.cumsum(cell_time) - cell_time/2
+
+    if len(cell_starts) < 2:
+        return np.array([time_arr[0], time_arr[-1] + row_width])
+
+    block_edges = bayesian_blocks(good_time, cell_counts, fitness='events', p0=p0)
+    # Interior edges lie between the centres of two cells
+    edge_cells = np.searchsorted(good_time, block_edges[1:-1])
+
+    return np.concatenate([time_arr[[0]], time_arr[cell_starts[edge_cells]], [time_arr[-1] + row_width]])
+
+
+def lc_bin_edges(time_arr, time_bin=None, binning='linear', lc_data=None, min_counts=None, row_width=1.0):
+    """
+    Time bin edges covering all rows of a light curve.
+
+    Args:
+        time_arr (np.ndarray): TSTART of each row.
+        time_bin (float): Bin width in seconds ('linear'), or width of the
+            first bin ('log').
+        binning (str): 'linear', 'log' or 'mincounts'.
+        lc_data (np.ndarray): Counts in each row (1D), needed for 'mincounts'.
+        min_counts (float): Minimum counts per bin for 'mincounts'.
+        row_width (float): Duration of one row in seconds.
+
+    Returns:
+        np.ndarray: Bin edges.
+    """
+    tstart = np.nanmin(time_arr)
+    tstop = np.nanmax(time_arr) + row_width
+
+    if binning in ('linear', 'log') and not time_bin:
+        raise ValueError(f"Binning '{binning}' needs a time bin size.")
+
+    if binning == 'linear':
+        return time_bin_edges(tstart, tstop, time_bin)
+    elif binning == 'log':
+        return log_bin_edges(tstart, tstop, time_bin)
+    elif binning == 'mincounts':
+        if lc_data is None or min_counts is None:
+            raise ValueError("Binning 'mincounts' needs lc_data and min_counts.")
+        return min_counts_bin_edges(lc_data, time_arr, min_counts, row_width)
+    else:
+        raise ValueError(f"Unknown binning '{binning}', expected 'linear', 'log' or 'mincounts'.")
+
+
+def bin_lc(lc_data, time_arr, bin_edges, exposure=None, gti=None):
+    """
+    Bin a light curve on the actual row times.
+
+    Rows are assigned to the bin with bin_edges[k] <= time < bin_edges[k+1],
+    so data gaps only reduce the exposure of the bins they fall in. Rows
+    outside the GTI are left out. Bins without exposure are dropped.
+
+    Args:
+        lc_data (np.ndarray): (n_rows,) or (n_rows, n_bands) counts per row.
+        time_arr (np.ndarray): TSTART of each row.
+        bin_edges (np.ndarray): Monotonically increasing bin edges.
+        exposure (np.ndarray, optional): Exposure of each row (default 1 s).
+        gti (np.ndarray, optional): (N, 2) array of GTI START, STOP pairs.
+
+    Returns:
+        tuple: Count rate, Poisson error on the rate, bin centre times,
+        fractional exposure and width of each bin.
+    """
+    lc_data = np.asarray(lc_data, dtype=np.float64)
+    time_arr = np.asarray(time_arr, dtype=np.float64)
+    bin_edges = np.asarray(bin_edges, dtype=np.float64)
+    n_bins = len(bin_edges) - 1
+
+    if exposure is None:
+        exposure = np.ones(len(time_arr))
+    exposure = np.asarray(exposure, dtype=np.float64)
+
+    bin_idx = np.searchsorted(bin_edges, time_arr, side='right') - 1
+    valid = (bin_idx >= 0) & (bin_idx < n_bins)
+    if gti is not None:
+        valid &= gti_mask(time_arr, gti)
+    bin_idx = bin_idx[valid]
+
+    bin_exposure = np.bincount(bin_idx, weights=exposure[valid], minlength=n_bins)
+
+    if lc_data.ndim == 1:
+        bin_counts = np.bincount(bin_idx, weights=lc_data[valid], minlength=n_bins)
+    else:
+        bin_counts = np.column_stack([np.bincount(bin_idx, weights=lc_data[valid,i_band], minlength=n_bins)
+                                      for i_band in range(lc_data.shape[1])])
+
+    good = bin_exposure > 0
+    bin_counts = bin_counts[good]
+    bin_exposure = bin_exposure[good]
+    bin_width = np.diff(bin_edges)[good]
+    bin_centre = bin_edges[:-1][good] + bin_width/2
+
+    norm = bin_exposure if lc_data.ndim == 1 else bin_exposure[:,None]
+    rate = bin_counts/norm #counts per second
+    rate_err = np.sqrt(bin_counts)/norm
 
-def rebin_lc(lc_data, time_arr ,rebin_sec): #
-    """lc_data: has to be counts per second"""
-    if type(rebin_sec)!=int:
-        raise TypeError("Cannot do fractional time binning.")
+    fracexp = np.minimum(bin_exposure/bin_width, 1.)
 
-    if rebin_sec<1:
-        raise ValueError("Time binning cannot be less than 1 second.")
+    return rate, rate_err, bin_centre, fracexp, bin_width
 
-    extra_bins = len(lc_data) % rebin_sec
-    if extra_bins != 0:
-        lc_data = lc_data[:-extra_bins]
-    new_bins = int(len(lc_data)/rebin_sec)
-    new_lc_data = lc_data.reshape((new_bins, rebin_sec)).sum(axis=1)
-    new_tm = np.arange(new_bins)*rebin_sec
 
+def rebin_lc(lc_data, time_arr, rebin_sec, exposure=None, gti=None, return_errors=False): #
+    """
+    lc_data: counts in each row of time_arr.
+    Rebin to rebin_sec second bins (may be fractional) on the actual row times,
+    returning the count rate and bin centre times (plus the rate error and
+    fractional exposure if return_errors).
+    """
+    if rebin_sec <= 0:
+        raise ValueError("Time binning has to be positive.")
 
-    new_time_arr = []
-    for ii in new_tm:
-        new_time_arr.append(time_arr[int(ii)])
+    bin_edges = lc_bin_edges(time_arr, rebin_sec)
+    new_lc_data, new_lc_err, new_time_arr, fracexp, _ = bin_lc(lc_data, time_arr, bin_edges, exposure=exposure, gti=gti)
 
-    new_lc_data = new_lc_data/rebin_sec #counts per second
-    new_time_arr = np.array(new_time_arr) + rebin_sec/2
+    if return_errors:
+        return new_lc_data, new_time_arr, new_lc_err, fracexp
 
     return new_lc_data, new_time_arr
 
 
-def solexs_genlc(spec_file, ene_low, ene_high, time_bin=None, outfile=None,clobber=True):
+def energy_to_channels(ene_bins, ene_low, ene_high):
+    """
+    Channel range [ch_low, ch_high) and energy labels for an energy band.
+    """
     if ene_high <= ene_low:
         raise ValueError(f'Higher energy limit {ene_high} is less than lower energy limit {ene_low}.')
 
-
-    hdu1 = fits.open(spec_file)
-
-    if hdu1[0].header['CONTENT'] != 'Type II PHA file':
-        raise TypeError('Input File is not Type II PHA file.')    
-    
-    data = hdu1[1].data
-
-    time_solexs = data['TSTART']
-
-    filter_sdd = hdu1[1].header['FILTER']
-    ene_bins_file = os.path.join(CALDB_BASE_DIR,'ebounds',f'energy_bins_out_{filter_sdd}_v{__caldb_version__}.dat')
-    ene_bins = np.loadtxt(ene_bins_file)
-
     if ene_low < 2:
         raise ValueError('Lower energy limit cannot be less than 2 keV.')
     
@@ -159,43 +470,321 @@ def solexs_genlc(spec_file, ene_low, ene_high, time_bin=None, outfile=None,clobb
     ene_low_str = f'{ene_bins[ch_low,0]:.2f}'
     ene_high_str = f'{ene_bins[ch_high,1]:.2f}'
 
-    lc_data = data['COUNTS'][:,ch_low:ch_high].sum(axis=1)
-
-    if time_bin:
-        lc_data, time_solexs = rebin_lc(lc_data,time_solexs,time_bin)
+    return ch_low, ch_high, ene_low_str, ene_high_str
+
+
+def energy_bands_to_channels(filter_sdd, ene_bands):
+    """
+    energy_to_channels of several (ene_low, ene_high) bands with the CALDB
+    energy bounds of filter_sdd.
+    """
+    ebounds = load_ebounds(filter_sdd, __caldb_version__)
+    ene_bins = np.column_stack([ebounds.e_min, ebounds.e_max])
+    return [energy_to_channels(ene_bins, ene_low, ene_high) for ene_low, ene_high in ene_bands]
+
+
+def band_counts(counts, channel_ranges, chunk_rows=8192):
+    """
+    Counts summed over several channel ranges [ch_low, ch_high) from one pass
+    over the COUNTS matrix.
+
+    A cumulative sum over the channel axis makes every band two column lookups
+    and a subtraction. Rows are processed in chunks to bound memory. COUNTS
+    from the columnar cache are summed from the channel chunks of the bands.
+
+    Returns:
+        np.ndarray: (n_rows, n_bands) band counts.
+    """
+    n_rows = counts.shape[0]
+
+    if isinstance(counts, ChunkedCounts):
+        with stage('sum_rows', rows=n_rows) as st:
+            lc_data, st.bytes_read = counts.channel_sums(channel_ranges)
+        return lc_data
+
+    ch_lows = np.array([r[0] for r in channel_ranges])
+    ch_highs = np.array([r[1] for r in channel_ranges])
+    ch_max = max(ch_highs.max(), ch_lows.max())
+
+    lc_data = np.empty((n_rows, len(channel_ranges)), dtype=np.int64)
+    cum_counts = np.zeros((min(chunk_rows, n_rows), ch_max + 1), dtype=np.int64)
+
+    with stage('sum_rows', rows=n_rows, bytes_read=n_rows*ch_max*counts.dtype.itemsize):
+        for row_start in range(0, n_rows, chunk_rows):
+            row_stop = min(row_start + chunk_rows, n_rows)
+            cum_chunk = cum_counts[:row_stop - row_start]
+            np.cumsum(counts[row_start:row_stop, :ch_max], axis=1, out=cum_chunk[:,1:])
+            lc_data[row_start:row_stop] = cum_chunk[:,ch_highs] - cum_chunk[:,ch_lows]
+
+    return lc_data
+
+
+def solexs_genlc_bands(spec_file, ene_bands, time_bin=None, outfile=None, clobber=True, split_bands=False,
+                       binning='linear', min_counts=None, gti_file=None, write=True, incremental=False, background=None,
+                       l1_spectrograms=None, gti=None):
+    """
+    Generate light curves for several energy bands from a single read of the
+    Level 1 PI spectrogram file.
+
+    Several files (e.g. one per day) are streamed in time order into a single
+    light curve, holding the COUNTS of only one file at a time.
+
+    Args:
+        spec_file (str or list): Path to the Level 1 PI spectrogram file
+            (Type II), or a list/glob of them.
+        ene_bands (list): (ene_low, ene_high) pairs in keV.
+        time_bin (float, optional): Time bin size in seconds ('linear'), or
+            width of the first bin ('log').
+        outfile (str, optional): Output file name.
+        clobber (bool): Overwrite existing files.
+        split_bands (bool): Write one file per band instead of one file with
+            a COUNTS column per band.
+        binning (str): 'linear', 'log' or 'mincounts'. For 'mincounts' the
+            bins are chosen on the first band.
+        min_counts (float, optional): Minimum counts per bin for 'mincounts'.
+        gti_file (str or list, optional): Path to the Level 1 Good Time
+            Interval File, or a list/glob of them. Rows outside the GTI are
+            left out.
+        write (bool): Write the light curve file(s). Otherwise return a
+            products.LightCurve.
+        incremental (bool): Only process the rows added to a growing L1 file
+            since the last incremental run and append them to the existing
+            light curve (see incremental_lc). Needs a single L1 file and
+            linear binning. The light curve is overwritten when it cannot be
+            updated.
+        background (optional): 'auto', (tstart, tstop) intervals or a
+            products.Background (see background.resolve_background, needs
+            gti_file). Its rate in each band is subtracted and written as
+            RATE, RATE_ERR, BACKV and BACKE columns (rates in counts/s, also
+            for unbinned light curves).
+        l1_spectrograms (list, optional): (file, L1Spectrogram) pairs of
+            spec_file in time order (see io_utils.open_l1_spectrograms) when
+            they are already in memory, e.g. in solexs_server.
+        gti (np.ndarray, optional): GTI array of gti_file if already read.
+
+    Returns:
+        str or list: Output file name, or list of file names if split_bands
+        (a products.LightCurve if write is False).
+    """
+    if incremental:
+        if binning != 'linear' or not write or background is not None:
+            raise ValueError('Incremental light curves need linear binning, write=True and no background.')
+        from .incremental_lc import genlc_incremental
+        return genlc_incremental(spec_file, ene_bands, time_bin=time_bin, outfile=outfile, split_bands=split_bands, gti_file=gti_file)
+
+    filter_sdd = None
+    l1_files, time_chunks, lc_chunks, exposure_chunks = [], [], [], []
+
+    for l1_file, l1_data in (iter_l1_spectrograms(spec_file) if l1_spectrograms is None else l1_spectrograms):
+        if filter_sdd is None:
+            filter_sdd = l1_data.filter_sdd
+            band_channels = energy_bands_to_channels(filter_sdd, ene_bands)
+        elif l1_data.filter_sdd != filter_sdd:
+            raise ValueError(f'Filter {l1_data.filter_sdd} of {l1_file} does not match filter {filter_sdd} of the other files.')
+
+        l1_files.append(l1_file)
+        time_chunks.append(np.asarray(l1_data.time, dtype=np.float64))
+        lc_chunks.append(band_counts(l1_data.counts, [(b[0], b[1]) for b in band_channels]))
+        exposure_chunks.append(np.asarray(l1_data.exposure, dtype=np.float64))
+
+    if filter_sdd is None:
+        raise ValueError(f'No data found in {spec_file}.')
+
+    time_solexs = np.concatenate(time_chunks)
+    lc_data = np.concatenate(lc_chunks)
+    exposure = np.concatenate(exposure_chunks)
+    if gti is None and gti_file is not None:
+        gti = read_gti(gti_file)
+
+    with stage('bin_lc', rows=len(time_solexs)):
+        binned_lc = bin_lc_bands(time_solexs, lc_data, exposure, time_bin=time_bin, binning=binning, min_counts=min_counts, gti=gti)
+
+    rate = rate_err = backv = backe = None
+    if background is not None:
+        from .background import resolve_background, subtract_lc_background
+
+        background = resolve_background(l1_files, gti_file, background)
+        band_rate, band_rate_err = background.band_rate([(b[0], b[1]) for b in band_channels])
+        rate, rate_err, backv, backe = subtract_lc_background(binned_lc['counts'], binned_lc['error'], binned_lc['fracexp'],
+                                                              band_rate, band_rate_err, binned=bool(time_bin or binning != 'linear'))
+
+    lc = LightCurve(binned_lc['time'], binned_lc['counts'], binned_lc['error'], binned_lc['fracexp'], binned_lc['time_bin'],
+                    binned_lc['timedel'], band_channels, filter_sdd, basename=l1_files_basename(l1_files),
+                    time_bin_str=binned_lc['time_bin_str'], meta={'l1_files': l1_files},
+                    rate=rate, rate_err=rate_err, backv=backv, backe=backe)
+
+    if not write:
+        return lc
+
+    return lc.to_fits(outfile=outfile, clobber=clobber, split_bands=split_bands)
+
+
+def bin_lc_bands(time_solexs, lc_data, exposure, time_bin=None, binning='linear', min_counts=None, gti=None):
+    """
+    Time binning of band light curves as done by solexs_genlc_bands.
+
+    Args:
+        time_solexs (np.ndarray): TSTART of each row.
+        lc_data (np.ndarray): (n_rows, n_bands) band counts.
+        exposure (np.ndarray): Exposure of each row.
+        time_bin, binning, min_counts: As for solexs_genlc_bands.
+        gti (np.ndarray, optional): (N, 2) array of GTI START, STOP pairs.
+
+    Returns:
+        dict: time, counts (rate if binned), error, fracexp, time_bin,
+        time_bin_str (used in file names) and timedel (None for uniform bins).
+    """
+    timedel = None
+
+    if time_bin or binning != 'linear':
+        bin_lc_data = lc_data[:,0] if gti is None else lc_data[:,0]*gti_mask(time_solexs, gti)
+        bin_edges = lc_bin_edges(time_solexs, time_bin, binning=binning, lc_data=bin_lc_data, min_counts=min_counts)
+        lc_data, lc_err, time_solexs, fracexp, bin_width = bin_lc(lc_data, time_solexs, bin_edges, exposure=exposure, gti=gti)
+
+        if binning == 'linear':
+            time_bin_str = f'{time_bin:g}sec'
+        else:
+            timedel = bin_width
+            time_bin = np.min(bin_width)
+            time_bin_str = f'log{bin_width[0]:g}sec' if binning == 'log' else f'min{min_counts:g}cts'
     else:
         time_bin = 1
-
-    if outfile == None:
-        pi_file_basename = os.path.basename(spec_file)
-        pi_file_basename = pi_file_basename.split('.')[0]
-        outfile = f'{pi_file_basename}_{ene_low_str}_{ene_high_str}keV_{time_bin}sec.lc'
-
-    outfile = write_lc(time_solexs,lc_data, time_bin, filter_sdd,outfile,clobber)
-
-    return outfile
+        time_bin_str = '1sec'
+        if gti is not None:
+            inds = gti_mask(time_solexs, gti)
+            time_solexs = time_solexs[inds]
+            lc_data = lc_data[inds]
+            exposure = exposure[inds]
+        lc_err = np.sqrt(lc_data)
+        fracexp = exposure
+
+    return {'time': time_solexs, 'counts': lc_data, 'error': lc_err, 'fracexp': fracexp,
+            'time_bin': time_bin, 'time_bin_str': time_bin_str, 'timedel': timedel}
+
+
+def write_lc_bands(binned_lc, band_channels, filter_sdd, pi_file_basename, outfile=None, clobber=True, split_bands=False):
+    """
+    Write band light curves from bin_lc_bands, named as by solexs_genlc_bands.
+
+    Args:
+        binned_lc (dict): Output of bin_lc_bands.
+        band_channels (list): energy_to_channels output for every band.
+        filter_sdd (str): Filter keyword of the L1 file.
+        pi_file_basename (str): Base name of the L1 file(s).
+
+    Returns:
+        str or list: Output file name, or list of file names if split_bands.
+    """
+    time_solexs = binned_lc['time']
+    lc_data = binned_lc['counts']
+    lc_err = binned_lc['error']
+    fracexp = binned_lc['fracexp']
+    time_bin = binned_lc['time_bin']
+    time_bin_str = binned_lc['time_bin_str']
+    timedel = binned_lc['timedel']
+
+    # Background-subtracted rate columns, if any
+    background = None
+    if binned_lc.get('rate') is not None:
+        background = [np.asarray(binned_lc[key]).reshape(len(time_solexs), -1) for key in ('rate', 'rate_err', 'backv', 'backe')]
+
+    outfiles = lc_outfile_names(band_channels, pi_file_basename, time_bin_str, outfile, split_bands)
+
+    if not split_bands:
+        return write_lc(time_solexs, lc_data, time_bin, filter_sdd, outfiles[0], clobber, ene_bands=[b[2:] for b in band_channels],
+                        error=lc_err, fracexp=fracexp, timedel=timedel, background=background)
+
+    return [write_lc(time_solexs, lc_data[:,i_band], time_bin, filter_sdd, band_outfile, clobber, ene_bands=[(ene_low_str, ene_high_str)],
+                     error=lc_err[:,i_band], fracexp=fracexp, timedel=timedel,
+                     background=None if background is None else [array[:,i_band] for array in background])
+            for i_band, ((_, _, ene_low_str, ene_high_str), band_outfile) in enumerate(zip(band_channels, outfiles))]
+
+
+def lc_outfile_names(band_channels, pi_file_basename, time_bin_str, outfile=None, split_bands=False):
+    """
+    Names of the light curve files written by write_lc_bands: a list with
+    one name, or one name per band if split_bands.
+    """
+    if not split_bands:
+        if outfile == None:
+            if len(band_channels) == 1:
+                ene_low_str, ene_high_str = band_channels[0][2:]
+                outfile = f'{pi_file_basename}_{ene_low_str}_{ene_high_str}keV_{time_bin_str}.lc'
+            else:
+                outfile = f'{pi_file_basename}_{len(band_channels)}bands_{time_bin_str}.lc'
+        return [outfile]
+
+    outfiles = []
+    for _, _, ene_low_str, ene_high_str in band_channels:
+        if outfile == None:
+            band_outfile = f'{pi_file_basename}_{ene_low_str}_{ene_high_str}keV_{time_bin_str}.lc'
+        else:
+            band_outfile = outfile[:-3] if outfile.endswith('.lc') else outfile
+            band_outfile = f'{band_outfile}_{ene_low_str}_{ene_high_str}keV.lc'
+        outfiles.append(band_outfile)
+    return outfiles
+
+
+def solexs_genlc(spec_file, ene_low, ene_high, time_bin=None, outfile=None,clobber=True, binning='linear', min_counts=None, gti_file=None, write=True,
+                 incremental=False, background=None):
+    return solexs_genlc_bands(spec_file, [(ene_low, ene_high)], time_bin=time_bin, outfile=outfile, clobber=clobber,
+                              binning=binning, min_counts=min_counts, gti_file=gti_file, write=write, incremental=incremental,
+                              background=background)
+
+
+def parse_ene_band(band_str):
+    """
+    Parse an energy band given as 'ene_low-ene_high' in keV.
+    """
+    try:
+        ene_low, ene_high = band_str.split('-')
+        return float(ene_low), float(ene_high)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid energy band '{band_str}', expected ene_low-ene_high (e.g. 3-10).")
 
 
 def solexs_genlc_cli():
     # Create the parser
-    parser = argparse.ArgumentParser(description='Generate a light curve file from Level 1 PI spectrogram file (Type II) for a specified energy range.')
+    parser = argparse.ArgumentParser(description='Generate a light curve file from Level 1 PI spectrogram file (Type II) for one or more energy ranges.')
 
     # Add arguments
-    parser.add_argument('-i','--infile', type=str, help='Path to the Level 1 PI spectrogram file (Type II)')
+    parser.add_argument('-i','--infile', type=str, nargs='+', help='Path to the Level 1 PI spectrogram file (Type II), or several files/globs (e.g. one per day)')
     parser.add_argument('-elo','--ene_low', type=float, help='Lower energy limit in keV')
     parser.add_argument('-ehi','--ene_high', type=float, help='Higher energy limit in keV')
-    parser.add_argument('-tbin', '--time_bin', type=int, help='Time bin size in seconds', default=None)
+    parser.add_argument('-b','--bands', type=parse_ene_band, nargs='+', help='Energy bands as ene_low-ene_high in keV (e.g. 2-4 4-10), computed from a single read', default=None)
+    parser.add_argument('--split_bands', action='store_true', help='Write one light curve file per energy band')
+    parser.add_argument('-tbin', '--time_bin', type=float, help='Time bin size in seconds (width of the first bin for log binning)', default=None)
+    parser.add_argument('--binning', type=str, choices=['linear', 'log', 'mincounts'], default='linear', help='Time binning scheme (default linear)')
+    parser.add_argument('--min_counts', type=float, help='Minimum counts per bin for mincounts binning', default=None)
+    parser.add_argument('-gti', '--gti_file', type=str, nargs='+', help='Path to the Level 1 Good Time Interval File, or several files/globs (optional)', default=None)
     parser.add_argument('-o','--outfile', type=str, help='Output file name (optional)', default=None)
     parser.add_argument('-c','--clobber', type=bool, default= False, help='Overwrite existing file if it exists')
+    parser.add_argument('--incremental', action='store_true', help='Append only the rows added to a growing Level 1 file since the last incremental run to the existing light curve')
+    parser.add_argument('--bkg', type=str, nargs='+', default=None, help='Background from the quiet intervals of the day (auto) or from intervals tstart-tstop in Unix seconds, subtracted in RATE columns (needs -gti)')
+    parser.add_argument('--profile', type=str, nargs='?', const='-', default=None, help='Write a JSON summary of the time, rows, bytes and peak memory of each stage to this file (stdout if no file is given)')
 
     # Parse arguments
     args = parser.parse_args()
 
-    try:
-        outfile_name = solexs_genlc(args.infile, args.ene_low, args.ene_high, args.time_bin, outfile=args.outfile, clobber=args.clobber)
-        print(f"Output written to {outfile_name}.")
-    except Exception as e:
-        print(f"Error: {e}")
+    if args.bands is None:
+        if args.ene_low is None or args.ene_high is None:
+            parser.error('either -elo and -ehi or -b/--bands is required')
+        args.bands = [(args.ene_low, args.ene_high)]
+
+    with Profile() if args.profile is not None else contextlib.nullcontext() as prof:
+        try:
+            from .background import parse_background
+            outfile_name = solexs_genlc_bands(args.infile, args.bands, args.time_bin, outfile=args.outfile, clobber=args.clobber, split_bands=args.split_bands,
+                                              binning=args.binning, min_counts=args.min_counts, gti_file=args.gti_file, incremental=args.incremental,
+                                              background=parse_background(args.bkg))
+            if isinstance(outfile_name, list):
+                outfile_name = ', '.join(outfile_name)
+            print(f"Output written to {outfile_name}.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    if args.profile is not None:
+        prof.write_json(args.profile, command='solexs-genlc', argv=sys.argv[1:])
 
 
     
\ No newline at end of file
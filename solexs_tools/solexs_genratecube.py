@@ -0,0 +1,284 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 11:48:12 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: solexs_genratecube.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 11:48:12 pm
+#####################################################
+
+"""
+Multi-band rate cube and hardness ratios from one read of the L1 data.
+
+The COUNTS of every Level 1 file are summed into the energy bands in
+chunks of rows (band_counts) and the band counts are binned right away,
+so only the per-bin sums are kept in memory and months of data can be
+processed one file at a time. Time bins are those of rebin_lc: bins of
+time_bin seconds from the first row, the last bin truncated one row after
+the last row. Bins without any rows are left out.
+"""
+
+import argparse
+import contextlib
+import datetime
+import os
+import sys
+
+import numpy as np
+
+from .gti_utils import read_gti, gti_mask
+from .io_utils import iter_l1_spectrograms, l1_files_basename
+from .products import RateCube
+from .profiling import Profile, stage
+from .solexs_genlc import band_counts, energy_bands_to_channels, parse_ene_band
+from .solexs_genspec import primary_header_keywords
+
+ROW_WIDTH = 1.0 # duration of one L1 row in seconds
+
+
+def _sum_bins(bin_idx, lc_data, good_exposure, good_rows):
+    """
+    Sums over the rows of each bin of one file: bins, band counts (rows in
+    the GTI), exposure in the GTI, number of rows and of rows in the GTI.
+    """
+    bins, inverse = np.unique(bin_idx, return_inverse=True)
+    n_bins = len(bins)
+    counts = np.column_stack([np.bincount(inverse, weights=lc_data[:,i_band]*good_rows, minlength=n_bins)
+                              for i_band in range(lc_data.shape[1])])
+    return (bins, counts, np.bincount(inverse, weights=good_exposure, minlength=n_bins),
+            np.bincount(inverse, minlength=n_bins), np.bincount(inverse, weights=good_rows, minlength=n_bins))
+
+
+def hardness_ratios(rate, error, hardness_pairs):
+    """
+    Ratios rate[:,hard]/rate[:,soft] of the (soft, hard) band pairs with
+    errors propagated from the rate errors. NaN where the soft rate is zero.
+
+    Returns:
+        tuple: (n_bins, n_pairs) ratios and errors.
+    """
+    n_bins = len(rate)
+    hardness = np.full((n_bins, len(hardness_pairs)), np.nan)
+    hardness_err = np.full((n_bins, len(hardness_pairs)), np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i_pair, (soft, hard) in enumerate(hardness_pairs):
+            ratio = rate[:,hard]/rate[:,soft]
+            ratio_err = np.abs(ratio)*np.sqrt((error[:,hard]/rate[:,hard])**2 + (error[:,soft]/rate[:,soft])**2)
+            # Zero hard rate: the ratio is 0 with the error of the hard rate only
+            zero_hard = (rate[:,hard] == 0) & (rate[:,soft] > 0)
+            ratio_err[zero_hard] = error[zero_hard, hard]/rate[zero_hard, soft]
+            valid = rate[:,soft] > 0
+            hardness[valid, i_pair] = ratio[valid]
+            hardness_err[valid, i_pair] = ratio_err[valid]
+
+    return hardness, hardness_err
+
+
+def solexs_genratecube(spec_file, ene_bands, time_bin=None, gti_file=None, hardness_pairs=None, outfile=None, clobber=True, write=True):
+    """
+    Count rates of several energy bands in common time bins, with their
+    errors, exposure, GTI flags and hardness ratios.
+
+    Args:
+        spec_file (str or list): Path to the Level 1 PI spectrogram file
+            (Type II), or a list/glob of them (e.g. one per day).
+        ene_bands (list): (ene_low, ene_high) pairs in keV, mapped to
+            channels with the CALDB energy bounds.
+        time_bin (float, optional): Time bin size in seconds as for rebin_lc
+            (default one L1 row).
+        gti_file (str or list, optional): Level 1 GTI file(s). Only rows in
+            the GTI are counted; all rows count without it.
+        hardness_pairs (list, optional): (soft, hard) band indices of the
+            hardness ratios rate[:,hard]/rate[:,soft] (default every band
+            over the one before it).
+        outfile (str, optional): Output file name.
+        clobber (bool): Overwrite an existing file.
+        write (bool): Write the rate cube file. Otherwise return a
+            products.RateCube.
+
+    Returns:
+        str: Output file name (a products.RateCube if write is False).
+    """
+    time_bin = ROW_WIDTH if time_bin is None else time_bin
+    if time_bin <= 0:
+        raise ValueError("Time binning has to be positive.")
+
+    if hardness_pairs is None:
+        hardness_pairs = [(i_band, i_band + 1) for i_band in range(len(ene_bands) - 1)]
+    for soft, hard in hardness_pairs:
+        if not (0 <= soft < len(ene_bands) and 0 <= hard < len(ene_bands)) or soft == hard:
+            raise ValueError(f'Invalid hardness ratio bands ({soft}, {hard}) for {len(ene_bands)} energy bands.')
+
+    gti = read_gti(gti_file) if gti_file is not None else None
+
+    filter_sdd = None
+    t0 = None
+    tstop = None
+    l1_files, file_sums = [], []
+
+    for l1_file, l1_data in iter_l1_spectrograms(spec_file):
+        if filter_sdd is None:
+            filter_sdd = l1_data.filter_sdd
+            band_channels = energy_bands_to_channels(filter_sdd, ene_bands)
+        elif l1_data.filter_sdd != filter_sdd:
+            raise ValueError(f'Filter {l1_data.filter_sdd} of {l1_file} does not match filter {filter_sdd} of the other files.')
+
+        time_solexs = np.asarray(l1_data.time, dtype=np.float64)
+        if len(time_solexs) == 0:
+            continue
+        if t0 is None:
+            t0 = np.nanmin(time_solexs)
+        tstop = np.nanmax(time_solexs) + ROW_WIDTH if tstop is None else max(tstop, np.nanmax(time_solexs) + ROW_WIDTH)
+
+        l1_files.append(l1_file)
+        lc_data = band_counts(l1_data.counts, [(b[0], b[1]) for b in band_channels])
+
+        with stage('bin_lc', rows=len(time_solexs)):
+            good_rows = np.ones(len(time_solexs)) if gti is None else gti_mask(time_solexs, gti).astype(np.float64)
+            good_exposure = np.asarray(l1_data.exposure, dtype=np.float64)*good_rows
+            bin_idx = np.floor((time_solexs - t0)/time_bin).astype(np.int64)
+            file_sums.append(_sum_bins(bin_idx, lc_data, good_exposure, good_rows))
+
+    if filter_sdd is None or t0 is None:
+        raise ValueError(f'No data found in {spec_file}.')
+
+    # Bins may span two files, e.g. at midnight
+    with stage('bin_lc', rows=sum(len(s[0]) for s in file_sums)):
+        bins, inverse = np.unique(np.concatenate([s[0] for s in file_sums]), return_inverse=True)
+        n_bins = len(bins)
+        counts = np.column_stack([np.bincount(inverse, weights=np.concatenate([s[1][:,i_band] for s in file_sums]), minlength=n_bins)
+                                  for i_band in range(len(band_channels))])
+        exposure, n_rows, n_good = [np.bincount(inverse, weights=np.concatenate([s[i] for s in file_sums]), minlength=n_bins)
+                                    for i in (2, 3, 4)]
+
+        bin_start = t0 + bins*time_bin
+        timedel = np.minimum(bin_start + time_bin, tstop) - bin_start
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = np.where(exposure[:,None] > 0, counts/exposure[:,None], np.nan)
+            error = np.where(exposure[:,None] > 0, np.sqrt(counts)/exposure[:,None], np.nan)
+        fracexp = np.minimum(exposure/timedel, 1.)
+        gti_flag = (n_good == n_rows).astype(np.int16)
+
+        hardness, hardness_err = hardness_ratios(rate, error, hardness_pairs)
+
+    cube = RateCube(bin_start + timedel/2, timedel, rate, error, exposure, fracexp, gti_flag, hardness, hardness_err,
+                    list(hardness_pairs), time_bin, band_channels, filter_sdd, basename=l1_files_basename(l1_files),
+                    meta={'l1_files': l1_files})
+
+    if not write:
+        return cube
+
+    return cube.to_fits(outfile=outfile, clobber=clobber)
+
+
+def write_ratecube(cube, outfile, clobber=True):
+    """
+    Write a RateCube as a FITS file with a RATECUBE extension (TIME,
+    TIMEDEL, RATE, ERROR, EXPOSURE, FRACEXP, GTI_FLAG, HR and HR_ERR, with a
+    vector of all bands or ratios in each row) and a BANDS extension with
+    the channel and energy range of every band.
+
+    Returns:
+        str: Output file name.
+    """
+    from astropy.io import fits
+
+    with stage('write', rows=len(cube.time)) as st:
+        n_bands = len(cube.band_channels)
+        n_pairs = len(cube.hardness_pairs)
+
+        columns = [
+            fits.Column(name='TIME', format='D', unit='s', array=cube.time),
+            fits.Column(name='TIMEDEL', format='D', unit='s', array=cube.timedel),
+            fits.Column(name='RATE', format=f'{n_bands}D', unit='counts/s', array=cube.rate),
+            fits.Column(name='ERROR', format=f'{n_bands}D', unit='counts/s', array=cube.error),
+            fits.Column(name='EXPOSURE', format='D', unit='s', array=cube.exposure),
+            fits.Column(name='FRACEXP', format='E', array=cube.fracexp),
+            fits.Column(name='GTI_FLAG', format='I', array=cube.gti_flag),
+        ]
+        if n_pairs > 0:
+            columns.append(fits.Column(name='HR', format=f'{n_pairs}D', array=cube.hardness))
+            columns.append(fits.Column(name='HR_ERR', format=f'{n_pairs}D', array=cube.hardness_err))
+
+        hdu_cube = fits.BinTableHDU.from_columns(columns)
+        hdu_cube.name = 'RATECUBE'
+        header = hdu_cube.header
+        header['TSTART'] = cube.time[0] - cube.timedel[0]/2
+        header['TSTOP'] = cube.time[-1] + cube.timedel[-1]/2
+        header['TIMEDEL'] = (cube.time_bin, 'Time bin size (s)')
+        header['TIMZERO'] = 0
+        header['MJDREFI'] = 40587 # MJD REF of 1970-01-01 05:30:00
+        header['MJDREFF'] = 0.22916666651
+        header['TIMESYS'] = 'UTC'
+        header['TIMEREF'] = 'LOCAL'
+        header['TIMEUNIT'] = 's'
+        header['DATE-OBS'] = datetime.datetime.fromtimestamp(header['TSTART']).strftime('%Y-%m-%d %H:%M:%S')
+        header['DATE-END'] = datetime.datetime.fromtimestamp(header['TSTOP']).strftime('%Y-%m-%d %H:%M:%S')
+        header['FILTER'] = (cube.filter_sdd, 'Filter used')
+        header['NBANDS'] = (n_bands, 'Number of energy bands')
+        for i_band, (_, _, ene_low_str, ene_high_str) in enumerate(cube.band_channels):
+            header[f'E_MIN{i_band+1}'] = (float(ene_low_str), 'Lower energy limit of band (keV)')
+            header[f'E_MAX{i_band+1}'] = (float(ene_high_str), 'Upper energy limit of band (keV)')
+        for i_pair, (soft, hard) in enumerate(cube.hardness_pairs):
+            header[f'HR{i_pair+1}'] = (f'RATE{hard+1}/RATE{soft+1}', 'Hardness ratio bands')
+
+        hdu_bands = fits.BinTableHDU.from_columns([
+            fits.Column(name='BAND', format='J', array=np.arange(1, n_bands + 1)),
+            fits.Column(name='CH_LOW', format='J', array=[b[0] for b in cube.band_channels]),
+            fits.Column(name='CH_HIGH', format='J', array=[b[1] for b in cube.band_channels]),
+            fits.Column(name='E_MIN', format='D', unit='keV', array=[float(b[2]) for b in cube.band_channels]),
+            fits.Column(name='E_MAX', format='D', unit='keV', array=[float(b[3]) for b in cube.band_channels]),
+        ])
+        hdu_bands.name = 'BANDS'
+
+        primary_hdu = fits.PrimaryHDU()
+        for k in primary_header_keywords(outfile, content='Rate cube'):
+            primary_hdu.header.append(k)
+
+        fits.HDUList([primary_hdu, hdu_cube, hdu_bands]).writeto(outfile, overwrite=clobber)
+        st.bytes_written = os.path.getsize(outfile)
+
+    return outfile
+
+
+def parse_hardness_pair(pair_str):
+    """
+    Parse a hardness ratio given as 'soft,hard' band numbers (from 1).
+    """
+    try:
+        soft, hard = pair_str.split(',')
+        return int(soft) - 1, int(hard) - 1
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid hardness ratio '{pair_str}', expected soft,hard band numbers (e.g. 1,2).")
+
+
+def solexs_genratecube_cli():
+    parser = argparse.ArgumentParser(description='Generate a rate cube (count rates of several energy bands in common time bins) with hardness ratios from Level 1 PI spectrogram files (Type II).')
+
+    parser.add_argument('-i','--infile', type=str, nargs='+', help='Path to the Level 1 PI spectrogram file (Type II), or several files/globs (e.g. one per day)')
+    parser.add_argument('-b','--bands', type=parse_ene_band, nargs='+', help='Energy bands as ene_low-ene_high in keV (e.g. 2-4 4-10)')
+    parser.add_argument('-tbin', '--time_bin', type=float, default=None, help='Time bin size in seconds (default 1)')
+    parser.add_argument('-gti', '--gti_file', type=str, nargs='+', default=None, help='Path to the Level 1 Good Time Interval File, or several files/globs (optional)')
+    parser.add_argument('--hr', type=parse_hardness_pair, nargs='+', default=None, help='Hardness ratios as soft,hard band numbers counted from 1 (e.g. 1,2 1,3); default every band over the one before it')
+    parser.add_argument('-o','--outfile', type=str, default=None, help='Output file name (optional)')
+    parser.add_argument('-c','--clobber', type=bool, default=False, help='Overwrite existing file if it exists')
+    parser.add_argument('--profile', type=str, nargs='?', const='-', default=None, help='Write a JSON summary of the time, rows, bytes and peak memory of each stage to this file (stdout if no file is given)')
+
+    args = parser.parse_args()
+
+    if args.bands is None:
+        parser.error('-b/--bands is required')
+
+    with Profile() if args.profile is not None else contextlib.nullcontext() as prof:
+        try:
+            outfile_name = solexs_genratecube(args.infile, args.bands, time_bin=args.time_bin, gti_file=args.gti_file,
+                                              hardness_pairs=args.hr, outfile=args.outfile, clobber=args.clobber)
+            print(f"Output written to {outfile_name}.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    if args.profile is not None:
+        prof.write_json(args.profile, command='solexs-genratecube', argv=sys.argv[1:])
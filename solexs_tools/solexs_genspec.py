@@ -9,67 +9,54 @@
 #####################################################
 
 import argparse
+import contextlib
 import datetime
-from astropy.io import fits
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import os
+import sys
 import warnings
 
 from . import __version__, __caldb_version__
-from .time_utils import unix_time_to_utc
-from .caldb_utils import get_caldb_base_dir
-
-CALDB_BASE_DIR = get_caldb_base_dir()
+from .time_utils import unix_time_to_utc, unix_to_utc_array, unix_to_hhmmss
+from .caldb_utils import caldb_file
+from .fits_writer import TableTemplate, TemplateMismatch
+from .grouping import GROUPING_METHODS, group_spectra
+from .products import Spectrum, SpectrumSet
+from .profiling import Profile, stage, profiling_active, merge_records
+from .gti_utils import read_gti, gti_mask, time_bin_edges
+from .time_index import load_time_index, window_spectra
+from .io_utils import close_l1_spectrograms, open_l1_spectrograms, read_l1_spectrogram, l1_files_basename, uncompressed_l1_file
+from .l1_cache import has_l1_cache
+from .solexs_genlc import band_counts, energy_bands_to_channels, min_counts_bin_edges, bayesian_blocks_bin_edges, parse_ene_band
 
 QUALITY_THRESHOLD_CHANNEL = 56 #2.74 - 2.79
+MULTISPEC_BINNINGS = ('linear', 'mincounts', 'snr', 'bblocks')
 
-def write_spec(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, outfile, clobber=True):
-    # writing file
-    n_ch = len(channel)
-    hdu_list = []
-    primary_hdu = fits.PrimaryHDU()
-                                    
-    hdu_list.append(primary_hdu)
+def caldb_response_files(filter_sdd):
+    arf_file = caldb_file('arf', filter_sdd, __caldb_version__)
+    rmf_file = caldb_file('rmf', filter_sdd, __caldb_version__)
+    return arf_file, rmf_file
 
-    quality = np.where(channel <= QUALITY_THRESHOLD_CHANNEL, 1, 0)
 
-    fits_columns = []
-    col1 = fits.Column(name='CHANNEL',format='1J',array=channel)
-    col2 = fits.Column(name='COUNTS',format='1E',array=spec_data)
-    col3 = fits.Column(name='STAT_ERR',format='1E',array=stat_err)
-    col4 = fits.Column(name='SYS_ERR',format='1E',array=sys_err)
-    col5 = fits.Column(name='QUALITY',format='1J',array=quality)
+def channel_quality(channel):
+    return np.where(channel <= QUALITY_THRESHOLD_CHANNEL, 1, 0)
 
-    fits_columns.append(col1)
-    fits_columns.append(col2)
-    fits_columns.append(col3)
-    fits_columns.append(col4)
-    fits_columns.append(col5)
-    
-    hdu_pha = fits.BinTableHDU.from_columns(fits.ColDefs(fits_columns))
-    hdu_pha.name = 'SPECTRUM'
-                                                                       
-    hdu_list.append(hdu_pha)
-                                                                       
-    _hdu_list = fits.HDUList(hdus=hdu_list)
 
-    tstart_dt = datetime.datetime.fromtimestamp(tstart)
-    tstop_dt = datetime.datetime.fromtimestamp(tstop)
-    
-    # filter_sdd = hdu1[1].header['FILTER']
-    arf_file = os.path.join(CALDB_BASE_DIR,'arf',f'solexs_arf_{filter_sdd}_v{__caldb_version__}.arf')
-    rmf_file = os.path.join(CALDB_BASE_DIR,'response','rmf',f'solexs_gaussian_{filter_sdd}_v{__caldb_version__}.rmf')
+def group_spec_cube(channel, spec_cube, filter_sdd, group, min_counts=None, snr=None):
+    """
+    GROUPING and QUALITY of one or more spectra grouped with the method group
+    (see grouping.group_spectra), or (None, None) if group is None.
+    """
+    if group is None:
+        return None, None
+    with stage('group', rows=len(np.atleast_2d(spec_cube))):
+        return group_spectra(spec_cube, channel_quality(channel), filter_sdd, group, min_counts=min_counts, snr=snr)
 
-    print(f'ARF: {arf_file}')
-    print(f'RMF: {rmf_file}')
 
-    _hdu_list[1].header.set('TSTART',tstart_dt.isoformat())
-    _hdu_list[1].header.set('TSTOP',tstop_dt.isoformat())
-    _hdu_list[1].header.set('TIMESYS', 'UTC')
-    _hdu_list[1].header.set('EXPOSURE',f'{exposure:.0f}')
-
-    
-    _HEADER_KEYWORDS = (
+def spec_header_keywords(filter_sdd, n_ch, arf_file, rmf_file, pha_type='TYPE:I ', grouped=False, backfile=None):
+    # With a GROUPING column the GROUPING keyword is left out
+    keywords = (
         ("EXTNAME", "SPECTRUM", "Extension name"),
         ("CONTENT", "OGIP PHA data", "File content"),
         ("MISSION" , 'ADITYA L-1', 'Name of mission/satellite'),
@@ -87,11 +74,11 @@ def write_spec(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, f
         ("HDUCLAS1", "SPECTRUM", "Extension contains spectral data  "),
         ("HDUCLAS2", "TOTAL ", ""),
         ("HDUCLAS3", "COUNT ", ""),
-        ("HDUCLAS4", "TYPE:I ", ""),
+        ("HDUCLAS4", pha_type, ""),
         ("FILTER", filter_sdd, "Filter used"),
         ('RESPFILE', rmf_file),
         ('ANCRFILE', arf_file),
-        ('BACKFILE','None'),        
+        ('BACKFILE','None' if backfile is None else backfile),        
         ("CHANTYPE", "PI", "Channel type"),
         ("POISSERR", False, "Are the rates Poisson distributed"),
         ("DETCHANS", n_ch, "Number of channels"),
@@ -104,28 +91,155 @@ def write_spec(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, f
         ("TLMIN", 0, "Minimum legal value for 'CHANNEL' column"),
         ("TLMAX", n_ch-1, "Maximum legal value for 'CHANNEL' column"),
     )
-    
-    data_header = _hdu_list[1].header
-    
-    for k in _HEADER_KEYWORDS:
-        data_header.append(k)
-    
-    _hdu_list[1].header = data_header
-    
+    if grouped:
+        keywords = tuple(k for k in keywords if k[0] != 'GROUPING')
+    return keywords
 
 
-
-    _PRIMARY_HEADER_KEYWORDS = (
+def primary_header_keywords(outfile, content='Type I PI file'):
+    return (
         ("MISSION" , 'ADITYA L-1', 'Name of mission/satellite'),
         ("TELESCOP", 'AL1' , 'Name of mission/satellite'),
         ("INSTRUME", 'SoLEXS'      , 'Name of Instrument/detector'),
         ("ORIGIN"  , 'SoLEXSPOC'       , 'Source of FITS file'),
         ("CREATOR" , f'solexs_tools-{__version__}'  , 'Creator of file'),
         ("FILENAME", os.path.basename(outfile)            , 'Name of file'),
-        ("CONTENT" , 'Type I PI file' , 'File content'),
+        ("CONTENT" , content , 'File content'),
         # ("VERSION" , __data_version__ , 'Data Product Version'),
         ("DATE", datetime.datetime.now().strftime("%Y-%m-%d"), 'Creation Date'),
     )
+
+
+# Header cards that differ between Type I spectra of the same filter
+SPEC_TEMPLATE_KEYS = ((0, 'FILENAME'), (0, 'DATE'), (1, 'TSTART'), (1, 'TSTOP'), (1, 'EXPOSURE'))
+_spec_templates = {}
+
+
+def _spec_template(channel, filter_sdd, arf_file, rmf_file, grouped=False, backfile=None):
+    """
+    TableTemplate of a Type I spectrum, made once per filter, response and
+    background file, with a GROUPING column if grouped.
+    """
+    key = (filter_sdd, arf_file, rmf_file, channel.tobytes(), grouped, backfile)
+    if key not in _spec_templates:
+        zeros = np.zeros(len(channel))
+        grouping = np.ones(len(channel), dtype=np.int16) if grouped else None
+        hdu_list = spec_hdu_list(channel, zeros, zeros, zeros, 0., 0., 0., filter_sdd, 'template.pi', arf_file, rmf_file,
+                                 grouping=grouping, backfile=backfile)
+        _spec_templates[key] = TableTemplate(hdu_list, SPEC_TEMPLATE_KEYS)
+    return _spec_templates[key]
+
+
+def write_spec(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, outfile, clobber=True,
+               grouping=None, quality=None, backfile=None):
+    # grouping and quality (from group_spec_cube) add a GROUPING column and
+    # replace the default QUALITY column, backfile is the BACKFILE keyword
+    with stage('write', rows=len(channel)) as st:
+        outfile = _write_spec(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, outfile, clobber,
+                              grouping, quality, backfile)
+        st.bytes_written = os.path.getsize(outfile)
+    return outfile
+
+
+def _write_spec(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, outfile, clobber=True,
+                grouping=None, quality=None, backfile=None):
+    # filter_sdd = hdu1[1].header['FILTER']
+    arf_file, rmf_file = caldb_response_files(filter_sdd)
+
+    print(f'ARF: {arf_file}')
+    print(f'RMF: {rmf_file}')
+
+    outfile = outfile[:-3] if outfile.endswith('.pi') else outfile
+    outfile = f'{outfile}.pi'
+
+    # Only the counts and a few header cards change from one spectrum to the
+    # next, so files are written from a template of the first one.
+    try:
+        template = _spec_template(np.asarray(channel), filter_sdd, arf_file, rmf_file, grouped=grouping is not None, backfile=backfile)
+        columns = {'COUNTS': spec_data, 'STAT_ERR': stat_err, 'SYS_ERR': sys_err}
+        if grouping is not None:
+            columns['GROUPING'] = grouping
+        if quality is not None:
+            columns['QUALITY'] = quality
+        template.write(outfile, columns,
+                       {(0, 'FILENAME'): os.path.basename(outfile),
+                        (0, 'DATE'): datetime.datetime.now().strftime("%Y-%m-%d"),
+                        (1, 'TSTART'): datetime.datetime.fromtimestamp(tstart).isoformat(),
+                        (1, 'TSTOP'): datetime.datetime.fromtimestamp(tstop).isoformat(),
+                        (1, 'EXPOSURE'): f'{exposure:.0f}'},
+                       clobber=clobber)
+        return outfile
+    except TemplateMismatch:
+        pass
+
+    _hdu_list = spec_hdu_list(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, outfile, arf_file, rmf_file,
+                              grouping, quality, backfile)
+    _hdu_list.writeto(outfile,overwrite=clobber)
+
+    return outfile
+
+
+def spec_hdu_list(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, outfile, arf_file, rmf_file,
+                  grouping=None, quality=None, backfile=None):
+    """
+    HDUList of a Type I spectrum, with a GROUPING column if grouping is given.
+    """
+    from astropy.io import fits
+
+    # writing file
+    n_ch = len(channel)
+    hdu_list = []
+    primary_hdu = fits.PrimaryHDU()
+                                    
+    hdu_list.append(primary_hdu)
+
+    if quality is None:
+        quality = channel_quality(channel)
+
+    fits_columns = []
+    col1 = fits.Column(name='CHANNEL',format='1J',array=channel)
+    col2 = fits.Column(name='COUNTS',format='1E',array=spec_data)
+    col3 = fits.Column(name='STAT_ERR',format='1E',array=stat_err)
+    col4 = fits.Column(name='SYS_ERR',format='1E',array=sys_err)
+    col5 = fits.Column(name='QUALITY',format='1J',array=quality)
+
+    fits_columns.append(col1)
+    fits_columns.append(col2)
+    fits_columns.append(col3)
+    fits_columns.append(col4)
+    fits_columns.append(col5)
+    if grouping is not None:
+        fits_columns.append(fits.Column(name='GROUPING',format='1I',array=grouping))
+    
+    hdu_pha = fits.BinTableHDU.from_columns(fits.ColDefs(fits_columns))
+    hdu_pha.name = 'SPECTRUM'
+                                                                       
+    hdu_list.append(hdu_pha)
+                                                                       
+    _hdu_list = fits.HDUList(hdus=hdu_list)
+
+    tstart_dt = datetime.datetime.fromtimestamp(tstart)
+    tstop_dt = datetime.datetime.fromtimestamp(tstop)
+
+    _hdu_list[1].header.set('TSTART',tstart_dt.isoformat())
+    _hdu_list[1].header.set('TSTOP',tstop_dt.isoformat())
+    _hdu_list[1].header.set('TIMESYS', 'UTC')
+    _hdu_list[1].header.set('EXPOSURE',f'{exposure:.0f}')
+
+    
+    _HEADER_KEYWORDS = spec_header_keywords(filter_sdd, n_ch, arf_file, rmf_file, grouped=grouping is not None, backfile=backfile)
+    
+    data_header = _hdu_list[1].header
+    
+    for k in _HEADER_KEYWORDS:
+        data_header.append(k)
+    
+    _hdu_list[1].header = data_header
+    
+
+
+
+    _PRIMARY_HEADER_KEYWORDS = primary_header_keywords(outfile)
     
     primary_header = _hdu_list[0].header
 
@@ -133,41 +247,255 @@ def write_spec(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, f
         primary_header.append(k)
 
     _hdu_list[0].header = primary_header
-        
-    outfile = outfile[:-3] if outfile.endswith('.pi') else outfile
-    _hdu_list.writeto(f'{outfile}.pi',overwrite=clobber)
 
-    return f'{outfile}.pi' 
+    return _hdu_list
+
 
+def write_spec_typeII(channel, spec_cube, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, outfile, clobber=True,
+                      grouping=None, quality=None, backfile=None):
+    """
+    Write several spectra into one OGIP Type II PHA file, one row per spectrum.
 
+    spec_cube, stat_err and sys_err are (n_spec, n_channels) arrays, tstart,
+    tstop and exposure hold one value per spectrum (times in Unix seconds).
+    grouping and quality, (n_spec, n_channels) arrays from group_spec_cube,
+    add a GROUPING column and replace the default QUALITY. backfile is the
+    BACKFILE keyword (background file of all spectra).
+    """
+    with stage('write', rows=len(spec_cube)) as st:
+        outfile = _write_spec_typeII(channel, spec_cube, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, outfile, clobber,
+                                     grouping, quality, backfile)
+        st.bytes_written = os.path.getsize(outfile)
+    return outfile
 
 
-def solexs_genspec(spec_file,tstart,tstop,gti_file,outfile=None,clobber=True): # times in unix seconds
+def _write_spec_typeII(channel, spec_cube, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, outfile, clobber=True,
+                       grouping=None, quality=None, backfile=None):
+    from astropy.io import fits
 
-    hdu1 = fits.open(spec_file)
+    n_spec, n_ch = spec_cube.shape
+    hdu_list = []
+    primary_hdu = fits.PrimaryHDU()
 
-    if hdu1[0].header['CONTENT'] != 'Type II PHA file':
-        raise TypeError('Input File is not Type II PHA file.')
+    hdu_list.append(primary_hdu)
 
-    hdu=fits.BinTableHDU.from_columns(hdu1[1].columns)
+    if quality is None:
+        quality = np.tile(channel_quality(channel), (n_spec, 1))
 
-    data=hdu.data
+    fits_columns = []
+    fits_columns.append(fits.Column(name='SPEC_NUM',format='1J',array=np.arange(1, n_spec+1)))
+    fits_columns.append(fits.Column(name='TSTART',format='1D',array=tstart,unit='s'))
+    fits_columns.append(fits.Column(name='TSTOP',format='1D',array=tstop,unit='s'))
+    fits_columns.append(fits.Column(name='EXPOSURE',format='1D',array=exposure,unit='s'))
+    fits_columns.append(fits.Column(name='CHANNEL',format=f'{n_ch}J',array=np.tile(channel, (n_spec, 1))))
+    fits_columns.append(fits.Column(name='COUNTS',format=f'{n_ch}E',array=spec_cube))
+    fits_columns.append(fits.Column(name='STAT_ERR',format=f'{n_ch}E',array=stat_err))
+    fits_columns.append(fits.Column(name='SYS_ERR',format=f'{n_ch}E',array=sys_err))
+    fits_columns.append(fits.Column(name='QUALITY',format=f'{n_ch}J',array=quality))
+    if grouping is not None:
+        fits_columns.append(fits.Column(name='GROUPING',format=f'{n_ch}I',array=grouping))
 
-    time_solexs = data['TSTART']
-    
-    # exposure=data['EXPOSURE']
+    hdu_pha = fits.BinTableHDU.from_columns(fits.ColDefs(fits_columns))
+    hdu_pha.name = 'SPECTRUM'
+
+    hdu_list.append(hdu_pha)
 
-    hdu_gti = fits.open(gti_file)
-    gti_data = hdu_gti[1].data
+    _hdu_list = fits.HDUList(hdus=hdu_list)
 
-    gti_inds = np.array([False]*len(time_solexs))
+    tstart_dt = datetime.datetime.fromtimestamp(np.min(tstart))
+    tstop_dt = datetime.datetime.fromtimestamp(np.max(tstop))
 
-    for i in range(len(gti_data)):
-        row_gti_inds = (time_solexs >= gti_data['START'][i]) & (
-            time_solexs <= gti_data['STOP'][i])
-        gti_inds[row_gti_inds] = True
+    arf_file, rmf_file = caldb_response_files(filter_sdd)
 
-    max_time = np.nanmax(time_solexs)
+    print(f'ARF: {arf_file}')
+    print(f'RMF: {rmf_file}')
+
+    _hdu_list[1].header.set('TSTART',tstart_dt.isoformat())
+    _hdu_list[1].header.set('TSTOP',tstop_dt.isoformat())
+    _hdu_list[1].header.set('TIMESYS', 'UTC')
+
+    data_header = _hdu_list[1].header
+
+    for k in spec_header_keywords(filter_sdd, n_ch, arf_file, rmf_file, pha_type='TYPE:II', grouped=grouping is not None, backfile=backfile):
+        data_header.append(k)
+
+    primary_header = _hdu_list[0].header
+
+    for k in primary_header_keywords(outfile, content='Type II PHA file'):
+        primary_header.append(k)
+
+    outfile = outfile[:-3] if outfile.endswith('.pi') else outfile
+    _hdu_list.writeto(f'{outfile}.pi',overwrite=clobber)
+
+    return f'{outfile}.pi'
+
+
+def adaptive_bin_edges(l1_file, tstart, tstop, gti, binning, min_counts=None, snr=None, ene_band=None, p0=0.05, cell_width=None,
+                       l1_data=None):
+    """
+    Time bin edges within [tstart, tstop) chosen from the counts of the
+    GTI-filtered rows in an energy band, summed in one pass over COUNTS:
+
+    - 'mincounts': at least min_counts counts per bin (min_counts_bin_edges).
+    - 'snr': a signal to noise ratio of at least snr per bin, i.e. at least
+      snr**2 counts for Poisson counts without background.
+    - 'bblocks': Bayesian blocks of the band light curve with false alarm
+      probability p0 on cells of cell_width seconds (bayesian_blocks_bin_edges).
+
+    Args:
+        l1_file (str): Level 1 PI file.
+        tstart, tstop (float): Time range in Unix seconds.
+        gti (np.ndarray): (N, 2) array of GTI START, STOP pairs.
+        binning (str): 'mincounts', 'snr' or 'bblocks'.
+        min_counts, snr, p0, cell_width: As above.
+        ene_band (tuple, optional): (ene_low, ene_high) in keV of the band,
+            all channels by default.
+        l1_data (L1Spectrogram, optional): Spectrogram of l1_file if it was
+            already read.
+
+    Returns:
+        tuple: Bin edges and the time binning part of Type II file names.
+    """
+    if binning == 'mincounts' and not min_counts:
+        raise ValueError("Binning 'mincounts' needs min_counts.")
+    if binning == 'snr' and not snr:
+        raise ValueError("Binning 'snr' needs snr.")
+    if binning not in MULTISPEC_BINNINGS[1:]:
+        raise ValueError(f"Unknown binning '{binning}', expected one of {', '.join(MULTISPEC_BINNINGS)}.")
+
+    if l1_data is None:
+        l1_data = read_l1_spectrogram(l1_file)
+    time_solexs = l1_data.time
+    counts = l1_data.counts
+
+    # Only touch the rows in the time range when rows are time ordered
+    if np.all(np.diff(time_solexs) >= 0):
+        row_start, row_stop = np.searchsorted(time_solexs, [tstart, tstop])
+        time_solexs = time_solexs[row_start:row_stop]
+        counts = counts[row_start:row_stop]
+
+    time_solexs = np.asarray(time_solexs, dtype=np.float64)
+    rows = np.flatnonzero((time_solexs >= tstart) & (time_solexs < tstop) & gti_mask(time_solexs, gti))
+    if len(rows) == 0:
+        raise ValueError(f"No valid data found for the specified time range ({tstart} to {tstop}).")
+
+    if ene_band is None:
+        channel_range = (0, counts.shape[1])
+    else:
+        channel_range = energy_bands_to_channels(l1_data.filter_sdd, [ene_band])[0][:2]
+
+    lc_data = band_counts(counts, [channel_range])[rows,0]
+    time_solexs = time_solexs[rows]
+
+    if binning == 'bblocks':
+        bin_edges = bayesian_blocks_bin_edges(lc_data, time_solexs, p0=p0, cell_width=cell_width)
+        time_bin_str = 'bblocks'
+    elif binning == 'snr':
+        bin_edges = min_counts_bin_edges(lc_data, time_solexs, snr**2)
+        time_bin_str = f'snr{snr:g}'
+    else:
+        bin_edges = min_counts_bin_edges(lc_data, time_solexs, min_counts)
+        time_bin_str = f'min{min_counts:g}cts'
+
+    bin_edges[-1] = min(bin_edges[-1], tstop)
+    return bin_edges, time_bin_str
+
+
+def bin_spectra(time_solexs, counts, exposure, bin_edges, mask=None):
+    """
+    Accumulate spectrogram rows into time bins in a single pass.
+
+    Each row is assigned to the bin with bin_edges[k] <= time < bin_edges[k+1].
+
+    Args:
+        time_solexs (np.ndarray): TSTART of each spectrogram row.
+        counts (np.ndarray): (n_rows, n_channels) COUNTS matrix.
+        exposure (np.ndarray): EXPOSURE of each row.
+        bin_edges (np.ndarray): Monotonically increasing bin edges.
+        mask (np.ndarray, optional): Rows to include (e.g. GTI mask).
+
+    Returns:
+        tuple: (n_bins, n_channels) spectra cube, exposure per bin and
+        number of rows per bin.
+    """
+    with stage('sum_rows') as st:
+        spec_cube, bin_exposure, bin_rows = _bin_spectra(time_solexs, counts, exposure, bin_edges, mask)
+        st.rows = int(np.sum(bin_rows))
+        st.bytes_read = st.rows*counts.shape[1]*counts.dtype.itemsize
+    return spec_cube, bin_exposure, bin_rows
+
+
+def _bin_spectra(time_solexs, counts, exposure, bin_edges, mask=None):
+    bin_edges = np.asarray(bin_edges, dtype=np.float64)
+    n_bins = len(bin_edges) - 1
+    n_ch = counts.shape[1]
+
+    bin_idx = np.searchsorted(bin_edges, time_solexs, side='right') - 1
+    valid = (bin_idx >= 0) & (bin_idx < n_bins)
+    if mask is not None:
+        valid &= mask
+
+    rows = np.flatnonzero(valid)
+    bin_idx = bin_idx[rows]
+
+    # Rows are time ordered in L1 files, only sort when they are not
+    if np.any(np.diff(bin_idx) < 0):
+        order = np.argsort(bin_idx, kind='stable')
+        rows = rows[order]
+        bin_idx = bin_idx[order]
+
+    spec_cube = np.zeros((n_bins, n_ch))
+    if len(rows) > 0:
+        filled_bins, bin_starts = np.unique(bin_idx, return_index=True)
+        spec_cube[filled_bins] = np.add.reduceat(np.asarray(counts[rows], dtype=np.float64), bin_starts, axis=0)
+
+    bin_exposure = np.bincount(bin_idx, weights=np.asarray(exposure, dtype=np.float64)[rows], minlength=n_bins)
+    bin_rows = np.bincount(bin_idx, minlength=n_bins)
+
+    return spec_cube, bin_exposure, bin_rows
+
+
+def solexs_genspec(spec_file,tstart,tstop,gti_file,outfile=None,clobber=True,use_index=True,write=True,
+                   group=None,group_min_counts=None,group_snr=None,background=None,l1_spectrograms=None,gti=None): # times in unix seconds
+    # spec_file and gti_file may also be lists/globs of files (e.g. days spanning
+    # midnight), which are streamed in time order one file at a time.
+    # With use_index the spectrum is taken from the prefix-sum time index of
+    # each file (see time_index), which is built on first use.
+    # With write=False a products.Spectrum is returned instead of writing it.
+    # group ('mincounts', 'snr' or 'optimal') groups the channels (see grouping).
+    # background ('auto', (tstart, tstop) intervals or a products.Background,
+    # see background.resolve_background) is written next to the spectrum and
+    # named in its BACKFILE.
+    # l1_spectrograms ((file, L1Spectrogram) pairs of spec_file in time order,
+    # see io_utils.open_l1_spectrograms) and gti (GTI array of gti_file) may be
+    # given when they are already in memory, e.g. in solexs_server.
+    if group is not None and group not in GROUPING_METHODS:
+        raise ValueError(f"Unknown grouping '{group}', expected one of {', '.join(GROUPING_METHODS)}.")
+
+    if l1_spectrograms is not None:
+        return _genspec(l1_spectrograms, spec_file, tstart, tstop, gti_file, gti, outfile, clobber, use_index, write, group,
+                        group_min_counts, group_snr, background)
+
+    l1_list = open_l1_spectrograms(spec_file)
+    try:
+        return _genspec(l1_list, spec_file, tstart, tstop, gti_file, gti, outfile, clobber, use_index, write, group, group_min_counts,
+                        group_snr, background)
+    finally:
+        close_l1_spectrograms(l1_list)
+
+
+def _genspec(l1_list, spec_file, tstart, tstop, gti_file, gti, outfile, clobber, use_index, write, group, group_min_counts, group_snr,
+             background):
+    spec_files = [f for f, _ in l1_list]
+    if len(spec_files) == 0:
+        raise ValueError(f'No data found in {spec_file}.')
+
+    file_time_ranges = [(np.nanmin(l1_data.time), np.nanmax(l1_data.time)) for _, l1_data in l1_list]
+
+    if gti is None:
+        gti = read_gti(gti_file)
+
+    max_time = max(r[1] for r in file_time_ranges)
     if tstop > max_time:
         warnings.warn(
             f"tstop {tstop}) is greater than the last available time in the L1 PI file ({max_time}). "
@@ -176,7 +504,7 @@ def solexs_genspec(spec_file,tstart,tstop,gti_file,outfile=None,clobber=True): #
             )
         tstop = max_time
 
-    min_time = np.nanmin(time_solexs)
+    min_time = min(r[0] for r in file_time_ranges)
     if tstart < min_time:
         warnings.warn(
             f"tstart {tstart}) is less than the first available time in the L1 PI file ({min_time}). "
@@ -192,45 +520,60 @@ def solexs_genspec(spec_file,tstart,tstop,gti_file,outfile=None,clobber=True): #
     print(f'Stop Time: {tstop_utc_time_str}')
 
 
-    inds = (time_solexs >= tstart) & (time_solexs < tstop)
+    spec_data = 0.
+    exposure = 0.
+    n_rows = 0
+    filter_sdd = None
 
-    inds = inds & gti_inds
+    for (l1_file, l1_data), (file_tstart, file_tstop) in zip(l1_list, file_time_ranges):
+        if file_tstop < tstart or file_tstart >= tstop:
+            continue
 
+        if filter_sdd is None:
+            filter_sdd = l1_data.filter_sdd
+            channel = l1_data.channel
+        elif l1_data.filter_sdd != filter_sdd:
+            raise ValueError(f'Filter {l1_data.filter_sdd} of {l1_file} does not match filter {filter_sdd} of the other files.')
 
-    data_f = data[inds]
+        time_index = load_time_index(l1_file, gti_file) if use_index else None
 
-    if len(data_f) == 0:
+        if time_index is not None:
+            window_counts, window_exposure, window_rows = window_spectra(time_index, tstart, tstop)
+        else:
+            time_solexs = l1_data.time
+            gti_inds = gti_mask(time_solexs, gti)
+
+            spec_cube, bin_exposure, bin_rows = bin_spectra(time_solexs, l1_data.counts, l1_data.exposure, [tstart, tstop], mask=gti_inds)
+            window_counts, window_exposure, window_rows = spec_cube[0], bin_exposure[0], bin_rows[0]
+
+        spec_data = spec_data + window_counts
+        exposure = exposure + window_exposure
+        n_rows = n_rows + window_rows
+
+    if n_rows == 0:
         raise ValueError(f"No valid data found for the specified time range ({tstart} to {tstop}).")
 
 
-    channel = data_f[0][3]
     n_ch = len(channel)
-    spec_data = np.zeros(n_ch)
-    stat_err = np.zeros(n_ch)
     sys_err = np.zeros(n_ch)
-    exposure = 0
-
-    for di in data_f:
-        spec_data = spec_data + di[4]
-        # stat_err = stat_err + np.sqrt(di[4])
-        # sys_err = sys_err
-        exposure = exposure + di[5]
 
     stat_err = np.sqrt(spec_data)
-    
-    # writing file
-    tstart_dt = datetime.datetime.fromtimestamp(tstart, datetime.timezone.utc)
-    tstop_dt = datetime.datetime.fromtimestamp(tstop, datetime.timezone.utc)
 
-    if outfile == None:
-        pi_file_basename = os.path.basename(spec_file)
-        pi_file_basename = pi_file_basename.split('.')[0]
-        outfile = pi_file_basename + '_' + tstart_dt.strftime('%H%M%S') + '_' + tstop_dt.strftime('%H%M%S')
+    grouping, quality = group_spec_cube(channel, spec_data, filter_sdd, group, min_counts=group_min_counts, snr=group_snr)
 
-    filter_sdd = hdu1[1].header['FILTER']
-    outfile = write_spec(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, filter_sdd, outfile, clobber)
+    if background is not None:
+        from .background import resolve_background
+        background = resolve_background(spec_files, gti_file, background)
 
-    return outfile
+    spectrum = Spectrum(channel, spec_data, stat_err, sys_err, tstart, tstop, exposure, filter_sdd,
+                        basename=l1_files_basename(spec_files), meta={'l1_files': spec_files}, grouping=grouping, quality=quality,
+                        background=background)
+
+    if not write:
+        return spectrum
+
+    # writing file
+    return spectrum.to_fits(outfile, clobber)
 
 
 def solexs_genspec_cli():
@@ -238,98 +581,314 @@ def solexs_genspec_cli():
     parser = argparse.ArgumentParser(description='Generate a type-I PI spectral file from Level 1 PI spectrogram file (Type II) for a specified time range.')
 
     # Add arguments
-    parser.add_argument('-i','--infile', type=str, help='Path to the Level 1 PI spectrogram file (Type II)')
+    parser.add_argument('-i','--infile', type=str, nargs='+', help='Path to the Level 1 PI spectrogram file (Type II), or several files/globs (e.g. one per day)')
     parser.add_argument('-tstart', type=float, help='Start time in Unix seconds')
     parser.add_argument('-tstop', type=float, help='Stop time in Unix seconds')
-    parser.add_argument('-gti', '--gti_file', type=str, help='Path to the Level 1 Good Time Interval File')
+    parser.add_argument('-gti', '--gti_file', type=str, nargs='+', help='Path to the Level 1 Good Time Interval File, or several files/globs')
     parser.add_argument('-o','--outfile', type=str, help='Output file name (optional)', default=None)
     parser.add_argument('-c','--clobber', type=bool, default= False, help='Overwrite existing file if it exists')
+    parser.add_argument('--group', type=str, choices=GROUPING_METHODS, default=None, help='Group the channels to at least group_min_counts counts (mincounts), a signal to noise ratio of group_snr (snr) or the optimal binning of Kaastra & Bleeker 2016 (optimal) (default no grouping)')
+    parser.add_argument('--group_min_counts', type=float, default=None, help='Minimum counts per channel group for mincounts grouping (optional for optimal)')
+    parser.add_argument('--group_snr', type=float, default=None, help='Minimum signal to noise ratio per channel group for snr grouping')
+    parser.add_argument('--bkg', type=str, nargs='+', default=None, help='Background from the quiet intervals of the day (auto) or from intervals tstart-tstop in Unix seconds, written next to the spectra and named in their BACKFILE')
+    parser.add_argument('--profile', type=str, nargs='?', const='-', default=None, help='Write a JSON summary of the time, rows, bytes and peak memory of each stage to this file (stdout if no file is given)')
 
     # Parse arguments
     args = parser.parse_args()
 
 
-    try:
-        outfile_name = solexs_genspec(args.infile, args.tstart, args.tstop, args.gti_file, outfile=args.outfile, clobber=args.clobber)
-        print(f"Output written to {outfile_name}.")
-    except Exception as e:
-        print(f"Error: {e}")
+    with Profile() if args.profile is not None else contextlib.nullcontext() as prof:
+        try:
+            from .background import parse_background
+            outfile_name = solexs_genspec(args.infile, args.tstart, args.tstop, args.gti_file, outfile=args.outfile, clobber=args.clobber,
+                                          group=args.group, group_min_counts=args.group_min_counts, group_snr=args.group_snr,
+                                          background=parse_background(args.bkg))
+            print(f"Output written to {outfile_name}.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    if args.profile is not None:
+        prof.write_json(args.profile, command='solexs-genspec', argv=sys.argv[1:])
+
+
+def _accumulate_bins(l1_file, bin_edges, gti, l1_spectrograms=None):
+    """
+    Accumulate the spectra of one contiguous range of time bins.
+    The spectrogram is opened with memmap, so parallel workers share it
+    through the page cache instead of receiving a pickled copy.
+    With l1_spectrograms ((file, L1Spectrogram) pairs already read) the
+    spectra are summed over those instead.
+    """
+    if l1_spectrograms is None:
+        l1_spectrograms = [(l1_file, read_l1_spectrogram(l1_file))]
+    filter_sdd = l1_spectrograms[0][1].filter_sdd
+
+    spec_cube = 0
+    bin_exposure = 0.
+    bin_rows = 0
+    for f, l1_data in l1_spectrograms:
+        if l1_data.filter_sdd != filter_sdd:
+            raise ValueError(f'Filter {l1_data.filter_sdd} of {f} does not match filter {filter_sdd} of the other files.')
+        time_solexs = l1_data.time
+        counts = l1_data.counts
+        exposure = l1_data.exposure
+
+        # Only touch the rows of this shard when rows are time ordered
+        if np.all(np.diff(time_solexs) >= 0):
+            row_start, row_stop = np.searchsorted(time_solexs, [bin_edges[0], bin_edges[-1]])
+            time_solexs = time_solexs[row_start:row_stop]
+            counts = counts[row_start:row_stop]
+            exposure = exposure[row_start:row_stop]
+
+        gti_inds = gti_mask(time_solexs, gti)
+
+        # Assign every row to its time bin once and accumulate all spectra together
+        file_cube, file_exposure, file_rows = bin_spectra(time_solexs, counts, exposure, bin_edges, mask=gti_inds)
+        spec_cube = spec_cube + file_cube
+        bin_exposure = bin_exposure + file_exposure
+        bin_rows = bin_rows + file_rows
+
+    return l1_spectrograms[0][1], spec_cube, bin_exposure, bin_rows
+
+
+def _warn_empty_bins(bin_edges, bin_rows):
+    for i_bin in np.flatnonzero(bin_rows == 0):
+        warnings.warn(
+            f"No valid data found for the time range ({bin_edges[i_bin]} to {bin_edges[i_bin + 1]}). Skipping.",
+            UserWarning
+        )
 
 
-def solexs_genmultispec(spec_file, tstart, tstop, time_bin, gti_file, output_dir='.', clobber=True):
-    hdu1 = fits.open(spec_file)
+def _genmultispec_shard(l1_file, bin_edges, gti, pi_file_basename, output_dir, clobber, group=None, group_min_counts=None, group_snr=None,
+                        backfile=None, l1_spectrograms=None):
+    """
+    Accumulate, group and write the Type I spectra of one contiguous range of time bins.
+    """
+    l1_data, spec_cube, bin_exposure, bin_rows = _accumulate_bins(l1_file, bin_edges, gti, l1_spectrograms)
+    _warn_empty_bins(bin_edges, bin_rows)
 
-    if hdu1[0].header['CONTENT'] != 'Type II PHA file':
-        raise TypeError('Input File is not Type II PHA file.')
+    grouping, quality = group_spec_cube(l1_data.channel, spec_cube, l1_data.filter_sdd, group, min_counts=group_min_counts, snr=group_snr)
 
-    hdu = fits.BinTableHDU.from_columns(hdu1[1].columns)
-    data = hdu.data
-    time_solexs = data['TSTART']
+    return write_multispec_typeI(l1_data.channel, spec_cube, bin_exposure, bin_rows, bin_edges, l1_data.filter_sdd,
+                                 pi_file_basename, output_dir, clobber, grouping, quality, backfile)
 
-    hdu_gti = fits.open(gti_file)
-    gti_data = hdu_gti[1].data
-    gti_inds = np.array([False] * len(time_solexs))
 
-    for i in range(len(gti_data)):
-        row_gti_inds = (time_solexs >= gti_data['START'][i]) & (time_solexs <= gti_data['STOP'][i])
-        gti_inds[row_gti_inds] = True
+def _profiled_genmultispec_shard(*args):
+    """
+    _genmultispec_shard in a worker process, also returning the stages it
+    ran so that they can be merged into the profile of the caller.
+    """
+    with Profile() as prof:
+        outfiles = _genmultispec_shard(*args)
+    return outfiles, prof.records
 
-    max_time = np.nanmax(time_solexs)
-    if tstop > max_time:
-        warnings.warn(
-            f"tstop ({tstop}) is greater than the last available time in the L1 PI file ({max_time}). "
-            f"Setting tstop to {max_time}.",
-            UserWarning
-        )
-        tstop = max_time
 
-    pi_file_basename = os.path.basename(spec_file)
-    pi_file_basename = pi_file_basename.split('.')[0]
+def write_multispec_typeI(channel, spec_cube, bin_exposure, bin_rows, bin_edges, filter_sdd, pi_file_basename, output_dir='.', clobber=True,
+                          grouping=None, quality=None, backfile=None):
+    """
+    Write one Type I PI file per time bin with data, named
+    {pi_file_basename}_{HHMMSS}_{HHMMSS}.pi after the bin edges (UTC).
+    grouping and quality are optional (n_bins, n_channels) arrays from
+    group_spec_cube, backfile the BACKFILE keyword of all files.
+
+    Returns:
+        list: Output file names.
+    """
+    n_ch = len(channel)
+    sys_err = np.zeros(n_ch)
 
-    current_tstart = tstart
-    while current_tstart < tstop:
-        current_tstop = min(current_tstart + time_bin, tstop)
+    # File names and messages for all bin edges at once
+    edges_hhmmss = unix_to_hhmmss(bin_edges)
+    edges_utc = unix_to_utc_array(bin_edges)
 
-        # Filter data for the current time bin and GTI
-        inds = (time_solexs >= current_tstart) & (time_solexs < current_tstop) & gti_inds
-        data_f = data[inds]
+    outfiles = []
+    for i_bin in range(len(bin_edges) - 1):
+        current_tstart = bin_edges[i_bin]
+        current_tstop = bin_edges[i_bin + 1]
 
-        if len(data_f) == 0:
-            warnings.warn(
-                f"No valid data found for the time range ({current_tstart} to {current_tstop}). Skipping.",
-                UserWarning
-            )
-            current_tstart += time_bin
+        if bin_rows[i_bin] == 0:
             continue
 
-        # Combine spectral data for the current time bin
-        channel = data_f[0][3]
-        n_ch = len(channel)
-        spec_data = np.zeros(n_ch)
-        stat_err = np.zeros(n_ch)
-        sys_err = np.zeros(n_ch)
-        exposure = 0
+        spec_data = spec_cube[i_bin]
+        stat_err = np.sqrt(spec_data)
+        exposure = bin_exposure[i_bin]
 
-        for di in data_f:
-            spec_data = spec_data + di[4]
-            # stat_err = stat_err + np.sqrt(di[4])
-            # sys_err = sys_err
-            exposure = exposure + di[5]
+        outfile_name = pi_file_basename + '_' + edges_hhmmss[i_bin] + '_' + edges_hhmmss[i_bin + 1]
+        outfile = os.path.join(output_dir,outfile_name)
 
-        stat_err = np.sqrt(spec_data)
+        outfiles.append(write_spec(channel, spec_data, stat_err, sys_err, current_tstart, current_tstop, exposure, filter_sdd, outfile, clobber,
+                                   None if grouping is None else grouping[i_bin], None if quality is None else quality[i_bin], backfile))
 
-        filter_sdd = hdu1[1].header['FILTER']
-        current_tstart_dt = datetime.datetime.fromtimestamp(current_tstart, datetime.timezone.utc)
-        current_tstop_dt = datetime.datetime.fromtimestamp(current_tstop, datetime.timezone.utc)
+        print(f"Generated spectrum for time range {edges_utc[i_bin]} to {edges_utc[i_bin + 1]}: {outfile}")
+
+    return outfiles
 
-        outfile_name = pi_file_basename + '_' + current_tstart_dt.strftime('%H%M%S') + '_' + current_tstop_dt.strftime('%H%M%S')
-        outfile = os.path.join(output_dir,outfile_name)
 
-        write_spec(channel, spec_data, stat_err, sys_err, current_tstart, current_tstop, exposure, filter_sdd, outfile, clobber)
+def write_multispec_typeII(channel, spec_cube, bin_exposure, bin_rows, bin_edges, filter_sdd, pi_file_basename, time_bin, output_dir='.', clobber=True,
+                           time_bin_str=None, grouping=None, quality=None, backfile=None):
+    """
+    Write the spectra of all time bins with data as rows of a single Type II
+    PHA file named {pi_file_basename}_{HHMMSS}_{HHMMSS}_{time_bin}sec.pi, or
+    with time_bin_str (e.g. min1000cts) in place of {time_bin}sec.
+    grouping and quality are optional (n_bins, n_channels) arrays from
+    group_spec_cube, backfile the BACKFILE keyword.
 
-        print(f"Generated spectrum for time range {current_tstart_dt.isoformat()} to {current_tstop_dt.isoformat()}: {outfile}")
+    Returns:
+        str: Output file name.
+    """
+    filled = bin_rows > 0
+    if not np.any(filled):
+        raise ValueError(f"No valid data found for the specified time range ({bin_edges[0]} to {bin_edges[-1]}).")
 
-        current_tstart += time_bin
+    spec_cube = spec_cube[filled]
+    edges_hhmmss = unix_to_hhmmss(bin_edges[[0, -1]])
+    edges_utc = unix_to_utc_array(bin_edges[[0, -1]])
+    if time_bin_str is None:
+        time_bin_str = f'{time_bin:g}sec'
+    outfile_name = f"{pi_file_basename}_{edges_hhmmss[0]}_{edges_hhmmss[1]}_{time_bin_str}"
+    outfile = os.path.join(output_dir, outfile_name)
+
+    outfile = write_spec_typeII(channel, spec_cube, np.sqrt(spec_cube), np.zeros_like(spec_cube),
+                                bin_edges[:-1][filled], bin_edges[1:][filled], bin_exposure[filled],
+                                filter_sdd, outfile, clobber,
+                                None if grouping is None else grouping[filled], None if quality is None else quality[filled], backfile)
+
+    print(f"Generated {len(spec_cube)} spectra for time range {edges_utc[0]} to {edges_utc[1]}: {outfile}")
+    return outfile
+
+
+def solexs_genmultispec(spec_file, tstart, tstop, time_bin, gti_file, output_dir='.', clobber=True, workers=1, output_format='typeI', write=True,
+                        binning='linear', min_counts=None, snr=None, ene_band=None, p0=0.05, group=None, group_min_counts=None,
+                        group_snr=None, background=None, l1_spectrograms=None, gti=None):
+    """
+    binning: 'linear' bins of time_bin seconds, or adaptive bins (see
+    adaptive_bin_edges) with at least min_counts counts ('mincounts'), a
+    signal to noise ratio of at least snr ('snr') or Bayesian blocks with
+    false alarm probability p0 ('bblocks') in the energy band ene_band
+    ((ene_low, ene_high) in keV, all channels by default). For 'bblocks'
+    time_bin is the width of the cells the blocks are made of (optional);
+    it is not used for 'mincounts' and 'snr'.
+    group: 'mincounts', 'snr' or 'optimal' groups the channels of all spectra
+    with at least group_min_counts counts or a signal to noise ratio of
+    group_snr per group (see grouping.group_spectra), None for no grouping.
+    background: 'auto', (tstart, tstop) intervals or a products.Background
+    (see background.resolve_background), computed once and written as
+    {pi_file_basename}_bkg.pi in output_dir, which is the BACKFILE of all
+    spectra.
+    workers: number of processes to share the time bins between. Bins are split
+    into contiguous shards, so output names and the order of the returned file
+    list do not depend on the number of workers.
+    output_format: 'typeI' writes one Type I PI file per time bin, 'typeII'
+    writes all spectra as rows of a single Type II PHA file.
+    write: with write=False a products.SpectrumSet of the non-empty bins is
+    returned instead of writing files (workers and output_format are then
+    not used).
+    l1_spectrograms, gti: (file, L1Spectrogram) pairs of spec_file in time
+    order (see io_utils.open_l1_spectrograms) and the GTI array of gti_file,
+    when they are already in memory (e.g. in solexs_server). The spectra are
+    then summed over all files in this process. Adaptive binning needs a
+    single file.
+    """
+    if output_format not in ('typeI', 'typeII'):
+        raise ValueError(f"Unknown output format '{output_format}', expected 'typeI' or 'typeII'.")
+    if binning not in MULTISPEC_BINNINGS:
+        raise ValueError(f"Unknown binning '{binning}', expected one of {', '.join(MULTISPEC_BINNINGS)}.")
+    if binning == 'linear' and not time_bin:
+        raise ValueError("Binning 'linear' needs a time bin size.")
+    if group is not None and group not in GROUPING_METHODS:
+        raise ValueError(f"Unknown grouping '{group}', expected one of {', '.join(GROUPING_METHODS)}.")
+
+    if l1_spectrograms is None:
+        # Decompress once here so that workers only memory-map the spectrogram,
+        # unless it is read from the columnar cache
+        l1_file = spec_file if has_l1_cache(spec_file) else uncompressed_l1_file(spec_file)
+        with read_l1_spectrogram(l1_file, columns=('TSTART',)) as l1_data:
+            max_time = np.nanmax(l1_data.time)
+        spec_files = [spec_file]
+    else:
+        if len(l1_spectrograms) == 0:
+            raise ValueError(f'No data found in {spec_file}.')
+        if len(l1_spectrograms) > 1 and binning != 'linear':
+            raise ValueError(f"Binning '{binning}' needs a single Level 1 file.")
+        l1_file = l1_spectrograms[0][0]
+        max_time = max(np.nanmax(l1_data.time) for _, l1_data in l1_spectrograms)
+        spec_files = [f for f, _ in l1_spectrograms]
+
+    if gti is None:
+        gti = read_gti(gti_file)
+
+    if tstop > max_time:
+        warnings.warn(
+            f"tstop ({tstop}) is greater than the last available time in the L1 PI file ({max_time}). "
+            f"Setting tstop to {max_time}.",
+            UserWarning
+        )
+        tstop = max_time
+
+    pi_file_basename = l1_files_basename(spec_files)
+
+    time_bin_str = None
+    if binning == 'linear':
+        bin_edges = time_bin_edges(tstart, tstop, time_bin)
+    else:
+        bin_edges, time_bin_str = adaptive_bin_edges(l1_file, tstart, tstop, gti, binning, min_counts=min_counts, snr=snr,
+                                                     ene_band=ene_band, p0=p0, cell_width=time_bin,
+                                                     l1_data=None if l1_spectrograms is None else l1_spectrograms[0][1])
+        time_bin = float(np.min(np.diff(bin_edges)))
+    n_bins = len(bin_edges) - 1
+
+    if background is not None:
+        from .background import resolve_background
+        background = resolve_background(spec_files, gti_file, background)
+
+    if not write:
+        l1_data, spec_cube, bin_exposure, bin_rows = _accumulate_bins(l1_file, bin_edges, gti, l1_spectrograms)
+        _warn_empty_bins(bin_edges, bin_rows)
+
+        filled = bin_rows > 0
+        grouping, quality = group_spec_cube(l1_data.channel, spec_cube[filled], l1_data.filter_sdd, group,
+                                            min_counts=group_min_counts, snr=group_snr)
+        return SpectrumSet(l1_data.channel, spec_cube[filled], bin_edges[:-1][filled], bin_edges[1:][filled], bin_exposure[filled],
+                           time_bin, l1_data.filter_sdd, basename=pi_file_basename, bin_edges=bin_edges, time_bin_str=time_bin_str,
+                           meta={'l1_files': spec_files}, grouping=grouping, quality=quality, background=background)
+
+    backfile = None
+    if background is not None:
+        backfile = background.to_fits_beside(os.path.join(output_dir, pi_file_basename), clobber)
+
+    if output_format == 'typeII':
+        l1_data, spec_cube, bin_exposure, bin_rows = _accumulate_bins(l1_file, bin_edges, gti, l1_spectrograms)
+        _warn_empty_bins(bin_edges, bin_rows)
+
+        grouping, quality = group_spec_cube(l1_data.channel, spec_cube, l1_data.filter_sdd, group,
+                                            min_counts=group_min_counts, snr=group_snr)
+        return [write_multispec_typeII(l1_data.channel, spec_cube, bin_exposure, bin_rows, bin_edges, l1_data.filter_sdd,
+                                       pi_file_basename, time_bin, output_dir, clobber, time_bin_str, grouping, quality, backfile)]
+
+    if workers is None or workers <= 1 or n_bins <= 1 or l1_spectrograms is not None:
+        return _genmultispec_shard(l1_file, bin_edges, gti, pi_file_basename, output_dir, clobber, group, group_min_counts, group_snr,
+                                   backfile, l1_spectrograms)
+
+    # A few shards per worker keeps the load balanced when some bins are empty
+    n_shards = min(n_bins, 4*workers)
+    shard_bounds = np.linspace(0, n_bins, n_shards + 1).astype(int)
+
+    profile_workers = profiling_active()
+    shard_func = _profiled_genmultispec_shard if profile_workers else _genmultispec_shard
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(shard_func, l1_file, bin_edges[b0:b1+1], gti, pi_file_basename, output_dir, clobber,
+                                   group, group_min_counts, group_snr, backfile)
+                   for b0, b1 in zip(shard_bounds[:-1], shard_bounds[1:]) if b1 > b0]
+        outfiles = []
+        for future in futures:
+            shard_outfiles = future.result()
+            if profile_workers:
+                shard_outfiles, records = shard_outfiles
+                merge_records(records)
+            outfiles.extend(shard_outfiles)
+
+    return outfiles
 
 
 def solexs_genmultispec_cli():
@@ -340,10 +899,22 @@ def solexs_genmultispec_cli():
     parser.add_argument('-i','--infile', type=str, help='Path to the Level 1 PI spectrogram file (Type II)')
     parser.add_argument('-tstart', type=float, help='Start time in Unix seconds')
     parser.add_argument('-tstop', type=float, help='Stop time in Unix seconds')
-    parser.add_argument('-tbin', '--time_bin', type=float, help='Time bin size in seconds')
+    parser.add_argument('-tbin', '--time_bin', type=float, default=None, help='Time bin size in seconds (cell width for bblocks binning, not used for mincounts and snr binning)')
     parser.add_argument('-gti', '--gti_file', type=str, help='Path to the Level 1 Good Time Interval File')
     parser.add_argument('-o', '--output_dir', type=str, default='.', help='Directory to store the generated spectra')
     parser.add_argument('-c','--clobber', type=bool, default= False, help='Overwrite existing file if it exists')
+    parser.add_argument('-w','--workers', type=int, default=1, help='Number of parallel worker processes (default 1)')
+    parser.add_argument('-f','--format', type=str, choices=['typeI', 'typeII'], default='typeI', help='Write one Type I PI file per time bin (typeI, default) or all spectra in one Type II PHA file (typeII)')
+    parser.add_argument('--binning', type=str, choices=MULTISPEC_BINNINGS, default='linear', help='Time binning scheme: linear bins of time_bin seconds (default), adaptive bins with min_counts counts (mincounts), a signal to noise ratio of snr (snr) or Bayesian blocks (bblocks)')
+    parser.add_argument('--min_counts', type=float, default=None, help='Minimum counts per spectrum for mincounts binning')
+    parser.add_argument('--snr', type=float, default=None, help='Minimum signal to noise ratio per spectrum for snr binning')
+    parser.add_argument('--band', type=parse_ene_band, default=None, help='Energy band ene_low-ene_high in keV (e.g. 3-10) of the counts used for adaptive binning (default all channels)')
+    parser.add_argument('--p0', type=float, default=0.05, help='False alarm probability of a block edge for bblocks binning (default 0.05)')
+    parser.add_argument('--group', type=str, choices=GROUPING_METHODS, default=None, help='Group the channels to at least group_min_counts counts (mincounts), a signal to noise ratio of group_snr (snr) or the optimal binning of Kaastra & Bleeker 2016 (optimal) (default no grouping)')
+    parser.add_argument('--group_min_counts', type=float, default=None, help='Minimum counts per channel group for mincounts grouping (optional for optimal)')
+    parser.add_argument('--group_snr', type=float, default=None, help='Minimum signal to noise ratio per channel group for snr grouping')
+    parser.add_argument('--bkg', type=str, nargs='+', default=None, help='Background from the quiet intervals of the day (auto) or from intervals tstart-tstop in Unix seconds, written next to the spectra and named in their BACKFILE')
+    parser.add_argument('--profile', type=str, nargs='?', const='-', default=None, help='Write a JSON summary of the time, rows, bytes and peak memory of each stage to this file (stdout if no file is given)')
     # Parse arguments
     args = parser.parse_args()
 
@@ -352,19 +923,38 @@ def solexs_genmultispec_cli():
 
     print(f'Start Time: {tstart_utc_time_str}')
     print(f'Stop Time: {tstop_utc_time_str}')
-    print(f'Time Bin: {args.time_bin} seconds')
+    if args.binning == 'linear':
+        print(f'Time Bin: {args.time_bin} seconds')
+    else:
+        print(f'Binning: {args.binning}')
     print(f'Output Directory: {args.output_dir}')
 
-    try:
-        solexs_genmultispec(
-            spec_file=args.infile,
-            tstart=args.tstart,
-            tstop=args.tstop,
-            time_bin=args.time_bin,
-            gti_file=args.gti_file,
-            output_dir=args.output_dir,
-            clobber=args.clobber
-        )
-        print("Spectra generation completed successfully.")
-    except Exception as e:
-        print(f"Error: {e}")
+    with Profile() if args.profile is not None else contextlib.nullcontext() as prof:
+        try:
+            from .background import parse_background
+            solexs_genmultispec(
+                spec_file=args.infile,
+                tstart=args.tstart,
+                tstop=args.tstop,
+                time_bin=args.time_bin,
+                gti_file=args.gti_file,
+                output_dir=args.output_dir,
+                clobber=args.clobber,
+                workers=args.workers,
+                output_format=args.format,
+                binning=args.binning,
+                min_counts=args.min_counts,
+                snr=args.snr,
+                ene_band=args.band,
+                p0=args.p0,
+                group=args.group,
+                group_min_counts=args.group_min_counts,
+                group_snr=args.group_snr,
+                background=parse_background(args.bkg)
+            )
+            print("Spectra generation completed successfully.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    if args.profile is not None:
+        prof.write_json(args.profile, command='solexs-genmultispec', argv=sys.argv[1:])
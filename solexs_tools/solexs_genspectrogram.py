@@ -0,0 +1,373 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-19 12:31:05 am
+# @email: sarwade@ursc.gov.in
+# @File Name: solexs_genspectrogram.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-19 12:31:05 am
+#####################################################
+
+"""
+Dynamic spectra (time x energy count rate images) for quick looks.
+
+The channels are grouped into energy bins (uniform in energy or in log
+energy, using the CALDB energy bounds) with band_counts, one chunk of rows
+at a time, and the GTI-filtered rows are summed into time bins of the
+finest level. The coarser levels of the pyramid are sums of the finer
+bins, so all levels are made from one read of the Level 1 data. Time bins
+are aligned to multiples of the coarsest bin size in Unix time, so bins of
+different days and levels line up.
+
+The pyramid is written to a FITS file with one table per level, or to a
+directory of .npy arrays that open_spectrogram memory-maps, so that a
+dashboard can read any time range of any level without reading the rest.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from . import __caldb_version__
+from .caldb_utils import load_ebounds
+from .gti_utils import read_gti, gti_mask
+from .io_utils import iter_l1_spectrograms, l1_files_basename
+from .products import SpectrogramPyramid
+from .profiling import Profile, stage
+from .solexs_genlc import band_counts, parse_ene_band
+from .solexs_genspec import primary_header_keywords
+
+DEFAULT_LEVELS = (1, 10, 60, 600)
+ENERGY_SCALES = ('log', 'linear', 'channel')
+SPECTROGRAM_FORMATS = ('fits', 'npy')
+SPECTROGRAM_STORE_VERSION = 1
+
+
+def energy_bin_channels(e_min, e_max, ene_range=(2., 22.), n_ebins=64, scale='log'):
+    """
+    Group channels into energy bins uniform in energy ('linear') or in log
+    energy ('log') over ene_range, or keep every channel ('channel'). A
+    channel belongs to the bin that holds its centre; bins without channels
+    are left out, so the bins follow the channel boundaries.
+
+    Args:
+        e_min, e_max (np.ndarray): Energy bounds (keV) of the channels.
+        ene_range (tuple): (ene_low, ene_high) in keV.
+        n_ebins (int): Number of energy bins for 'linear' and 'log'.
+        scale (str): 'log', 'linear' or 'channel'.
+
+    Returns:
+        tuple: ch_low, ch_high ([ch_low, ch_high) of every bin), e_min and
+        e_max of the bins.
+    """
+    if scale not in ENERGY_SCALES:
+        raise ValueError(f"Unknown energy scale '{scale}', expected one of {', '.join(ENERGY_SCALES)}.")
+    if ene_range[1] <= ene_range[0] or (scale == 'log' and ene_range[0] <= 0):
+        raise ValueError(f'Invalid energy range {ene_range}.')
+
+    centre = (e_min + e_max)/2
+    channels = np.flatnonzero((centre >= ene_range[0]) & (centre < ene_range[1]))
+    if len(channels) == 0:
+        raise ValueError(f'No channels in the energy range {ene_range}.')
+
+    if scale == 'channel':
+        ch_low = channels
+        ch_high = channels + 1
+    else:
+        if n_ebins < 1:
+            raise ValueError(f'Number of energy bins must be positive, got {n_ebins}.')
+        space = np.geomspace if scale == 'log' else np.linspace
+        edges = space(ene_range[0], ene_range[1], n_ebins + 1)
+        ebin = np.searchsorted(edges, centre[channels], side='right') - 1
+        starts = np.flatnonzero(np.diff(ebin, prepend=-1))
+        ch_low = channels[starts]
+        ch_high = np.append(channels[starts[1:]], channels[-1] + 1)
+
+    return ch_low, ch_high, e_min[ch_low], e_max[ch_high - 1]
+
+
+def _sum_bins(bins, counts, exposure):
+    """
+    Sums of counts and exposure over equal values of bins, in bin order.
+    """
+    if np.any(np.diff(bins) < 0):
+        order = np.argsort(bins, kind='stable')
+        bins, counts, exposure = bins[order], counts[order], exposure[order]
+    out_bins, starts = np.unique(bins, return_index=True)
+    return out_bins, np.add.reduceat(counts, starts, axis=0), np.add.reduceat(exposure, starts)
+
+
+def solexs_genspectrogram(spec_file, gti_file=None, levels=DEFAULT_LEVELS, ene_range=(2., 22.), n_ebins=64, energy_scale='log',
+                          outfile=None, output_format='fits', clobber=True, write=True):
+    """
+    Generate a multi-resolution dynamic spectrum from Level 1 PI spectrogram
+    file(s).
+
+    Args:
+        spec_file (str or list): Path to the Level 1 PI spectrogram file
+            (Type II), or a list/glob of them (e.g. one per day).
+        gti_file (str or list, optional): Level 1 GTI file(s). Only rows in
+            the GTI are counted; all rows count without it.
+        levels (tuple): Time bin sizes in seconds, each a multiple of the
+            smallest one and a divisor of the largest one. The binned counts of the smallest one are held in
+            memory, so use coarser levels for months of data.
+        ene_range, n_ebins, energy_scale: Energy bins, see
+            energy_bin_channels.
+        outfile (str, optional): Output file (or directory) name.
+        output_format (str): 'fits' or 'npy' (see write_spectrogram).
+        clobber (bool): Overwrite an existing output.
+        write (bool): Write the pyramid. Otherwise return a
+            products.SpectrogramPyramid.
+
+    Returns:
+        str: Output file name (a products.SpectrogramPyramid if write is False).
+    """
+    if output_format not in SPECTROGRAM_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {', '.join(SPECTROGRAM_FORMATS)}.")
+
+    levels = sorted(set(float(w) for w in levels))
+    if len(levels) == 0 or levels[0] <= 0:
+        raise ValueError(f'Time bin sizes must be positive, got {levels}.')
+    factors = [int(round(w/levels[0])) for w in levels]
+    if any(abs(f*levels[0] - w) > 1e-9*w for f, w in zip(factors, levels)):
+        raise ValueError(f'Time bin sizes {levels} must be multiples of the smallest one.')
+    # So that the bins of every level are aligned to multiples of its size
+    if any(factors[-1] % f for f in factors):
+        raise ValueError(f'Time bin sizes {levels} must divide the largest one.')
+
+    gti = read_gti(gti_file) if gti_file is not None else None
+
+    filter_sdd = None
+    anchor = None
+    l1_files, file_sums = [], []
+
+    for l1_file, l1_data in iter_l1_spectrograms(spec_file):
+        if filter_sdd is None:
+            filter_sdd = l1_data.filter_sdd
+            ebounds = load_ebounds(filter_sdd, __caldb_version__)
+            ch_low, ch_high, e_min, e_max = energy_bin_channels(ebounds.e_min, ebounds.e_max, ene_range, n_ebins, energy_scale)
+        elif l1_data.filter_sdd != filter_sdd:
+            raise ValueError(f'Filter {l1_data.filter_sdd} of {l1_file} does not match filter {filter_sdd} of the other files.')
+
+        time_solexs = np.asarray(l1_data.time, dtype=np.float64)
+        if len(time_solexs) == 0:
+            continue
+        if anchor is None:
+            anchor = np.floor(np.nanmin(time_solexs)/levels[-1])*levels[-1]
+
+        l1_files.append(l1_file)
+        ebin_counts = band_counts(l1_data.counts, list(zip(ch_low, ch_high)))
+
+        with stage('bin_spectrogram', rows=len(time_solexs)):
+            rows = np.arange(len(time_solexs)) if gti is None else np.flatnonzero(gti_mask(time_solexs, gti))
+            bins = np.floor((time_solexs[rows] - anchor)/levels[0]).astype(np.int64)
+            if len(rows) > 0:
+                file_sums.append(_sum_bins(bins, ebin_counts[rows], np.asarray(l1_data.exposure, dtype=np.float64)[rows]))
+
+    if filter_sdd is None or len(file_sums) == 0:
+        raise ValueError(f'No data found in {spec_file}.')
+
+    time, exposure, rate = {}, {}, {}
+    with stage('bin_spectrogram', rows=sum(len(s[0]) for s in file_sums)):
+        # Bins spanning two files, or all bins of files overlapping in time, are repeated
+        bins, counts, bin_exposure = _sum_bins(np.concatenate([s[0] for s in file_sums]),
+                                               np.concatenate([s[1] for s in file_sums]),
+                                               np.concatenate([s[2] for s in file_sums]))
+        for time_bin, factor in zip(levels, factors):
+            level_bins, level_counts, level_exposure = _sum_bins(bins//factor, counts, bin_exposure)
+            time[time_bin] = anchor + (level_bins + 0.5)*time_bin
+            exposure[time_bin] = level_exposure
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rate[time_bin] = np.where(level_exposure[:,None] > 0, level_counts/level_exposure[:,None], np.nan).astype(np.float32)
+
+    pyramid = SpectrogramPyramid(levels, time, exposure, rate, ch_low, ch_high, e_min, e_max, filter_sdd,
+                                 basename=l1_files_basename(l1_files), meta={'l1_files': l1_files})
+
+    if not write:
+        return pyramid
+
+    return pyramid.to_fits(outfile=outfile, clobber=clobber, output_format=output_format)
+
+
+def _level_name(time_bin):
+    return f'LEVEL_{time_bin:g}S'
+
+
+def write_spectrogram(pyramid, outfile, clobber=True, output_format='fits'):
+    """
+    Write a SpectrogramPyramid.
+
+    'fits' writes one table per level (extension LEVEL_<time_bin>S with
+    TIME, EXPOSURE and a RATE vector over the energy bins, and TIMEDEL in
+    the header) and an EBINS extension with the channel and energy range of
+    every energy bin. 'npy' writes a directory with meta.json and
+    <time_bin>s.time.npy, .exposure.npy and .rate.npy of every level.
+
+    Returns:
+        str: Output file (or directory) name.
+    """
+    if output_format not in SPECTROGRAM_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {', '.join(SPECTROGRAM_FORMATS)}.")
+
+    with stage('write', rows=sum(len(pyramid.time[w]) for w in pyramid.levels)) as st:
+        if output_format == 'fits':
+            _write_spectrogram_fits(pyramid, outfile, clobber)
+            st.bytes_written = os.path.getsize(outfile)
+        else:
+            _write_spectrogram_npy(pyramid, outfile, clobber)
+            st.bytes_written = sum(os.path.getsize(os.path.join(outfile, name)) for name in os.listdir(outfile))
+
+    return outfile
+
+
+def _write_spectrogram_fits(pyramid, outfile, clobber):
+    from astropy.io import fits
+
+    n_ebins = len(pyramid.e_min)
+    hdu_list = [fits.PrimaryHDU()]
+    for k in primary_header_keywords(outfile, content='Dynamic spectrum'):
+        hdu_list[0].header.append(k)
+
+    for i_level, time_bin in enumerate(pyramid.levels):
+        hdu = fits.BinTableHDU.from_columns([
+            fits.Column(name='TIME', format='D', unit='s', array=pyramid.time[time_bin]),
+            fits.Column(name='EXPOSURE', format='D', unit='s', array=pyramid.exposure[time_bin]),
+            fits.Column(name='RATE', format=f'{n_ebins}E', unit='counts/s', array=pyramid.rate[time_bin]),
+        ])
+        hdu.name = _level_name(time_bin)
+        hdu.header['LEVEL'] = (i_level, 'Pyramid level, 0 is the finest')
+        hdu.header['TIMEDEL'] = (time_bin, 'Time bin size (s)')
+        hdu.header['NEBINS'] = (n_ebins, 'Number of energy bins')
+        hdu.header['MJDREFI'] = 40587 # MJD REF of 1970-01-01 05:30:00
+        hdu.header['MJDREFF'] = 0.22916666651
+        hdu.header['TIMESYS'] = 'UTC'
+        hdu.header['TIMEUNIT'] = 's'
+        hdu.header['FILTER'] = (pyramid.filter_sdd, 'Filter used')
+        if len(pyramid.time[time_bin]) > 0:
+            hdu.header['DATE-OBS'] = datetime.datetime.fromtimestamp(pyramid.time[time_bin][0] - time_bin/2).strftime('%Y-%m-%d %H:%M:%S')
+            hdu.header['DATE-END'] = datetime.datetime.fromtimestamp(pyramid.time[time_bin][-1] + time_bin/2).strftime('%Y-%m-%d %H:%M:%S')
+        hdu_list.append(hdu)
+
+    hdu_ebins = fits.BinTableHDU.from_columns([
+        fits.Column(name='CH_LOW', format='J', array=pyramid.ch_low),
+        fits.Column(name='CH_HIGH', format='J', array=pyramid.ch_high),
+        fits.Column(name='E_MIN', format='D', unit='keV', array=pyramid.e_min),
+        fits.Column(name='E_MAX', format='D', unit='keV', array=pyramid.e_max),
+    ])
+    hdu_ebins.name = 'EBINS'
+    hdu_list.append(hdu_ebins)
+
+    fits.HDUList(hdu_list).writeto(outfile, overwrite=clobber)
+
+
+def _write_spectrogram_npy(pyramid, outfile, clobber):
+    if os.path.exists(outfile) and not clobber:
+        raise OSError(f'{outfile} already exists.')
+
+    out_dir = os.path.dirname(os.path.abspath(outfile))
+    tmp_dir = tempfile.mkdtemp(dir=out_dir, suffix='.tmp')
+    try:
+        for time_bin in pyramid.levels:
+            for name in ('time', 'exposure', 'rate'):
+                np.save(os.path.join(tmp_dir, f'{time_bin:g}s.{name}.npy'), getattr(pyramid, name)[time_bin])
+
+        meta = {
+            'version': SPECTROGRAM_STORE_VERSION,
+            'levels': pyramid.levels,
+            'filter': pyramid.filter_sdd,
+            'basename': pyramid.basename,
+            'ch_low': [int(c) for c in pyramid.ch_low],
+            'ch_high': [int(c) for c in pyramid.ch_high],
+            'e_min': [float(e) for e in pyramid.e_min],
+            'e_max': [float(e) for e in pyramid.e_max],
+            'l1_files': pyramid.meta.get('l1_files', []),
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=1)
+
+        os.chmod(tmp_dir, 0o755)
+        if os.path.isdir(outfile):
+            shutil.rmtree(outfile)
+        elif os.path.exists(outfile):
+            os.remove(outfile)
+        os.replace(tmp_dir, outfile)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def open_spectrogram(path):
+    """
+    Open a pyramid written by write_spectrogram. The arrays of the npy
+    format are memory-mapped, those of the FITS format are read with
+    memory mapping by astropy.
+
+    Returns:
+        products.SpectrogramPyramid
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != SPECTROGRAM_STORE_VERSION:
+            raise ValueError(f'{path}: unsupported spectrogram store version {meta.get("version")}.')
+
+        levels = meta['levels']
+        arrays = {name: {w: np.load(os.path.join(path, f'{w:g}s.{name}.npy'), mmap_mode='r') for w in levels}
+                  for name in ('time', 'exposure', 'rate')}
+        return SpectrogramPyramid(levels, arrays['time'], arrays['exposure'], arrays['rate'],
+                                  np.array(meta['ch_low']), np.array(meta['ch_high']), np.array(meta['e_min']), np.array(meta['e_max']),
+                                  meta['filter'], basename=meta['basename'], meta={'l1_files': meta['l1_files']})
+
+    from astropy.io import fits
+
+    hdul = fits.open(path, memmap=True)
+    ebins = hdul['EBINS'].data
+    levels, time, exposure, rate = [], {}, {}, {}
+    for hdu in hdul[1:]:
+        if not hdu.name.startswith('LEVEL_'):
+            continue
+        time_bin = float(hdu.header['TIMEDEL'])
+        levels.append(time_bin)
+        time[time_bin] = hdu.data['TIME']
+        exposure[time_bin] = hdu.data['EXPOSURE']
+        rate[time_bin] = hdu.data['RATE']
+
+    return SpectrogramPyramid(levels, time, exposure, rate, np.array(ebins['CH_LOW']), np.array(ebins['CH_HIGH']),
+                              np.array(ebins['E_MIN']), np.array(ebins['E_MAX']), hdul[1].header.get('FILTER'),
+                              basename=os.path.basename(path).split('.')[0])
+
+
+def solexs_genspectrogram_cli():
+    parser = argparse.ArgumentParser(description='Generate a dynamic spectrum (time x energy count rate image) at several time resolutions from Level 1 PI spectrogram files (Type II).')
+
+    parser.add_argument('-i','--infile', type=str, nargs='+', help='Path to the Level 1 PI spectrogram file (Type II), or several files/globs (e.g. one per day)')
+    parser.add_argument('-gti', '--gti_file', type=str, nargs='+', default=None, help='Path to the Level 1 Good Time Interval File, or several files/globs (optional)')
+    parser.add_argument('-l', '--levels', type=float, nargs='+', default=list(DEFAULT_LEVELS), help='Time bin sizes in seconds of the pyramid levels, multiples of the smallest one that divide the largest one (default 1 10 60 600)')
+    parser.add_argument('--erange', type=parse_ene_band, default=(2., 22.), help='Energy range ene_low-ene_high in keV (default 2-22)')
+    parser.add_argument('--n_ebins', type=int, default=64, help='Number of energy bins (default 64)')
+    parser.add_argument('--escale', type=str, choices=ENERGY_SCALES, default='log', help='Energy bins uniform in log energy (log, default) or energy (linear), or one bin per channel (channel)')
+    parser.add_argument('-f', '--format', type=str, choices=SPECTROGRAM_FORMATS, default='fits', help='Write a FITS file (fits, default) or a directory of memory-mappable .npy arrays (npy)')
+    parser.add_argument('-o','--outfile', type=str, default=None, help='Output file name (optional)')
+    parser.add_argument('-c','--clobber', type=bool, default=False, help='Overwrite existing file if it exists')
+    parser.add_argument('--profile', type=str, nargs='?', const='-', default=None, help='Write a JSON summary of the time, rows, bytes and peak memory of each stage to this file (stdout if no file is given)')
+
+    args = parser.parse_args()
+
+    with Profile() if args.profile is not None else contextlib.nullcontext() as prof:
+        try:
+            outfile_name = solexs_genspectrogram(args.infile, gti_file=args.gti_file, levels=args.levels, ene_range=args.erange,
+                                                 n_ebins=args.n_ebins, energy_scale=args.escale, outfile=args.outfile,
+                                                 output_format=args.format, clobber=args.clobber)
+            print(f"Output written to {outfile_name}.")
+        except Exception as e:
+            print(f"Error: {e}")
+
+    if args.profile is not None:
+        prof.write_json(args.profile, command='solexs-genspectrogram', argv=sys.argv[1:])
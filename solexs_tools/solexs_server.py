@@ -0,0 +1,418 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 04:05:37 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: solexs_server.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 04:05:37 pm
+#####################################################
+
+"""
+Long-running local HTTP service for spectra and light curves.
+
+The service keeps recently used Level 1 spectrograms and GTIs in memory
+with LRU eviction, so repeated queries on the same day skip interpreter
+start, astropy import and file reads. The products are made from them by
+solexs_genspec, solexs_genlc_bands and solexs_genmultispec.
+
+Endpoints (GET with query parameters or POST with a JSON body):
+
+    /genspec       infile, gti, tstart, tstop [, write, outfile, clobber, group,
+                   group_min_counts, group_snr, bkg]
+    /genlc         infile, bands (e.g. 3-10) or ene_low/ene_high
+                   [, gti, time_bin, binning, min_counts, write, outfile,
+                   clobber, split_bands, bkg]
+    /genmultispec  infile, gti, tstart, tstop, time_bin
+                   [, write, output_dir, format, clobber, group,
+                   group_min_counts, group_snr, bkg]
+    /status        cache contents
+
+infile and gti may be given several times (or as JSON lists) for several
+days, bkg as auto or tstart-tstop intervals (see background.parse_background).
+With write=1 the products are written as by the command line tools, under
+the output root of the server, and the file names are returned, otherwise
+the products are returned as JSON. Existing files are only replaced with
+clobber=1.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from . import __version__
+from .gti_utils import read_gti
+from .io_utils import expand_file_list, read_l1_spectrogram
+from .solexs_genlc import parse_ene_band, solexs_genlc_bands
+from .solexs_genspec import solexs_genmultispec, solexs_genspec
+
+
+class LRUCache:
+    """
+    Thread-safe mapping that keeps the maxsize most recently used entries.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        """
+        Return the entry for key, calling loader() to create it if missing.
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+
+        # Load outside the lock so that a slow read does not block queries on
+        # other files. Concurrent misses on one key may load it twice.
+        value = loader()
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _file_key(path):
+    """
+    Cache key of a file, changing whenever the file is modified.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+class ProductServer:
+    """
+    Product generation on L1 data held in memory.
+
+    The products are made by solexs_genspec, solexs_genlc_bands and
+    solexs_genmultispec from the cached spectrograms and GTIs, and written
+    under output_root.
+
+    Args:
+        cache_size (int): Number of L1 files kept in memory.
+        output_root (str): Directory that requested output paths are
+            relative to and may not leave.
+    """
+
+    def __init__(self, cache_size=4, output_root='.'):
+        self.l1_cache = LRUCache(cache_size)
+        self.gti_cache = LRUCache(4*cache_size)
+        self.output_root = os.path.realpath(output_root)
+
+    def l1_spectrogram(self, spec_file):
+        """
+        L1Spectrogram of spec_file with TSTART, COUNTS and EXPOSURE read into
+        memory.
+        """
+        def load():
+            with read_l1_spectrogram(spec_file) as l1_data:
+                return l1_data._replace(time=np.array(l1_data.time, dtype=np.float64),
+                                        counts=np.array(l1_data.counts),
+                                        exposure=np.array(l1_data.exposure, dtype=np.float64),
+                                        header=l1_data.header.copy())
+        return self.l1_cache.get(_file_key(spec_file), load)
+
+    def l1_spectrograms(self, spec_files):
+        """
+        (file, L1Spectrogram) of several files in time order, leaving out files
+        without rows, as by io_utils.open_l1_spectrograms.
+        """
+        l1_list = [(f, self.l1_spectrogram(f)) for f in expand_file_list(spec_files)]
+        l1_list = [(f, l1_data) for f, l1_data in l1_list if len(l1_data.time) > 0]
+        if len(l1_list) == 0:
+            raise ValueError(f'No data found in {spec_files}.')
+
+        l1_list.sort(key=lambda x: x[1].time[0])
+        filter_sdd = l1_list[0][1].filter_sdd
+        for f, l1_data in l1_list:
+            if l1_data.filter_sdd != filter_sdd:
+                raise ValueError(f'Filter {l1_data.filter_sdd} of {f} does not match filter {filter_sdd} of the other files.')
+        return l1_list
+
+    def gti(self, gti_files):
+        gti_files = expand_file_list(gti_files)
+        key = tuple(_file_key(f) for f in gti_files)
+        return self.gti_cache.get(key, lambda: read_gti(gti_files))
+
+    def output_path(self, path):
+        """
+        path, relative to the output root or absolute, as an absolute path.
+        Paths outside the output root raise ValueError.
+        """
+        full_path = os.path.realpath(os.path.join(self.output_root, path))
+        if os.path.commonpath([self.output_root, full_path]) != self.output_root:
+            raise ValueError(f"Output path '{path}' is outside the output directory.")
+        return full_path
+
+    def genspec(self, infile, gti, tstart, tstop, write=False, outfile=None, clobber=False, group=None, group_min_counts=None,
+                group_snr=None, background=None):
+        """
+        Type I spectrum for [tstart, tstop) from solexs_genspec.
+        """
+        l1_list = self.l1_spectrograms(infile)
+        spectrum = solexs_genspec([f for f, _ in l1_list], tstart, tstop, gti, write=False, group=group, group_min_counts=group_min_counts,
+                                  group_snr=group_snr, background=background, l1_spectrograms=l1_list, gti=self.gti(gti))
+
+        if write:
+            outfile = self.output_path(spectrum.default_outfile() if outfile is None else outfile)
+            return {'outfile': spectrum.to_fits(outfile, clobber)}
+
+        result = {'tstart': spectrum.tstart, 'tstop': spectrum.tstop, 'exposure': spectrum.exposure, 'filter': spectrum.filter_sdd,
+                  'channel': spectrum.channel, 'counts': spectrum.counts, 'stat_err': spectrum.stat_err}
+        if group is not None:
+            result.update(grouping=spectrum.grouping, quality=spectrum.quality)
+        if spectrum.background is not None:
+            result.update(background_counts=spectrum.background.counts, background_exposure=spectrum.background.exposure)
+        return result
+
+    def genlc(self, infile, bands, gti=None, time_bin=None, binning='linear', min_counts=None,
+              write=False, outfile=None, clobber=False, split_bands=False, background=None):
+        """
+        Light curves for several energy bands from solexs_genlc_bands.
+        """
+        l1_list = self.l1_spectrograms(infile)
+        lc = solexs_genlc_bands([f for f, _ in l1_list], bands, time_bin=time_bin, binning=binning, min_counts=min_counts,
+                                gti_file=gti, write=False, background=background, l1_spectrograms=l1_list,
+                                gti=None if gti is None else self.gti(gti))
+
+        if write:
+            if outfile is None:
+                # Default names as by solexs_genlc_bands, in the output root
+                lc.basename = os.path.join(self.output_root, lc.basename)
+            else:
+                outfile = self.output_path(outfile)
+            return {'outfile': lc.to_fits(outfile, clobber, split_bands)}
+
+        result = {'filter': lc.filter_sdd, 'bands': [b[2:] for b in lc.band_channels], 'time_bin': lc.time_bin,
+                  'time': lc.time, 'counts': lc.counts, 'error': lc.error, 'fracexp': lc.fracexp, 'timedel': lc.timedel}
+        if lc.rate is not None:
+            result.update(rate=lc.rate, rate_err=lc.rate_err, backv=lc.backv, backe=lc.backe)
+        return result
+
+    def genmultispec(self, infile, gti, tstart, tstop, time_bin, write=False, output_dir='.', output_format='typeI', clobber=False,
+                     group=None, group_min_counts=None, group_snr=None, background=None):
+        """
+        Spectra in time bins of time_bin seconds from solexs_genmultispec.
+        """
+        l1_list = self.l1_spectrograms(infile)
+        spec_set = solexs_genmultispec([f for f, _ in l1_list], tstart, tstop, time_bin, gti, output_format=output_format,
+                                       write=False, group=group, group_min_counts=group_min_counts, group_snr=group_snr,
+                                       background=background, l1_spectrograms=l1_list, gti=self.gti(gti))
+
+        if write:
+            return {'outfile': spec_set.to_fits(self.output_path(output_dir), output_format, clobber)}
+
+        result = {'filter': spec_set.filter_sdd, 'channel': spec_set.channel, 'tstart': spec_set.tstart,
+                  'tstop': spec_set.tstop, 'exposure': spec_set.exposure, 'counts': spec_set.counts}
+        if group is not None:
+            result.update(grouping=spec_set.grouping, quality=spec_set.quality)
+        if spec_set.background is not None:
+            result.update(background_counts=spec_set.background.counts, background_exposure=spec_set.background.exposure)
+        return result
+
+    def status(self):
+        return {'version': __version__,
+                'l1_files': [k[0] for k in self.l1_cache.keys()],
+                'cache': {name: {'entries': len(c.keys()), 'maxsize': c.maxsize, 'hits': c.hits, 'misses': c.misses}
+                          for name, c in (('l1', self.l1_cache), ('gti', self.gti_cache))}}
+
+
+def _to_json(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'{type(obj).__name__} is not JSON serializable')
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def _parse_background(values):
+    """
+    bkg parameter: auto or tstart-tstop strings, or (tstart, tstop) pairs in
+    a JSON body.
+    """
+    if values is None or all(isinstance(v, str) for v in values):
+        from .background import parse_background
+        return parse_background(values)
+    return [tuple(float(t) for t in v) for v in values]
+
+
+def _parse_params(endpoint, params):
+    """
+    Convert request parameters (query strings or JSON values) into keyword
+    arguments of the ProductServer method for endpoint.
+    """
+    def get(name, convert=None, default=None, required=False, multiple=False):
+        if name not in params:
+            if required:
+                raise ValueError(f"Missing parameter '{name}'.")
+            return default
+        value = params[name]
+        if multiple:
+            values = value if isinstance(value, list) else [value]
+            return [convert(v) if convert else v for v in values]
+        if isinstance(value, list):
+            value = value[-1]
+        return convert(value) if convert else value
+
+    kwargs = {}
+    if endpoint in ('genspec', 'genmultispec'):
+        kwargs['infile'] = get('infile', required=True, multiple=True)
+        kwargs['gti'] = get('gti', required=True, multiple=True)
+        kwargs['tstart'] = get('tstart', float, required=True)
+        kwargs['tstop'] = get('tstop', float, required=True)
+        kwargs['group'] = get('group')
+        kwargs['group_min_counts'] = get('group_min_counts', float)
+        kwargs['group_snr'] = get('group_snr', float)
+    if endpoint == 'genspec':
+        kwargs['outfile'] = get('outfile')
+    if endpoint == 'genmultispec':
+        kwargs['time_bin'] = get('time_bin', float, required=True)
+        kwargs['output_dir'] = get('output_dir', default='.')
+        kwargs['output_format'] = get('format', default='typeI')
+    if endpoint == 'genlc':
+        kwargs['infile'] = get('infile', required=True, multiple=True)
+        bands = get('bands', multiple=True)
+        if bands is None:
+            bands = [(get('ene_low', float, required=True), get('ene_high', float, required=True))]
+        kwargs['bands'] = [parse_ene_band(b) if isinstance(b, str) else tuple(b) for b in bands]
+        kwargs['gti'] = get('gti', multiple=True)
+        kwargs['time_bin'] = get('time_bin', float)
+        kwargs['binning'] = get('binning', default='linear')
+        kwargs['min_counts'] = get('min_counts', float)
+        kwargs['outfile'] = get('outfile')
+        kwargs['split_bands'] = get('split_bands', _parse_bool, default=False)
+    if endpoint in ('genspec', 'genlc', 'genmultispec'):
+        kwargs['background'] = _parse_background(get('bkg', multiple=True))
+    kwargs['write'] = get('write', _parse_bool, default=False)
+    kwargs['clobber'] = get('clobber', _parse_bool, default=False)
+    return kwargs
+
+
+class ProductRequestHandler(BaseHTTPRequestHandler):
+    server_version = f'solexs_tools/{__version__}'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self._handle(url.path, parse_qs(url.query))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            self._reply(400, {'error': f'Invalid JSON body: {e}'})
+            return
+        self._handle(url.path, params)
+
+    def _handle(self, path, params):
+        endpoint = path.strip('/')
+        product_server = self.server.product_server
+        t0 = time.perf_counter()
+        try:
+            if endpoint == 'status':
+                result = product_server.status()
+            elif endpoint in ('genspec', 'genlc', 'genmultispec'):
+                result = getattr(product_server, endpoint)(**_parse_params(endpoint, params))
+            else:
+                self._reply(404, {'error': f"Unknown endpoint '{path}'."})
+                return
+        except (ValueError, TypeError, OSError, KeyError) as e:
+            self._reply(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self.log_error('Error in %s: %s: %s', path, type(e).__name__, e)
+            traceback.print_exc()
+            self._reply(500, {'error': f'{type(e).__name__}: {e}'})
+            return
+        result['elapsed_ms'] = (time.perf_counter() - t0)*1e3
+        self._reply(200, result)
+
+    def _reply(self, code, result):
+        body = json.dumps(result, default=_to_json).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def log_error(self, format, *args):
+        # Errors are logged also with quiet
+        super().log_message(format, *args)
+
+
+def make_server(host='127.0.0.1', port=8765, cache_size=4, quiet=False, output_root='.'):
+    """
+    HTTP server answering product requests from a shared ProductServer,
+    writing products under output_root.
+    """
+    httpd = ThreadingHTTPServer((host, port), ProductRequestHandler)
+    httpd.product_server = ProductServer(cache_size, output_root)
+    httpd.quiet = quiet
+    return httpd
+
+
+def solexs_server_cli():
+    parser = argparse.ArgumentParser(description='Run a local HTTP service generating spectra and light curves from Level 1 files kept in memory.')
+
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default 127.0.0.1)')
+    parser.add_argument('-p', '--port', type=int, default=8765, help='Port to listen on (default 8765)')
+    parser.add_argument('--cache_size', type=int, default=4, help='Number of L1 files kept in memory (default 4)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Do not log requests')
+    parser.add_argument('--preload', type=str, nargs='+', help='L1 files/globs to load at start-up', default=None)
+    parser.add_argument('--output_root', type=str, default='.', help='Directory under which products are written; output paths of requests are relative to it and may not leave it (default: current directory)')
+
+    args = parser.parse_args()
+
+    httpd = make_server(args.host, args.port, args.cache_size, args.quiet, args.output_root)
+
+    # Import astropy now rather than on the first request
+    import astropy.io.fits
+    if args.preload is not None:
+        for spec_file in expand_file_list(args.preload):
+            httpd.product_server.l1_spectrogram(spec_file)
+
+    print(f'solexs_tools {__version__} serving on http://{args.host}:{args.port}')
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
@@ -0,0 +1,351 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 11:02:51 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: spectral_fit.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 11:02:51 pm
+#####################################################
+
+"""
+Forward folding and quick-look isothermal fits of many spectra at once.
+
+The CALDB ARF and RMF are combined once into a dense (n_energy, n_channel)
+response matrix (load_response), so folding model photon spectra of any
+number of time bins is a single matrix product. If the CALDB has no RMF,
+every energy bin of the ARF is put in the channel that contains it.
+
+fit_isothermal fits the free-free continuum of an isothermal plasma to
+every spectrum with the Cash statistic. The folded model is computed once
+for a grid of temperatures; for a given temperature the best emission
+measure has a closed form, so the statistic of all spectra on the whole
+grid is one matrix product. The minimum is refined by a parabola in
+log(kT), whose curvature gives the 1 sigma (delta C = 1) error on kT.
+
+The model has no lines, so it is meant for temperature and emission
+measure time series at high cadence, not as a replacement for a full fit
+in XSPEC or Sherpa.
+"""
+
+import argparse
+import functools
+import warnings
+from collections import namedtuple
+
+import numpy as np
+
+from . import __caldb_version__
+from .caldb_utils import load_arf, load_ebounds, load_rmf
+from .profiling import stage
+from .solexs_genlc import parse_ene_band
+from .solexs_genspec import QUALITY_THRESHOLD_CHANNEL, MULTISPEC_BINNINGS, primary_header_keywords, solexs_genmultispec
+
+KEV_TO_MK = 11.604518 # temperature in MK of kT = 1 keV
+EM_SCALE = 1e46 # emission measure unit of the model grid in cm-3
+DEFAULT_KT_GRID = np.geomspace(0.08, 5., 256) # keV, about 0.9 to 58 MK
+
+IsothermalFit = namedtuple('IsothermalFit', ['kt', 'kt_err', 'em', 'em_err', 'cstat', 'dof', 'counts'])
+IsothermalFit.__doc__ = """
+Isothermal fits of n_spec spectra: kt and kt_err in keV, em and em_err in
+cm-3, the Cash statistic (cstat) at the best fit with its degrees of
+freedom (dof) and the counts in the fitted channels. Arrays of length
+n_spec, with NaN for spectra without counts.
+"""
+
+
+class Response:
+    """
+    Response matrix (ARF times RMF) of one filter.
+
+    Attributes:
+        energ_lo, energ_hi (np.ndarray): Photon energy grid in keV.
+        matrix (np.ndarray): (n_energy, n_channel) effective area in cm2.
+        channel, e_min, e_max (np.ndarray): Channels and their energy bounds.
+        diagonal (bool): True if made without an RMF.
+    """
+
+    def __init__(self, energ_lo, energ_hi, matrix, channel, e_min, e_max, diagonal=False):
+        self.energ_lo = energ_lo
+        self.energ_hi = energ_hi
+        self.matrix = matrix
+        self.channel = channel
+        self.e_min = e_min
+        self.e_max = e_max
+        self.diagonal = diagonal
+
+    @property
+    def energy(self):
+        return (self.energ_lo + self.energ_hi)/2
+
+    def fold(self, photon_flux):
+        """
+        Count rate per channel of photon spectra.
+
+        Args:
+            photon_flux (np.ndarray): (..., n_energy) photon flux integrated
+                over each energy bin in photons/cm2/s.
+
+        Returns:
+            np.ndarray: (..., n_channel) counts/s.
+        """
+        return np.asarray(photon_flux, dtype=np.float64) @ self.matrix
+
+    def __repr__(self):
+        kind = 'diagonal' if self.diagonal else 'RMF'
+        return f'Response({len(self.energ_lo)} energies, {len(self.channel)} channels, {kind})'
+
+
+@functools.lru_cache(maxsize=8)
+def load_response(filter_sdd, caldb_version=__caldb_version__):
+    """
+    Response of a filter from the CALDB ARF and RMF (cached). Without an RMF
+    the response is diagonal, with a warning.
+
+    Returns:
+        Response
+    """
+    arf = load_arf(filter_sdd, caldb_version)
+
+    try:
+        rmf = load_rmf(filter_sdd, caldb_version)
+    except FileNotFoundError:
+        rmf = None
+
+    if rmf is None:
+        warnings.warn(f'No RMF found in the CALDB for {filter_sdd}, using a diagonal response.', UserWarning)
+        ebounds = load_ebounds(filter_sdd, caldb_version)
+        energy = (arf.energ_lo + arf.energ_hi)/2
+        channel = np.searchsorted(ebounds.e_min, energy, side='right') - 1
+        inside = (channel >= 0) & (energy < ebounds.e_max[np.clip(channel, 0, None)])
+        matrix = np.zeros((len(energy), len(ebounds.channel)))
+        matrix[np.flatnonzero(inside), channel[inside]] = arf.specresp[inside]
+        return Response(arf.energ_lo, arf.energ_hi, matrix, ebounds.channel, ebounds.e_min, ebounds.e_max, diagonal=True)
+
+    specresp = arf.specresp
+    if len(arf.energ_lo) != len(rmf.energ_lo) or not np.allclose(arf.energ_lo, rmf.energ_lo):
+        specresp = np.interp((rmf.energ_lo + rmf.energ_hi)/2, (arf.energ_lo + arf.energ_hi)/2, arf.specresp, left=0., right=0.)
+
+    matrix = specresp[:,None] * np.asarray(rmf.matrix, dtype=np.float64)
+    return Response(rmf.energ_lo, rmf.energ_hi, matrix, rmf.channel, rmf.e_min, rmf.e_max)
+
+
+def bremsstrahlung_flux(energ_lo, energ_hi, kt, em=EM_SCALE):
+    """
+    Free-free photon flux at 1 AU of isothermal plasmas,
+
+        F(E) = 8.1e-39 * g * EM * exp(-E/kT) / (E * sqrt(kT))  photons/cm2/s/keV
+
+    with EM in cm-3, E and kT in keV, and the Gaunt factor approximated as
+    g = (kT/E)**0.4, evaluated at the centre of every energy bin.
+
+    Args:
+        energ_lo, energ_hi (np.ndarray): Energy grid in keV.
+        kt (float or np.ndarray): Temperatures in keV.
+        em (float or np.ndarray): Emission measures in cm-3.
+
+    Returns:
+        np.ndarray: (n_kt, n_energy) photon flux in each bin in photons/cm2/s.
+    """
+    energy = (energ_lo + energ_hi)/2
+    kt = np.atleast_1d(np.asarray(kt, dtype=np.float64))[:,None]
+    em = np.atleast_1d(np.asarray(em, dtype=np.float64))[:,None]
+    gaunt = (kt/energy)**0.4
+    return 8.1e-39 * gaunt * em * np.exp(-energy/kt) / (energy*np.sqrt(kt)) * (energ_hi - energ_lo)
+
+
+def fit_channels(response, ene_range=None):
+    """
+    Channels used in fits: channels with good quality (above
+    QUALITY_THRESHOLD_CHANNEL, as flagged in the written spectra) within
+    ene_range (ene_low, ene_high) in keV if given.
+    """
+    good = response.channel > QUALITY_THRESHOLD_CHANNEL
+    if ene_range is not None:
+        good &= (response.e_min >= ene_range[0]) & (response.e_max <= ene_range[1])
+    return np.flatnonzero(good)
+
+
+def fit_isothermal(counts, exposure, filter_sdd, kt_grid=None, ene_range=None, response=None, chunk_spectra=8192):
+    """
+    Cash-statistic fits of an isothermal bremsstrahlung model to many spectra.
+
+    Args:
+        counts (np.ndarray): (n_spec, n_channel) or (n_channel,) counts.
+        exposure (np.ndarray or float): Exposure of each spectrum in seconds.
+        filter_sdd (str): Filter of the spectra, for the CALDB response.
+        kt_grid (np.ndarray, optional): Increasing temperatures in keV,
+            equally spaced in log, on which the statistic is computed
+            (default DEFAULT_KT_GRID).
+        ene_range (tuple, optional): (ene_low, ene_high) in keV of the
+            channels to fit (see fit_channels).
+        response (Response, optional): Response to use instead of the CALDB.
+        chunk_spectra (int): Spectra fitted together, to bound memory.
+
+    Returns:
+        IsothermalFit
+    """
+    if response is None:
+        response = load_response(filter_sdd)
+    kt_grid = DEFAULT_KT_GRID if kt_grid is None else np.asarray(kt_grid, dtype=np.float64)
+    if len(kt_grid) < 3 or np.any(np.diff(kt_grid) <= 0):
+        raise ValueError('The temperature grid needs at least 3 increasing values.')
+
+    counts = np.atleast_2d(np.asarray(counts, dtype=np.float64))
+    exposure = np.broadcast_to(np.asarray(exposure, dtype=np.float64), (len(counts),))
+    channels = fit_channels(response, ene_range)
+    if len(channels) < 3:
+        raise ValueError('Fewer than 3 channels to fit.')
+
+    with stage('fold', rows=len(kt_grid)):
+        model_rate = response.fold(bremsstrahlung_flux(response.energ_lo, response.energ_hi, kt_grid))
+        # Channels that no temperature of the grid reaches have no model counts
+        channels = channels[np.any(model_rate[:,channels] > 0, axis=0)]
+        model_rate = model_rate[:,channels]
+        log_model = np.log(np.maximum(model_rate, np.finfo(np.float64).tiny))
+        log_total = np.log(np.sum(model_rate, axis=1))
+
+    n_spec = len(counts)
+    result = {name: np.full(n_spec, np.nan) for name in ('kt', 'kt_err', 'em', 'em_err', 'cstat', 'counts')}
+    log_kt = np.log(kt_grid)
+
+    with stage('fit', rows=n_spec, bytes_read=counts.nbytes):
+        for i0 in range(0, n_spec, chunk_spectra):
+            i1 = min(i0 + chunk_spectra, n_spec)
+            data = counts[i0:i1, channels]
+            n_counts = np.sum(data, axis=1)
+            data_log_data = np.sum(data*np.log(np.where(data > 0, data, 1.)), axis=1)
+
+            # Cash statistic 2*sum(m - d + d*log(d/m)) with the best emission
+            # measure at every temperature, where sum(m) = sum(d)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                log_n = np.log(n_counts)[:,None]
+                cstat = 2*(data_log_data[:,None] - n_counts[:,None]*(log_n - log_total[None,:]) - data @ log_model.T)
+
+            i_best = np.argmin(cstat, axis=1)
+            i_mid = np.clip(i_best, 1, len(kt_grid) - 2)
+            rows = np.arange(i1 - i0)
+            c0, c1, c2 = cstat[rows, i_mid - 1], cstat[rows, i_mid], cstat[rows, i_mid + 1]
+            step = log_kt[1] - log_kt[0]
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                curvature = (c0 - 2*c1 + c2)/step**2
+                offset = np.where(curvature > 0, -step*(c2 - c0)/(2*curvature*step**2), 0.)
+                offset = np.clip(offset, -step, step)
+                on_edge = i_best != i_mid
+                offset[on_edge] = 0.
+
+                best_log_kt = log_kt[i_mid] + offset
+                best_log_kt[on_edge] = log_kt[i_best[on_edge]]
+                kt = np.exp(best_log_kt)
+                kt_err = np.where(on_edge | (curvature <= 0), np.nan, kt*np.sqrt(2/curvature))
+
+                em = EM_SCALE*n_counts/(exposure[i0:i1]*np.exp(np.interp(best_log_kt, log_kt, log_total)))
+                valid = n_counts > 0
+                result['kt'][i0:i1] = np.where(valid, kt, np.nan)
+                result['kt_err'][i0:i1] = np.where(valid, kt_err, np.nan)
+                result['em'][i0:i1] = np.where(valid, em, np.nan)
+                result['em_err'][i0:i1] = np.where(valid, em/np.sqrt(n_counts), np.nan)
+                result['cstat'][i0:i1] = np.where(valid, np.where(on_edge, cstat[rows, i_best], c1 - curvature*offset**2/2), np.nan)
+                result['counts'][i0:i1] = n_counts
+
+    return IsothermalFit(dof=len(channels) - 2, **result)
+
+
+def fit_spectrum_set(spec_set, kt_grid=None, ene_range=None):
+    """
+    fit_isothermal of all spectra of a products.SpectrumSet (or Spectrum).
+    """
+    return fit_isothermal(spec_set.counts, spec_set.exposure, spec_set.filter_sdd, kt_grid=kt_grid, ene_range=ene_range)
+
+
+def write_fit_results(fit, tstart, tstop, exposure, filter_sdd, outfile, clobber=True):
+    """
+    Write isothermal fit results as a FITS table (one row per spectrum).
+
+    Returns:
+        str: Output file name.
+    """
+    from astropy.io import fits
+
+    outfile = outfile if outfile.endswith('.fits') else f'{outfile}.fits'
+
+    columns = [
+        fits.Column(name='TSTART', format='D', unit='s', array=tstart),
+        fits.Column(name='TSTOP', format='D', unit='s', array=tstop),
+        fits.Column(name='EXPOSURE', format='D', unit='s', array=exposure),
+        fits.Column(name='KT', format='D', unit='keV', array=fit.kt),
+        fits.Column(name='KT_ERR', format='D', unit='keV', array=fit.kt_err),
+        fits.Column(name='T', format='D', unit='MK', array=fit.kt*KEV_TO_MK),
+        fits.Column(name='EM', format='D', unit='cm-3', array=fit.em),
+        fits.Column(name='EM_ERR', format='D', unit='cm-3', array=fit.em_err),
+        fits.Column(name='CSTAT', format='D', array=fit.cstat),
+        fits.Column(name='COUNTS', format='D', array=fit.counts),
+    ]
+    hdu = fits.BinTableHDU.from_columns(columns)
+    hdu.name = 'ISOTHERMAL'
+    hdu.header.set('FILTER', filter_sdd, 'Filter used')
+    hdu.header.set('MODEL', 'bremsstrahlung', 'Isothermal free-free continuum')
+    hdu.header.set('STAT', 'cstat', 'Fit statistic')
+    hdu.header.set('DOF', fit.dof, 'Degrees of freedom of each fit')
+    hdu.header.set('TIMESYS', 'UTC')
+
+    primary_hdu = fits.PrimaryHDU()
+    for k in primary_header_keywords(outfile, content='Isothermal fit results'):
+        primary_hdu.header.append(k)
+
+    fits.HDUList([primary_hdu, hdu]).writeto(outfile, overwrite=clobber)
+    return outfile
+
+
+def solexs_fitspec(spec_file, tstart, tstop, time_bin, gti_file, outfile=None, clobber=True, ene_range=None,
+                   binning='linear', min_counts=None, snr=None, ene_band=None, p0=0.05):
+    """
+    Temperature and emission measure time series: the spectra of
+    solexs_genmultispec (with write=False) fitted with fit_isothermal.
+    binning, min_counts, snr, ene_band and p0 are passed to
+    solexs_genmultispec.
+
+    Returns:
+        str: Output file name.
+    """
+    spec_set = solexs_genmultispec(spec_file, tstart, tstop, time_bin, gti_file, write=False,
+                                   binning=binning, min_counts=min_counts, snr=snr, ene_band=ene_band, p0=p0)
+    if len(spec_set) == 0:
+        raise ValueError(f'No valid data found for the specified time range ({tstart} to {tstop}).')
+
+    fit = fit_spectrum_set(spec_set, ene_range=ene_range)
+
+    if outfile is None:
+        time_bin_str = spec_set.time_bin_str or f'{time_bin:g}sec'
+        outfile = f'{spec_set.basename}_{int(tstart)}_{int(tstop)}_{time_bin_str}_isothermal'
+    outfile = write_fit_results(fit, spec_set.tstart, spec_set.tstop, spec_set.exposure, spec_set.filter_sdd, outfile, clobber)
+    print(f'Fitted {len(spec_set)} spectra: {outfile}')
+    return outfile
+
+
+def solexs_fitspec_cli():
+    parser = argparse.ArgumentParser(description='Fit an isothermal model to the spectra of a Level 1 PI spectrogram file (Type II) in time bins and write the temperature and emission measure time series.')
+
+    parser.add_argument('-i','--infile', type=str, help='Path to the Level 1 PI spectrogram file (Type II)')
+    parser.add_argument('-tstart', type=float, help='Start time in Unix seconds')
+    parser.add_argument('-tstop', type=float, help='Stop time in Unix seconds')
+    parser.add_argument('-tbin', '--time_bin', type=float, default=None, help='Time bin size in seconds')
+    parser.add_argument('-gti', '--gti_file', type=str, help='Path to the Level 1 Good Time Interval File')
+    parser.add_argument('-o', '--outfile', type=str, default=None, help='Output file name')
+    parser.add_argument('-c','--clobber', type=bool, default=False, help='Overwrite existing file if it exists')
+    parser.add_argument('--erange', type=parse_ene_band, default=None, help='Energy range ene_low-ene_high in keV (e.g. 3-10) of the fitted channels (default all channels with good quality)')
+    parser.add_argument('--binning', type=str, choices=MULTISPEC_BINNINGS, default='linear', help='Time binning scheme, as for solexs-genmultispec (default linear)')
+    parser.add_argument('--min_counts', type=float, default=None, help='Minimum counts per spectrum for mincounts binning')
+    parser.add_argument('--snr', type=float, default=None, help='Minimum signal to noise ratio per spectrum for snr binning')
+    parser.add_argument('--band', type=parse_ene_band, default=None, help='Energy band ene_low-ene_high in keV (e.g. 3-10) of the counts used for adaptive binning (default all channels)')
+    parser.add_argument('--p0', type=float, default=0.05, help='False alarm probability of a block edge for bblocks binning (default 0.05)')
+
+    args = parser.parse_args()
+
+    try:
+        solexs_fitspec(args.infile, args.tstart, args.tstop, args.time_bin, args.gti_file, outfile=args.outfile, clobber=args.clobber,
+                       ene_range=args.erange, binning=args.binning, min_counts=args.min_counts, snr=args.snr,
+                       ene_band=args.band, p0=args.p0)
+    except Exception as e:
+        print(f"Error: {e}")
@@ -0,0 +1,187 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-18 05:12:08 pm
+# @email: sarwade@ursc.gov.in
+# @File Name: time_index.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-18 05:12:08 pm
+#####################################################
+
+"""
+Prefix-sum time index of a Level 1 spectrogram.
+
+The index holds cumulative sums along time of the GTI-masked COUNTS, of the
+GTI-masked exposure and of the number of good rows, so that the spectrum of
+any time window is cum_counts[j] - cum_counts[i] where i and j are the first
+rows at or after the window start and stop.
+
+It is stored next to the L1 file (see io_utils.cache_path) as two sidecar
+files: {name}.{gti_hash}.tidx.npy with the cumulative counts, which is
+memory-mapped when loaded, and {name}.{gti_hash}.tidx.npz with the row times,
+cumulative exposure and cumulative rows. gti_hash identifies the set of GTI
+files, and the index is rebuilt when the size or modification time of the L1
+file or of a GTI file differs from the ones stored in the sidecar.
+
+Cumulative counts are stored as uint32 and wrap around. Differences are taken
+in uint32 as well, which gives the exact counts of a window as long as a
+single channel collects fewer than 2**32 counts within it.
+"""
+
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+
+from .gti_utils import read_gti, gti_mask
+from .io_utils import cache_path, expand_file_list, read_l1_spectrogram, source_stats
+from .profiling import stage
+
+TimeIndex = namedtuple('TimeIndex', ['time', 'cum_counts', 'cum_exposure', 'cum_rows'])
+TimeIndex.__doc__ = """
+Prefix sums of a Level 1 spectrogram: row times (n_rows,) and cumulative
+counts (n_rows + 1, n_ch), exposure and good rows (n_rows + 1,).
+"""
+
+
+def time_index_files(spec_file, gti_file):
+    """
+    Paths of the .tidx.npy and .tidx.npz sidecar files of spec_file for the
+    given GTI file(s).
+    """
+    gti_files = [os.path.abspath(f) for f in expand_file_list(gti_file)]
+    gti_hash = hashlib.sha1('\n'.join(gti_files).encode()).hexdigest()[:12]
+
+    name = os.path.basename(spec_file)
+    if name.endswith('.gz'):
+        name = name[:-3]
+    name = f'{name}.{gti_hash}.tidx'
+
+    return cache_path(spec_file, name + '.npy'), cache_path(spec_file, name + '.npz')
+
+
+def _save_atomic(path, save, src_file):
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        save(tmp_file)
+        os.chmod(tmp_file, os.stat(src_file).st_mode & 0o777)
+        os.replace(tmp_file, path)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+def build_time_index(spec_file, gti_file, chunk_rows=8192):
+    """
+    Build and save the time index of spec_file for the given GTI file(s).
+
+    Returns:
+        TimeIndex: The index, or None if the rows of spec_file are not in time
+        order (the index needs sorted rows).
+    """
+    with stage('build_time_index') as st:
+        return _build_time_index(spec_file, gti_file, chunk_rows, st)
+
+
+def _build_time_index(spec_file, gti_file, chunk_rows, st):
+    stats = source_stats(spec_file, *expand_file_list(gti_file))
+    l1_data = read_l1_spectrogram(spec_file)
+    time_solexs = np.asarray(l1_data.time, dtype=np.float64)
+    if np.any(np.diff(time_solexs) < 0):
+        return None
+
+    counts = l1_data.counts
+    mask = gti_mask(time_solexs, read_gti(gti_file))
+    n_rows, n_ch = counts.shape
+    st.rows = n_rows
+    st.bytes_read = counts.nbytes
+
+    cum_exposure = np.zeros(n_rows + 1)
+    np.cumsum(np.asarray(l1_data.exposure, dtype=np.float64)*mask, out=cum_exposure[1:])
+    cum_rows = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(mask, out=cum_rows[1:])
+
+    npy_file, npz_file = time_index_files(spec_file, gti_file)
+
+    def save_cum_counts(tmp_file):
+        cum_counts = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.uint32, shape=(n_rows + 1, n_ch))
+        cum_counts[0] = 0
+        for row_start in range(0, n_rows, chunk_rows):
+            row_stop = min(row_start + chunk_rows, n_rows)
+            chunk = counts[row_start:row_stop].astype(np.uint32)*mask[row_start:row_stop, None]
+            np.cumsum(chunk, axis=0, dtype=np.uint32, out=cum_counts[row_start + 1:row_stop + 1])
+            cum_counts[row_start + 1:row_stop + 1] += cum_counts[row_start]
+        cum_counts.flush()
+        del cum_counts
+
+    def save_sums(tmp_file):
+        # Saved through a file object as np.savez appends .npz to other names
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, time=time_solexs, cum_exposure=cum_exposure, cum_rows=cum_rows, source_stats=stats)
+
+    _save_atomic(npy_file, save_cum_counts, spec_file)
+    _save_atomic(npz_file, save_sums, spec_file)
+    st.bytes_written = os.path.getsize(npy_file) + os.path.getsize(npz_file)
+
+    return TimeIndex(time_solexs, np.load(npy_file, mmap_mode='r'), cum_exposure, cum_rows)
+
+
+def load_time_index(spec_file, gti_file, build=True):
+    """
+    Time index of spec_file for the given GTI file(s), built on first use and
+    rebuilt when the L1 file or a GTI file changes.
+
+    Returns:
+        TimeIndex: The index, or None if there is none and build is False or
+        the L1 rows are not in time order.
+    """
+    npy_file, npz_file = time_index_files(spec_file, gti_file)
+
+    try:
+        with np.load(npz_file) as index_data:
+            # Sizes and mtimes of the L1 and GTI files the index was built from
+            fresh = np.array_equal(index_data['source_stats'], source_stats(spec_file, *expand_file_list(gti_file)))
+            time_solexs = index_data['time']
+            cum_exposure = index_data['cum_exposure']
+            cum_rows = index_data['cum_rows']
+        if fresh:
+            cum_counts = np.load(npy_file, mmap_mode='r')
+            if len(cum_counts) == len(time_solexs) + 1:
+                return TimeIndex(time_solexs, cum_counts, cum_exposure, cum_rows)
+    except (OSError, ValueError, KeyError):
+        pass # no sidecar or an unreadable one, (re)build it
+
+    if not build:
+        return None
+    return build_time_index(spec_file, gti_file)
+
+
+def window_spectra(time_index, tstart, tstop):
+    """
+    Spectra of the rows with tstart <= TSTART < tstop for one or many windows.
+
+    Args:
+        time_index (TimeIndex): Index from load_time_index.
+        tstart (float or array_like): Window start times.
+        tstop (float or array_like): Window stop times.
+
+    Returns:
+        tuple: Counts (n_ch,) or (n_windows, n_ch), good exposure and number
+        of good rows of each window.
+    """
+    with stage('sum_rows') as st:
+        i = np.searchsorted(time_index.time, tstart, side='left')
+        j = np.maximum(np.searchsorted(time_index.time, tstop, side='left'), i)
+
+        spectra = (time_index.cum_counts[j] - time_index.cum_counts[i]).astype(np.int64)
+        exposure = time_index.cum_exposure[j] - time_index.cum_exposure[i]
+        n_rows = time_index.cum_rows[j] - time_index.cum_rows[i]
+
+        st.rows = int(np.sum(n_rows))
+        st.bytes_read = 2*spectra.size*time_index.cum_counts.itemsize
+
+    return spectra, exposure, n_rows
@@ -9,8 +9,11 @@
 #####################################################
 
 import argparse
+import sys
 from datetime import datetime, timezone
 
+MJD_UNIX_EPOCH = 40587 # MJD of 1970-01-01T00:00:00 UTC
+
 def unix_time_to_utc(unix_time):
     """
     Convert Unix timestamp to UTC in ISO 8601 format.
@@ -45,30 +48,216 @@ def utc_to_unix_time(utc_time_str):
         raise ValueError(f"Invalid UTC time format: {utc_time_str}. Error: {e}")
 
 
+def _leap_epoch():
+    """
+    1970-01-01T00:00:00 UTC as an astropy Time. Offsets in SI seconds from it
+    include the leap seconds inserted since.
+    """
+    from astropy.time import Time
+    return Time('1970-01-01T00:00:00', format='isot', scale='utc')
+
+
+def unix_to_utc_array(unix_times, unit='auto', leap_seconds=False):
+    """
+    Convert an array of Unix timestamps to UTC in ISO 8601 format.
+
+    Args:
+        unix_times (array_like): Unix timestamps.
+        unit (str): Precision of the output, 's', 'ms', 'us' or 'auto'
+            ('s' if all timestamps are whole seconds, else 'us').
+        leap_seconds (bool): Treat the timestamps as SI seconds elapsed since
+            1970-01-01T00:00:00 UTC, counting leap seconds, instead of POSIX
+            time (requires astropy).
+
+    Returns:
+        np.ndarray: UTC times in ISO 8601 format (YYYY-MM-DDTHH:MM:SS[.fff]).
+    """
+    import numpy as np
+
+    unix_times = np.asarray(unix_times, dtype=np.float64)
+
+    if unit == 'auto':
+        unit = 's' if np.all(np.mod(unix_times, 1) == 0) else 'us'
+
+    if leap_seconds:
+        from astropy.time import TimeDelta
+        utc_times = (_leap_epoch() + TimeDelta(unix_times, format='sec')).utc
+        utc_times.precision = {'s': 0, 'ms': 3, 'us': 6}[unit]
+        return np.asarray(utc_times.isot)
+
+    utc_times = np.round(unix_times*1e6).astype(np.int64).astype('datetime64[us]')
+    return np.datetime_as_string(utc_times, unit=unit)
+
+
+def utc_to_unix_array(utc_time_strs, leap_seconds=False):
+    """
+    Convert an array of UTC times in ISO 8601 format to Unix timestamps.
+
+    Args:
+        utc_time_strs (array_like): UTC times in ISO 8601 format, optionally
+            ending with 'Z' or '+00:00'.
+        leap_seconds (bool): Return SI seconds elapsed since
+            1970-01-01T00:00:00 UTC, counting leap seconds, instead of POSIX
+            time (requires astropy).
+
+    Returns:
+        np.ndarray: Unix timestamps (float).
+    """
+    import numpy as np
+
+    utc_time_strs = np.char.strip(np.asarray(utc_time_strs, dtype=str))
+    for suffix in ('Z', '+00:00'):
+        utc_time_strs = np.char.replace(utc_time_strs, suffix, '')
+
+    if leap_seconds:
+        from astropy.time import Time
+        return np.asarray((Time(utc_time_strs, format='isot', scale='utc') - _leap_epoch()).sec)
+
+    try:
+        utc_times = np.asarray(utc_time_strs, dtype='datetime64[us]')
+    except ValueError as e:
+        raise ValueError(f"Invalid UTC time format. Error: {e}")
+
+    return utc_times.astype(np.int64)/1e6
+
+
+def unix_to_mjd(unix_times, leap_seconds=False):
+    """
+    Convert Unix timestamps to UTC Modified Julian Date.
+    """
+    import numpy as np
+
+    if leap_seconds:
+        from astropy.time import TimeDelta
+        return np.asarray((_leap_epoch() + TimeDelta(np.asarray(unix_times, dtype=np.float64), format='sec')).utc.mjd)
+
+    return np.asarray(unix_times, dtype=np.float64)/86400. + MJD_UNIX_EPOCH
+
+
+def mjd_to_unix(mjd, leap_seconds=False):
+    """
+    Convert UTC Modified Julian Date to Unix timestamps.
+    """
+    import numpy as np
+
+    if leap_seconds:
+        from astropy.time import Time
+        return np.asarray((Time(np.asarray(mjd, dtype=np.float64), format='mjd', scale='utc') - _leap_epoch()).sec)
+
+    return (np.asarray(mjd, dtype=np.float64) - MJD_UNIX_EPOCH)*86400.
+
+
+def unix_to_hhmmss(unix_times):
+    """
+    UTC time of day as HHMMSS strings (as used in product file names) for an
+    array of Unix timestamps.
+    """
+    import numpy as np
+
+    utc_times = np.atleast_1d(unix_to_utc_array(np.floor(unix_times), unit='s'))
+    # Pick the HH, MM and SS characters out of YYYY-MM-DDTHH:MM:SS
+    chars = utc_times.astype('U19').view('U1').reshape(-1, 19)[:, [11, 12, 14, 15, 17, 18]]
+    return np.ascontiguousarray(chars).view('U6').ravel()
+
+
+def _convert_stream(lines, convert, prefix):
+    """
+    Convert timestamps read line by line, writing each result as soon as it
+    is converted so the tools can sit in a shell pipeline.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            print(f"{prefix}{convert(line)}", flush=True)
+        except ValueError as e:
+            print(e, file=sys.stderr, flush=True)
+
+
 def solexs_time2utc_cli():
     parser = argparse.ArgumentParser(
         description="Convert Unix timestamp to UTC in ISO 8601 format."
     )
-    parser.add_argument("unix_time", type=int, help="Unix timestamp (e.g., 1633046400)")
+    parser.add_argument("unix_time", type=str, nargs='*',
+                        help="Unix timestamp(s) (e.g., 1633046400). Use '-' (or no argument with a pipe) to read one timestamp per line from stdin")
+    parser.add_argument("-f", "--file", type=str, help="Convert all timestamps in a text file (one per line) in one batch", default=None)
+    parser.add_argument("--mjd", action='store_true', help="Output UTC Modified Julian Date instead of ISO 8601")
+    parser.add_argument("--leap_seconds", action='store_true', help="Timestamps count leap seconds (requires astropy)")
     args = parser.parse_args()
 
-    try:
-        utc_time = unix_time_to_utc(args.unix_time)
-        print(f"UTC Time: {utc_time}")
-    except ValueError as e:
-        print(e)
+    def convert(unix_time):
+        if args.mjd:
+            return f'{unix_to_mjd(float(unix_time), args.leap_seconds):.10f}'
+        if args.leap_seconds:
+            return f'{unix_to_utc_array(float(unix_time), leap_seconds=True)}+00:00'
+        return unix_time_to_utc(float(unix_time))
+
+    if args.file is not None:
+        import numpy as np
+        unix_times = np.loadtxt(args.file, ndmin=1)
+        if args.mjd:
+            results = [f'{m:.10f}' for m in unix_to_mjd(unix_times, args.leap_seconds)]
+        else:
+            # Same format as unix_time_to_utc, without microseconds for whole seconds
+            results = [f'{t[:-7] if t.endswith(".000000") else t}+00:00'
+                       for t in unix_to_utc_array(unix_times, leap_seconds=args.leap_seconds)]
+        print('\n'.join(results))
+        return
+
+    if args.unix_time == ['-'] or (len(args.unix_time) == 0 and not sys.stdin.isatty()):
+        _convert_stream(sys.stdin, convert, '')
+        return
+    if len(args.unix_time) == 0:
+        parser.error("no Unix timestamp given (use '-' or a pipe to read them from stdin)")
+
+    prefix = "UTC Time: " if len(args.unix_time) == 1 and not args.mjd else ''
+    for unix_time in args.unix_time:
+        try:
+            print(f"{prefix}{convert(unix_time)}")
+        except ValueError as e:
+            print(e)
 
 def solexs_utc2time_cli():
     parser = argparse.ArgumentParser(
         description="Convert UTC in ISO 8601 format to Unix timestamp."
     )
     parser.add_argument(
-        "utc_time", type=str, help="UTC time in ISO 8601 format (e.g., 2021-10-01T00:00:00)"
+        "utc_time", type=str, nargs='*',
+        help="UTC time(s) in ISO 8601 format (e.g., 2021-10-01T00:00:00). Use '-' (or no argument with a pipe) to read one time per line from stdin"
     )
+    parser.add_argument("-f", "--file", type=str, help="Convert all times in a text file (one per line) in one batch", default=None)
+    parser.add_argument("--mjd", action='store_true', help="Input is UTC Modified Julian Date instead of ISO 8601")
+    parser.add_argument("--leap_seconds", action='store_true', help="Output timestamps counting leap seconds (requires astropy)")
     args = parser.parse_args()
 
-    try:
-        unix_time = utc_to_unix_time(args.utc_time)
-        print(f"Unix Timestamp: {unix_time}")
-    except ValueError as e:
-        print(e)
\ No newline at end of file
+    def convert(utc_time):
+        if args.mjd:
+            return f'{mjd_to_unix(float(utc_time), args.leap_seconds):.6f}'
+        if args.leap_seconds:
+            return f'{utc_to_unix_array(utc_time, leap_seconds=True):.6f}'
+        return utc_to_unix_time(utc_time.strip().replace('Z', '').replace('+00:00', ''))
+
+    if args.file is not None:
+        import numpy as np
+        if args.mjd:
+            unix_times = mjd_to_unix(np.loadtxt(args.file, ndmin=1), args.leap_seconds)
+        else:
+            with open(args.file) as f:
+                utc_times = [line.strip() for line in f if line.strip()]
+            unix_times = utc_to_unix_array(utc_times, leap_seconds=args.leap_seconds)
+        print('\n'.join(f'{t:.6f}' for t in unix_times))
+        return
+
+    if args.utc_time == ['-'] or (len(args.utc_time) == 0 and not sys.stdin.isatty()):
+        _convert_stream(sys.stdin, convert, '')
+        return
+    if len(args.utc_time) == 0:
+        parser.error("no UTC time given (use '-' or a pipe to read them from stdin)")
+
+    prefix = "Unix Timestamp: " if len(args.utc_time) == 1 else ''
+    for utc_time in args.utc_time:
+        try:
+            print(f"{prefix}{convert(utc_time)}")
+        except ValueError as e:
+            print(e)
\ No newline at end of file
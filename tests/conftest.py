@@ -0,0 +1,91 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-19 09:40:12 am
+# @email: sarwade@ursc.gov.in
+# @File Name: conftest.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-19 09:40:12 am
+#####################################################
+
+"""
+Fixtures for the consistency checks: synthetic Level 1 data and a dummy
+CALDB written with benchmarks/synthetic_l1.py, once per test session.
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+import synthetic_l1 # noqa: E402
+
+DURATION = 7200
+FLARES = ((3600., 50., 120., 900.),)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def caldb(tmp_path_factory):
+    caldb_dir = str(tmp_path_factory.mktemp('caldb'))
+    synthetic_l1.make_caldb(caldb_dir, filters=('SDD2',))
+    previous = os.environ.get('SOLEXS_CALDB')
+    os.environ['SOLEXS_CALDB'] = caldb_dir
+    yield caldb_dir
+    if previous is None:
+        del os.environ['SOLEXS_CALDB']
+    else:
+        os.environ['SOLEXS_CALDB'] = previous
+
+
+@pytest.fixture(scope='session')
+def l1_day(tmp_path_factory):
+    """
+    PI and GTI files of two hours with one flare and a few GTI gaps.
+    """
+    return synthetic_l1.make_l1(str(tmp_path_factory.mktemp('l1_day')), duration=DURATION, n_gaps=5, flares=FLARES)
+
+
+@pytest.fixture(scope='session')
+def l1_overlapping(tmp_path_factory):
+    """
+    Two PI files of one hour each, the second starting 200 s before the
+    end of the first, with their GTI files.
+    """
+    first = synthetic_l1.make_l1(str(tmp_path_factory.mktemp('l1_first')), duration=3600, n_gaps=2, flares=FLARES, seed=1)
+    second = synthetic_l1.make_l1(str(tmp_path_factory.mktemp('l1_second')), duration=3600, n_gaps=2, flares=FLARES, seed=2,
+                                  t0=synthetic_l1.T0 + 3400)
+    return [first[0], second[0]], [first[1], second[1]]
+
+
+@pytest.fixture
+def l1_rows(l1_day, tmp_path):
+    """
+    Function writing rows [start, stop) of the l1_day PI file to a file of
+    the same name in a directory of the test, e.g. to split a day or to
+    mimic a growing L1 file.
+    """
+    from astropy.io import fits
+
+    def write_rows(start, stop, subdir='l1'):
+        out_dir = tmp_path/subdir
+        out_dir.mkdir(exist_ok=True)
+        out_file = str(out_dir/os.path.basename(l1_day[0]))
+        with fits.open(l1_day[0]) as hdul:
+            hdu_spec = fits.BinTableHDU(hdul[1].data[start:stop], header=hdul[1].header)
+            fits.HDUList([fits.PrimaryHDU(header=hdul[0].header), hdu_spec]).writeto(out_file, overwrite=True)
+        return out_file
+
+    return write_rows
+
+
+@pytest.fixture
+def l1_copy(l1_day, tmp_path):
+    """
+    Copy of the l1_day PI and GTI files in a directory of the test, for
+    checks that build caches next to the L1 file.
+    """
+    return tuple(shutil.copy(f, tmp_path) for f in l1_day)
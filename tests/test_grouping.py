@@ -0,0 +1,95 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-19 11:20:08 am
+# @email: sarwade@ursc.gov.in
+# @File Name: test_grouping.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-19 11:20:08 am
+#####################################################
+
+import numpy as np
+import pytest
+
+from solexs_tools.grouping import (QUALITY_GOOD, QUALITY_SHORT_GROUP, channel_fwhm, group_channels, group_spectra,
+                                   optimal_bin_width)
+from synthetic_l1 import N_CH
+
+BAD_CHANNELS = [0, 1, 2, 57, 58, 200, N_CH - 1]
+
+
+def spectra(n_spec=20, seed=0):
+    """
+    Counts falling with channel like the synthetic L1 spectra, with a few
+    bad channels.
+    """
+    rng = np.random.default_rng(seed)
+    scale = rng.uniform(20, 2000, n_spec)
+    counts = rng.poisson(scale[:,None]*np.exp(-np.arange(N_CH)/30.)).astype(np.float64)
+    quality = np.zeros(N_CH, dtype=np.int16)
+    quality[BAD_CHANNELS] = 5
+    return counts, quality
+
+
+def groups(grouping):
+    """
+    (start, stop) channel ranges of the groups of one spectrum.
+    """
+    starts = np.flatnonzero(grouping == 1)
+    return list(zip(starts, np.append(starts[1:], len(grouping))))
+
+
+@pytest.mark.parametrize('min_counts', [1, 20, 500])
+def test_groups_reach_min_counts(min_counts):
+    counts, quality = spectra()
+    grouping, out_quality = group_channels(counts, quality, min_counts=min_counts)
+
+    for spec_counts, spec_grouping, spec_quality in zip(counts, grouping, out_quality):
+        for start, stop in groups(spec_grouping):
+            group_counts = np.sum(spec_counts[start:stop])
+            if spec_quality[start] == QUALITY_GOOD:
+                assert group_counts >= min_counts
+            elif spec_quality[start] == QUALITY_SHORT_GROUP:
+                assert group_counts < min_counts
+                # Only a group cut short by the end of the spectrum or a bad channel
+                assert stop == N_CH or quality[stop] != QUALITY_GOOD
+            assert np.all(spec_quality[start:stop] == spec_quality[start])
+
+
+def test_short_tail_groups_flagged():
+    counts = np.full(19, 4.)
+    quality = np.zeros(19, dtype=np.int16)
+    quality[10] = 1
+    grouping, out_quality = group_channels(counts, quality, min_counts=10)
+    grouping, out_quality = grouping[0], out_quality[0]
+
+    # Groups of three channels, cut short before the bad channel and at the end
+    assert groups(grouping) == [(0, 3), (3, 6), (6, 9), (9, 10), (10, 11), (11, 14), (14, 17), (17, 19)]
+    expected = np.zeros(19, dtype=np.int16)
+    expected[[9, 17, 18]] = QUALITY_SHORT_GROUP
+    expected[10] = 1
+    np.testing.assert_array_equal(out_quality, expected)
+
+
+@pytest.mark.parametrize('method, kwargs', [('mincounts', {'min_counts': 50}), ('snr', {'snr': 5}), ('optimal', {}),
+                                            ('optimal', {'min_counts': 20})])
+def test_bad_channels_never_grouped(method, kwargs):
+    counts, quality = spectra()
+    grouping, out_quality = group_spectra(counts, quality, 'SDD2', method, **kwargs)
+
+    bad = quality != QUALITY_GOOD
+    # Bad channels are groups of their own and keep their quality
+    assert np.all(grouping[:,bad] == 1)
+    after_bad = np.flatnonzero(bad) + 1
+    assert np.all(grouping[:,after_bad[after_bad < N_CH]] == 1)
+    np.testing.assert_array_equal(out_quality[:,bad], np.broadcast_to(quality[bad], out_quality[:,bad].shape))
+
+
+def test_optimal_groups_not_wider_than_optimal_width():
+    counts, quality = spectra()
+    grouping, _ = group_spectra(counts, quality, 'SDD2', 'optimal')
+    max_width = optimal_bin_width(counts, channel_fwhm('SDD2'), np.broadcast_to(quality, counts.shape))
+
+    for spec_grouping, spec_width in zip(grouping, max_width):
+        for start, stop in groups(spec_grouping):
+            assert stop - start <= np.min(spec_width[start:stop])
@@ -0,0 +1,251 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-19 10:05:31 am
+# @email: sarwade@ursc.gov.in
+# @File Name: test_products.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-19 10:05:31 am
+#####################################################
+
+"""
+The faster paths of the product generators (time index, columnar L1
+cache, incremental light curves, rate cube) give the same products as the
+direct ones, and backgrounds come from the quiet intervals of the data.
+"""
+
+import os
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from solexs_tools import background as bkg
+from solexs_tools import incremental_lc, io_utils
+from solexs_tools.gti_utils import gti_mask, read_gti
+from solexs_tools.io_utils import read_l1_spectrogram
+from solexs_tools.l1_cache import ChunkedCounts, build_l1_cache, has_l1_cache
+from solexs_tools.solexs_genlc import energy_bands_to_channels, solexs_genlc_bands
+from solexs_tools.solexs_genratecube import solexs_genratecube
+from solexs_tools.solexs_genspec import solexs_genspec, solexs_genmultispec
+from solexs_tools.solexs_genspectrogram import solexs_genspectrogram
+from solexs_tools.time_index import load_time_index
+
+from conftest import DURATION, FLARES
+from synthetic_l1 import T0
+
+BANDS = [(2., 3.), (3., 5.), (5., 10.)]
+# Windows inside a GTI, across GTI gaps, starting before the data and
+# reaching past it, with fractional edges
+WINDOWS = [(T0 + 100, T0 + 160), (T0 + 0.5, T0 + 3600.25), (T0 + 3000, T0 + 5000), (T0 - 500, T0 + 10), (T0 + 7000, T0 + 9000)]
+
+
+def assert_spectra_equal(spec, ref):
+    np.testing.assert_array_equal(spec.counts, ref.counts)
+    np.testing.assert_allclose(spec.exposure, ref.exposure)
+    np.testing.assert_allclose(spec.tstart, ref.tstart)
+    np.testing.assert_allclose(spec.tstop, ref.tstop)
+
+
+def assert_lc_equal(lc, ref):
+    np.testing.assert_allclose(lc.time, ref.time)
+    np.testing.assert_allclose(lc.counts, ref.counts)
+    np.testing.assert_allclose(lc.error, ref.error)
+    np.testing.assert_allclose(lc.fracexp, ref.fracexp)
+
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_genspec_index_matches_direct(l1_day, window):
+    pi_file, gti_file = l1_day
+    ref = solexs_genspec(pi_file, *window, gti_file, use_index=False, write=False)
+    # The first call builds the index, the second reads it back
+    for _ in range(2):
+        assert_spectra_equal(solexs_genspec(pi_file, *window, gti_file, use_index=True, write=False), ref)
+
+
+def test_genmultispec_index_matches_direct(l1_day):
+    pi_file, gti_file = l1_day
+    spec_set = solexs_genmultispec(pi_file, T0 + 10.5, T0 + 5000, 37, gti_file, write=False)
+    for spec in spec_set:
+        ref = solexs_genspec(pi_file, spec.tstart, spec.tstop, gti_file, use_index=False, write=False)
+        assert_spectra_equal(spec, ref)
+
+
+def test_genspec_opens_each_file_once(l1_overlapping, monkeypatch):
+    spec_files, gti_files = l1_overlapping
+    opened = []
+    read_l1_spectrogram = io_utils.read_l1_spectrogram
+
+    def read_and_record(*args, **kwargs):
+        opened.append(read_l1_spectrogram(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(io_utils, 'read_l1_spectrogram', read_and_record)
+
+    spec = solexs_genspec(spec_files[::-1], T0 + 3000, T0 + 4000, gti_files, use_index=False, write=False)
+    assert spec.meta['l1_files'] == spec_files
+    assert len(opened) == len(spec_files)
+    assert all(l1_data._hdul is None for l1_data in opened)
+
+
+@pytest.mark.parametrize('compression', ['none', 'zlib'])
+def test_l1_cache_matches_fits(l1_copy, compression):
+    pi_file, gti_file = l1_copy
+    spec_ref = solexs_genspec(pi_file, T0 + 1000, T0 + 6000, gti_file, use_index=False, write=False)
+    lc_ref = solexs_genlc_bands(pi_file, BANDS, time_bin=10, gti_file=gti_file, write=False)
+    set_ref = solexs_genmultispec(pi_file, T0, T0 + DURATION, 300, gti_file, write=False)
+
+    build_l1_cache(pi_file, chunk_rows=1000, chunk_channels=50, compression=compression)
+    assert has_l1_cache(pi_file)
+    assert isinstance(read_l1_spectrogram(pi_file).counts, ChunkedCounts)
+
+    assert_spectra_equal(solexs_genspec(pi_file, T0 + 1000, T0 + 6000, gti_file, use_index=False, write=False), spec_ref)
+    assert_lc_equal(solexs_genlc_bands(pi_file, BANDS, time_bin=10, gti_file=gti_file, write=False), lc_ref)
+    assert_spectra_equal(solexs_genmultispec(pi_file, T0, T0 + DURATION, 300, gti_file, write=False), set_ref)
+
+
+@pytest.mark.parametrize('time_bin', [1, 7.5, 60])
+def test_incremental_lc_matches_full(l1_day, l1_rows, tmp_path, monkeypatch, time_bin):
+    pi_file, gti_file = l1_day
+    full_file = str(tmp_path/'full.lc')
+    solexs_genlc_bands(pi_file, BANDS, time_bin=time_bin, outfile=full_file, gti_file=gti_file)
+
+    updates = []
+    genlc_update = incremental_lc._genlc_update
+    monkeypatch.setattr(incremental_lc, '_genlc_update', lambda *args: updates.append(args) or genlc_update(*args))
+
+    # The L1 file grows by uneven numbers of rows between the runs
+    incremental_file = str(tmp_path/'incremental.lc')
+    row_counts = (1000, 1001, 2500, 5003, DURATION)
+    for n_rows in row_counts:
+        growing_file = l1_rows(0, n_rows)
+        solexs_genlc_bands(growing_file, BANDS, time_bin=time_bin, outfile=incremental_file, gti_file=gti_file, incremental=True)
+    # Every run after the first appended to the light curve
+    assert len(updates) == len(row_counts) - 1
+
+    with fits.open(full_file) as ref, fits.open(incremental_file) as lc:
+        assert lc[1].data.names == ref[1].data.names
+        for name in ref[1].data.names:
+            np.testing.assert_allclose(lc[1].data[name], ref[1].data[name], err_msg=name)
+        for key in ('TSTART', 'TSTOP', 'DATE-OBS', 'DATE-END'):
+            assert lc[1].header[key] == ref[1].header[key], key
+
+
+@pytest.mark.parametrize('time_bin', [1, 7.5, 60])
+def test_ratecube_matches_genlc_bands(l1_day, time_bin):
+    pi_file, gti_file = l1_day
+    cube = solexs_genratecube(pi_file, BANDS, time_bin=time_bin, gti_file=gti_file, write=False)
+    lc = solexs_genlc_bands(pi_file, BANDS, time_bin=time_bin, gti_file=gti_file, write=False)
+
+    # genlc_bands leaves out bins without exposure in the GTI
+    good = cube.exposure > 0
+    np.testing.assert_allclose(cube.time[good], lc.time)
+    np.testing.assert_allclose(cube.rate[good], lc.counts)
+    np.testing.assert_allclose(cube.error[good], lc.error)
+    np.testing.assert_allclose(cube.fracexp[good], lc.fracexp)
+
+
+@pytest.mark.parametrize('split_row', [1800, 3599, 4321])
+def test_pyramid_of_split_day_matches_single_file(l1_day, l1_rows, split_row):
+    pi_file, gti_file = l1_day
+    levels = (1, 10, 60, 600)
+    ref = solexs_genspectrogram(pi_file, gti_file, levels=levels, write=False)
+    parts = [l1_rows(0, split_row, 'first'), l1_rows(split_row, DURATION, 'second')]
+    pyramid = solexs_genspectrogram(parts, gti_file, levels=levels, write=False)
+
+    for time_bin in levels:
+        for values, ref_values in zip(pyramid.level(time_bin), ref.level(time_bin)):
+            np.testing.assert_allclose(values, ref_values, rtol=1e-6)
+
+
+def test_caches_rebuilt_for_changed_l1_file(l1_copy, l1_rows):
+    pi_file, gti_file = l1_copy
+    load_time_index(pi_file, gti_file)
+    bkg.load_background(pi_file, gti_file)
+    build_l1_cache(pi_file)
+
+    # Replaced by a shorter file with an older modification time
+    stat = os.stat(pi_file)
+    os.replace(l1_rows(0, 5000, 'short'), pi_file)
+    os.utime(pi_file, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+
+    assert load_time_index(pi_file, gti_file, build=False) is None
+    assert bkg.load_background(pi_file, gti_file, build=False) is None
+    assert not has_l1_cache(pi_file)
+    assert len(load_time_index(pi_file, gti_file).time) == 5000
+
+
+def test_quiet_intervals_before_flare(l1_day):
+    pi_file, gti_file = l1_day
+    intervals = bkg.find_quiet_intervals(pi_file, gti_file)
+
+    # The rate is flat until the rise of the flare, a few rise times before
+    # its peak
+    peak, _, rise, _ = FLARES[0]
+    flat_stop = T0 + peak - 2.5*rise
+    assert np.all(intervals[:,1] <= flat_stop)
+
+    # Most of the flat part in the GTI is found quiet
+    gti = read_gti(gti_file)
+    flat_gti = np.clip(gti, T0, flat_stop)
+    assert np.sum(np.diff(intervals)) >= 0.8*np.sum(np.diff(flat_gti))
+    for tstart, tstop in intervals:
+        assert np.any((gti[:,0] <= tstart) & (tstop <= gti[:,1]))
+
+
+def test_auto_background_skips_days_without_quiet_interval(l1_day, l1_rows):
+    _, gti_file = l1_day
+    quiet_day = l1_rows(0, 3300, 'quiet')
+    flare_day = l1_rows(3300, 4600, 'flare')
+    with pytest.raises(bkg.NoQuietInterval):
+        bkg.find_quiet_intervals(flare_day, gti_file)
+
+    with pytest.warns(UserWarning, match='left out of the background'):
+        background = bkg.resolve_background([quiet_day, flare_day], gti_file, 'auto')
+    ref = bkg.load_background(quiet_day, gti_file)
+    np.testing.assert_array_equal(background.counts, ref.counts)
+    assert background.exposure == ref.exposure
+
+    with pytest.raises(ValueError, match='No quiet interval'), pytest.warns(UserWarning):
+        bkg.resolve_background(flare_day, gti_file, 'auto')
+
+
+def test_load_background_is_cached(l1_copy, monkeypatch):
+    pi_file, gti_file = l1_copy
+    assert bkg.load_background(pi_file, gti_file, build=False) is None
+
+    searches = []
+    find_quiet_intervals = bkg.find_quiet_intervals
+    monkeypatch.setattr(bkg, 'find_quiet_intervals', lambda *args, **kwargs: searches.append(args) or find_quiet_intervals(*args, **kwargs))
+    background = bkg.load_background(pi_file, gti_file)
+    for cached in (bkg.load_background(pi_file, gti_file), bkg.load_background(pi_file, gti_file, build=False)):
+        np.testing.assert_array_equal(cached.counts, background.counts)
+        np.testing.assert_array_equal(cached.intervals, background.intervals)
+        assert cached.exposure == background.exposure
+    assert len(searches) == 1
+
+    # Other detection parameters have their own background
+    bkg.load_background(pi_file, gti_file, min_duration=600)
+    assert len(searches) == 2
+
+
+@pytest.mark.parametrize('time_bin', [None, 60])
+def test_lc_background_matches_direct(l1_day, time_bin):
+    pi_file, gti_file = l1_day
+    intervals = [(T0 + 720, T0 + 1920), (T0 + 2400, T0 + 3240)]
+    lc = solexs_genlc_bands(pi_file, BANDS, time_bin=time_bin, gti_file=gti_file, write=False, background=intervals)
+    ref = solexs_genlc_bands(pi_file, BANDS, time_bin=time_bin, gti_file=gti_file, write=False)
+
+    # Background rate of every band from the good rows in the intervals
+    l1_data = read_l1_spectrogram(pi_file)
+    time = np.asarray(l1_data.time)
+    rows = gti_mask(time, read_gti(gti_file)) & np.any([(time >= t0) & (time < t1) for t0, t1 in intervals], axis=0)
+    counts = np.asarray(l1_data.counts, dtype=np.float64)[rows]
+    exposure = np.sum(np.asarray(l1_data.exposure, dtype=np.float64)[rows])
+    band_rate = np.array([np.sum(counts[:,ch_low:ch_high]) for ch_low, ch_high, _, _ in
+                          energy_bands_to_channels(l1_data.filter_sdd, BANDS)])/exposure
+
+    np.testing.assert_allclose(lc.backv, np.broadcast_to(band_rate, lc.backv.shape), rtol=1e-6)
+    rate = ref.counts if time_bin else ref.counts/ref.fracexp[:,None]
+    np.testing.assert_allclose(lc.rate, rate - lc.backv)
+    np.testing.assert_allclose(lc.rate_err, np.hypot(ref.error if time_bin else ref.error/ref.fracexp[:,None], lc.backe))
@@ -0,0 +1,58 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-19 11:48:26 am
+# @email: sarwade@ursc.gov.in
+# @File Name: test_server.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-19 11:48:26 am
+#####################################################
+
+import os
+
+import numpy as np
+import pytest
+
+from solexs_tools.solexs_genlc import solexs_genlc_bands
+from solexs_tools.solexs_genspec import solexs_genspec
+from solexs_tools.solexs_server import ProductServer, _parse_params
+
+from synthetic_l1 import T0
+
+
+@pytest.fixture
+def product_server(tmp_path):
+    return ProductServer(output_root=str(tmp_path))
+
+
+def test_products_match_library(l1_overlapping, product_server):
+    spec_files, gti_files = l1_overlapping
+
+    spec = product_server.genspec(spec_files, gti_files, T0 + 3000, T0 + 4000)
+    ref = solexs_genspec(spec_files, T0 + 3000, T0 + 4000, gti_files, write=False)
+    np.testing.assert_array_equal(spec['counts'], ref.counts)
+    assert spec['exposure'] == ref.exposure
+
+    # Spectra of both files summed, as by solexs_genspec for each bin
+    spec_set = product_server.genmultispec(spec_files, gti_files, T0 + 3000, T0 + 4000, 60)
+    ref_set = [solexs_genspec(spec_files, t0, t1, gti_files, use_index=False, write=False)
+               for t0, t1 in zip(spec_set['tstart'], spec_set['tstop'])]
+    np.testing.assert_array_equal(spec_set['counts'], [s.counts for s in ref_set])
+
+    lc = product_server.genlc(spec_files, [(2., 3.), (3., 10.)], gti=gti_files, time_bin=60)
+    ref_lc = solexs_genlc_bands(spec_files, [(2., 3.), (3., 10.)], time_bin=60, gti_file=gti_files, write=False)
+    np.testing.assert_allclose(lc['counts'], ref_lc.counts)
+
+
+def test_outputs_stay_under_output_root(l1_day, product_server, tmp_path):
+    pi_file, gti_file = l1_day
+    for outfile in ('../spec', '/tmp/spec', 'sub/../../spec'):
+        with pytest.raises(ValueError, match='outside the output directory'):
+            product_server.genspec([pi_file], [gti_file], T0 + 100, T0 + 200, write=True, outfile=outfile)
+
+    outfile = product_server.genspec([pi_file], [gti_file], T0 + 100, T0 + 200, write=True)['outfile']
+    assert os.path.dirname(outfile) == os.path.realpath(tmp_path)
+    # Existing files are replaced only with clobber
+    with pytest.raises(OSError):
+        product_server.genspec([pi_file], [gti_file], T0 + 100, T0 + 200, write=True)
+    assert _parse_params('genspec', {'infile': pi_file, 'gti': gti_file, 'tstart': '1', 'tstop': '2'})['clobber'] is False
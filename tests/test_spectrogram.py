@@ -0,0 +1,60 @@
+#####################################################
+# @Author: SoLEXSPOC
+# @Date:   2026-10-19 09:40:12 am
+# @email: sarwade@ursc.gov.in
+# @File Name: test_spectrogram.py
+# @Project: solexs_tools
+#
+# @Last Modified time: 2026-10-19 09:40:12 am
+#####################################################
+
+import numpy as np
+import pytest
+
+from solexs_tools.gti_utils import gti_mask, read_gti
+from solexs_tools.io_utils import read_l1_spectrogram
+from solexs_tools.solexs_genspectrogram import solexs_genspectrogram
+
+LEVELS = (1, 10, 60, 600)
+
+
+def direct_sums(spec_files, gti_files, time_bin, anchor, ch_low, ch_high):
+    """
+    Exposure and counts in [ch_low, ch_high) of every time bin, summed row
+    by row over all files.
+    """
+    gti = read_gti(gti_files)
+    exposure, counts = {}, {}
+    for spec_file in spec_files:
+        l1_data = read_l1_spectrogram(spec_file)
+        good = gti_mask(l1_data.time, gti)
+        bins = np.floor((l1_data.time[good] - anchor)/time_bin).astype(np.int64)
+        row_counts = np.asarray(l1_data.counts[good][:,ch_low:ch_high], dtype=np.float64).sum(axis=1)
+        for b, e, c in zip(bins, np.asarray(l1_data.exposure)[good], row_counts):
+            exposure[b] = exposure.get(b, 0.) + e
+            counts[b] = counts.get(b, 0.) + c
+    bins = np.array(sorted(exposure))
+    return bins, np.array([exposure[b] for b in bins]), np.array([counts[b] for b in bins])
+
+
+def test_pyramid_sums_overlapping_files(l1_overlapping):
+    spec_files, gti_files = l1_overlapping
+    pyramid = solexs_genspectrogram(spec_files, gti_files, levels=LEVELS, write=False)
+
+    anchor = np.floor(read_l1_spectrogram(spec_files[0]).time[0]/LEVELS[-1])*LEVELS[-1]
+    for time_bin in LEVELS:
+        time, exposure, rate = pyramid.level(time_bin)
+        bins, expected_exposure, expected_counts = direct_sums(spec_files, gti_files, time_bin, anchor,
+                                                               pyramid.ch_low[0], pyramid.ch_high[-1])
+
+        assert np.all(np.diff(time) > 0)
+        np.testing.assert_allclose(time, anchor + (bins + 0.5)*time_bin)
+        np.testing.assert_allclose(exposure, expected_exposure)
+        counts = np.nansum(np.asarray(rate, dtype=np.float64)*exposure[:,None], axis=1)
+        np.testing.assert_allclose(counts, expected_counts, rtol=1e-5)
+
+
+@pytest.mark.parametrize('levels', [(1, 4, 6), (10, 20, 30), (1, 40, 60, 100)])
+def test_levels_must_divide_the_coarsest(l1_day, levels):
+    with pytest.raises(ValueError, match='divide the largest'):
+        solexs_genspectrogram(*l1_day, levels=levels, write=False)